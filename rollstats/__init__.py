@@ -1,11 +1,76 @@
 import array
+import bisect
+import itertools
+import json
 import math
+import mmap
+import operator
+import os
+import struct
+import sys
+import tempfile
+import time
 
 from collections import deque
-from typing import Any, Callable, List, Optional, Sequence, Union, SupportsFloat
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    SupportsFloat,
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
 
 nan = float("nan")
 
+# Relative rounding error of a float
+EPSILON = sys.float_info.epsilon
+
+# Fraction of its largest value since it was last computed exactly below which
+# a downdated sum of squared differences is mostly rounding error and gets recomputed
+CANCELLATION = 2.0**-20
+
+# Number of samples handled per vectorized block in Container.push_batch.
+# Each block computes its cumulative sums relative to a local shift,
+# which keeps the cancellation error in S small for drifting data.
+BATCH_BLOCK_SIZE = 4096
+
+# Chunks shorter than this are pushed one by one by Container.push_batch,
+# because setting up the vectorized path costs more than it saves for them.
+BATCH_MIN_SIZE = 24
+
+# The first bytes of a file written by Container.save_snapshot()
+SNAPSHOT_MAGIC = b"RLSTSNP1"
+
+# How DecimatedHistory combines the aggregate of a bucket so far with a new value.
+# A NaN in a bucket makes its aggregate NaN.
+DECIMATION_AGGREGATES = {
+    "last": lambda acc, value: value,
+    "min": lambda acc, value: value if value < acc or value != value else acc,
+    "max": lambda acc, value: value if value > acc or value != value else acc,
+    "mean": operator.add,
+}
+
+# The first bytes of a DiskHistory file
+DISK_HISTORY_MAGIC = b"RLSTHST1"
+
+# Subscriptions whose name differs from the name of the subscribe method
+SUBSCRIBE_METHODS = {"zscore": "subscribe_z_score"}
+
 FloatFunc = Callable[[SupportsFloat], float]
 HookFunc = Callable[[SupportsFloat], Any]
 
@@ -35,66 +100,1345 @@ def pop_std(S: float, n: float) -> float:
     return math.sqrt(S / n) if n > 1 else nan
 
 
+def skewness(S: float, M3: float, n: float) -> float:
+    """Sample skewness, adjusted for the sample size (the G1 estimator)"""
+    if n > 2 and S > 0:
+        return pop_skewness(S, M3, n) * math.sqrt(n * (n - 1)) / (n - 2)
+    return nan
+
+
+def pop_skewness(S: float, M3: float, n: float) -> float:
+    """Population skewness"""
+    return math.sqrt(n) * M3 / (S * math.sqrt(S)) if n > 1 and S > 0 else nan
+
+
+def kurtosis(S: float, M4: float, n: float) -> float:
+    """Sample excess kurtosis, adjusted for the sample size (the G2 estimator)"""
+    if n > 3 and S > 0:
+        g2 = pop_kurtosis(S, M4, n)
+        return ((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3))
+    return nan
+
+
+def pop_kurtosis(S: float, M4: float, n: float) -> float:
+    """Population excess kurtosis"""
+    return n * M4 / (S * S) - 3 if n > 1 and S > 0 else nan
+
+
+def _exact_moments(values: Iterable[float]) -> Tuple[float, float]:
+    """The mean and the sum of squared differences from the mean of values, with two passes"""
+    values = list(values)
+    n = len(values)
+    mean = math.fsum(values) / n
+    # Correct the rounding of the mean, which makes it exact for constant windows
+    mean += math.fsum([x - mean for x in values]) / n
+    return mean, math.fsum([(x - mean) ** 2 for x in values])
+
+
+def _clip_rounding(S: "np.ndarray", sum_sq: "np.ndarray") -> "np.ndarray":
+    """Set sums of squared differences that are below the rounding error of
+    the cumulative sum of squares they were computed from to exactly 0."""
+    return np.where(S > 8 * EPSILON * sum_sq, S, 0)
+
+
+def ew_var(S: float, W: float, W2: float) -> float:
+    """Exponentially weighted sample variance, from the weighted sum of squared differences,
+    the sum of weights and the sum of squared weights"""
+    return S / (W - W2 / W) if W * W > W2 else nan
+
+
+def ew_std(S: float, W: float, W2: float) -> float:
+    """Exponentially weighted sample standard deviation"""
+    return math.sqrt(S / (W - W2 / W)) if W * W > W2 else nan
+
+
+def ew_zscore(S: float, W: float, W2: float, value: float, M: float) -> float:
+    """Exponentially weighted sample z-score"""
+    return (value - M) / ew_std(S, W, W2) if S > 0 and W * W > W2 else nan
+
+
+def ew_pop_var(S: float, W: float) -> float:
+    """Exponentially weighted population variance"""
+    return S / W if W > 0 else nan
+
+
+def ew_pop_std(S: float, W: float) -> float:
+    """Exponentially weighted population standard deviation"""
+    return math.sqrt(S / W) if W > 0 else nan
+
+
+def cov(C: float, n: float) -> float:
+    """Sample covariance, from the co-moment C"""
+    return C / (n - 1) if n > 1 else nan
+
+
+def pop_cov(C: float, n: float) -> float:
+    """Population covariance, from the co-moment C"""
+    return C / n if n > 1 else nan
+
+
+def corr(C: float, Sx: float, Sy: float) -> float:
+    """Pearson correlation coefficient"""
+    if Sx > 0 and Sy > 0:
+        # Rounding error can push it just outside [-1, 1]
+        return max(-1.0, min(1.0, C / math.sqrt(Sx * Sy)))
+    return nan
+
+
+def slope(C: float, Sx: float) -> float:
+    """Slope of the least squares line y = intercept + slope * x"""
+    return C / Sx if Sx > 0 else nan
+
+
+def intercept(C: float, Sx: float, Mx: float, My: float) -> float:
+    """Intercept of the least squares line y = intercept + slope * x"""
+    return My - slope(C, Sx) * Mx
+
+
+def r_squared(C: float, Sx: float, Sy: float) -> float:
+    """Coefficient of determination of the least squares line"""
+    return corr(C, Sx, Sy) ** 2
+
+
+def _decimation(history: Any) -> Optional[tuple]:
+    """The decimation of a history (see DecimatedHistory.decimation), or None"""
+    if isinstance(history, (DecimatedHistory, TransformedHistory)):
+        return history.decimation
+    return None
+
+
+class RingHistory(object):
+    """A history that only retains the last max_history values.
+    The values are kept in a preallocated circular buffer, so appending is O(1)
+    and never reallocates. Indexing, len() and iteration see the retained values,
+    oldest first.
+    """
+
+    __slots__ = ["max_history", "buffer", "end", "length"]
+
+    def __init__(self, max_history: int, data: Sequence = None):
+        if max_history < 1:
+            raise ValueError("max_history must be at least 1")
+        self.max_history = max_history
+        self.buffer = array.array("d", bytes(8 * max_history))
+
+        # Index of the next value to write, and the number of retained values
+        self.end = 0
+        self.length = 0
+
+        if data:
+            self.extend(data)
+
+    def append(self, value: float) -> None:
+        self.buffer[self.end] = value
+        self.end += 1
+        if self.end == self.max_history:
+            self.end = 0
+        if self.length < self.max_history:
+            self.length += 1
+
+    def extend(self, values: Sequence[float]) -> None:
+        if not isinstance(values, array.array) or values.typecode != "d":
+            values = array.array("d", values)
+        values = values[-self.max_history :]
+        first = min(len(values), self.max_history - self.end)
+        self.buffer[self.end : self.end + first] = values[:first]
+        self.buffer[: len(values) - first] = values[first:]
+        self.end = (self.end + len(values)) % self.max_history
+        self.length = min(self.length + len(values), self.max_history)
+
+    def ordered(self) -> array.array:
+        """Copy of the retained values, oldest first"""
+        start = (self.end - self.length) % self.max_history
+        if start + self.length <= self.max_history:
+            return self.buffer[start : start + self.length]
+        return self.buffer[start:] + self.buffer[: self.end]
+
+    def to_numpy(self) -> "np.ndarray":
+        """The retained values, oldest first. This is a view of the circular buffer
+        as long as the retained values are contiguous in it, and a copy once they wrap around.
+        """
+        start = (self.end - self.length) % self.max_history
+        if start + self.length <= self.max_history:
+            return np.frombuffer(
+                self.buffer, dtype=float, count=self.length, offset=8 * start
+            )
+        values = np.frombuffer(self.buffer, dtype=float)
+        return np.concatenate((values[start:], values[: self.end]))
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[float, array.array]:
+        if isinstance(item, slice):
+            return self.ordered()[item]
+        if item < 0:
+            item += self.length
+        if not 0 <= item < self.length:
+            raise IndexError("history index out of range")
+        return self.buffer[(self.end - self.length + item) % self.max_history]
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self):
+        return iter(self.ordered())
+
+    def __eq__(self, other) -> bool:
+        try:
+            return len(self) == len(other) and all(
+                mine == theirs for mine, theirs in zip(self, other)
+            )
+        except TypeError:
+            return False
+
+    def __repr__(self) -> str:
+        return "RingHistory({}, {})".format(self.max_history, list(self))
+
+
+class MappedHistory(object):
+    """A history whose older values are a read-only buffer of floats, e.g. part of a
+    memory-mapped snapshot, and whose newer values are appended to an array.
+    Creating it copies nothing, so it costs the same no matter how long the buffer is.
+    """
+
+    __slots__ = ["base", "tail"]
+
+    def __init__(self, base: memoryview):
+        self.base = base
+        self.tail = array.array("d")
+
+    def append(self, value: float) -> None:
+        self.tail.append(value)
+
+    def extend(self, values: Sequence[float]) -> None:
+        self.tail.extend(values)
+
+    def ordered(self) -> array.array:
+        """Copy of all values, oldest first"""
+        values = array.array("d")
+        values.frombytes(self.base.cast("B"))
+        return values + self.tail
+
+    def to_numpy(self) -> "np.ndarray":
+        """All values, as a view of the buffer until something is appended and a copy after that"""
+        base = np.frombuffer(self.base, dtype=float)
+        if not self.tail:
+            return base
+        return np.concatenate((base, np.frombuffer(self.tail, dtype=float)))
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[float, array.array]:
+        if isinstance(item, slice):
+            return self.ordered()[item]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("history index out of range")
+        if item < len(self.base):
+            return self.base[item]
+        return self.tail[item - len(self.base)]
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.tail)
+
+    def __iter__(self):
+        return itertools.chain(self.base, self.tail)
+
+    def __eq__(self, other) -> bool:
+        try:
+            return len(self) == len(other) and all(
+                mine == theirs for mine, theirs in zip(self, other)
+            )
+        except TypeError:
+            return False
+
+    def __repr__(self) -> str:
+        return "MappedHistory({})".format(list(self))
+
+
+class GrowableHistory(object):
+    """A history in an array that grows by doubling, which unlike an array.array
+    can grow while views of it (from to_numpy()) are alive. New values are written
+    past the end of the views, and when the array is full, they continue in a new array
+    of twice the size, while the views keep the old one. Either way the views keep
+    the values they were created with, and appending stays O(1) amortized.
+    """
+
+    __slots__ = ["buffer", "length"]
+
+    def __init__(self, data: Sequence = None):
+        self.buffer = array.array("d", bytes(8 * 16))
+        self.length = 0
+        if data:
+            self.extend(data)
+
+    def reserve(self, capacity: int) -> None:
+        """Make room for at least capacity values"""
+        if capacity <= len(self.buffer):
+            return
+        buffer = array.array("d", bytes(8 * max(capacity, 2 * len(self.buffer))))
+        buffer[: self.length] = self.buffer[: self.length]
+        self.buffer = buffer
+
+    def append(self, value: float) -> None:
+        if self.length == len(self.buffer):
+            self.reserve(self.length + 1)
+        self.buffer[self.length] = value
+        self.length += 1
+
+    def extend(self, values: Sequence[float]) -> None:
+        if not isinstance(values, array.array) or values.typecode != "d":
+            values = array.array("d", values)
+        self.reserve(self.length + len(values))
+        self.buffer[self.length : self.length + len(values)] = values
+        self.length += len(values)
+
+    def ordered(self) -> array.array:
+        """Copy of the values, oldest first"""
+        return self.buffer[: self.length]
+
+    def to_numpy(self) -> "np.ndarray":
+        """The values, as a view of the array"""
+        return np.frombuffer(self.buffer, dtype=float, count=self.length)
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[float, array.array]:
+        if isinstance(item, slice):
+            return self.ordered()[item]
+        if item < 0:
+            item += self.length
+        if not 0 <= item < self.length:
+            raise IndexError("history index out of range")
+        return self.buffer[item]
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self):
+        return iter(self.ordered())
+
+    def __eq__(self, other) -> bool:
+        try:
+            return len(self) == len(other) and all(
+                mine == theirs for mine, theirs in zip(self, other)
+            )
+        except TypeError:
+            return False
+
+    def __repr__(self) -> str:
+        return "GrowableHistory({})".format(list(self))
+
+
+class DiskHistory(object):
+    """A history in a memory-mapped file, for histories too long to keep on the heap.
+    The operating system pages the values in and out of memory as they are used,
+    so cold history stays on disk. Appending is O(1) amortized, since the file grows
+    by doubling, and indexing and len() are O(1).
+
+    The file starts with DISK_HISTORY_MAGIC and the number of values, which is updated on
+    every append, followed by the values as native doubles. An existing file is only opened
+    if resume is True, and then its history is continued. Where the platform supports it,
+    the file is locked while it is open, so two DiskHistories can't write to it at once.
+    Views of the file (e.g. from to_numpy()) don't keep it
+    from growing: the file is mapped again, and the views keep the old mapping,
+    which still shows the values they were created with. An old mapping keeps
+    a file descriptor of its own open until its last view is dropped, but not the lock,
+    which close() releases explicitly.
+    """
+
+    __slots__ = ["path", "file", "mapped", "header", "values", "length"]
+
+    def __init__(self, path: str, initial_capacity: int = 1024, resume: bool = False):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists and not resume:
+            raise FileExistsError(
+                "{} already holds a history, pass resume=True to continue it".format(
+                    path
+                )
+            )
+        self.file = open(path, "r+b" if exists else "w+b")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.file.close()
+                raise ValueError(
+                    "{} is already open in another DiskHistory".format(path)
+                )
+        if not exists:
+            self.file.write(DISK_HISTORY_MAGIC + bytes(8))
+            self.file.truncate(16 + 8 * max(initial_capacity, 1))
+        elif self.file.read(8) != DISK_HISTORY_MAGIC:
+            self.file.close()
+            raise ValueError("{} is not a rollstats history file".format(path))
+        self.map()
+        self.length = self.header[1]
+
+    def map(self) -> None:
+        self.mapped = mmap.mmap(self.file.fileno(), 0)
+        self.header = memoryview(self.mapped)[:16].cast("Q")
+        self.values = memoryview(self.mapped)[16:].cast("d")
+
+    def unmap(self) -> None:
+        self.header.release()
+        self.values.release()
+        try:
+            self.mapped.close()
+        except BufferError:
+            # A view from to_numpy() still uses the mapping,
+            # which is unmapped when the view is dropped
+            pass
+
+    def reserve(self, capacity: int) -> None:
+        """Make room for at least capacity values"""
+        if capacity <= len(self.values):
+            return
+        new_capacity = max(capacity, 2 * len(self.values))
+        self.unmap()
+        self.file.truncate(16 + 8 * new_capacity)
+        self.map()
+
+    def append(self, value: float) -> None:
+        if self.length == len(self.values):
+            self.reserve(self.length + 1)
+        self.values[self.length] = value
+        self.length += 1
+        self.header[1] = self.length
+
+    def extend(self, values: Sequence[float]) -> None:
+        if not isinstance(values, array.array) or values.typecode != "d":
+            values = array.array("d", values)
+        self.reserve(self.length + len(values))
+        self.values[self.length : self.length + len(values)] = values
+        self.length += len(values)
+        self.header[1] = self.length
+
+    def view(self) -> memoryview:
+        """The values as a memoryview of the file"""
+        return self.values[: self.length]
+
+    def ordered(self) -> array.array:
+        """Copy of the values, oldest first"""
+        values = array.array("d")
+        values.frombytes(self.view().cast("B"))
+        return values
+
+    def to_numpy(self) -> "np.ndarray":
+        """The values, as a view of the file"""
+        return np.frombuffer(self.mapped, dtype=float, count=self.length, offset=16)
+
+    def flush(self) -> None:
+        """Write the values to disk"""
+        self.mapped.flush()
+
+    def close(self) -> None:
+        if fcntl is not None:
+            # The lock belongs to the open file, which a mapping that is still
+            # in use (see unmap()) keeps open after the file object is closed
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.unmap()
+        self.file.close()
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[float, array.array]:
+        if isinstance(item, slice):
+            return self.ordered()[item]
+        if item < 0:
+            item += self.length
+        if not 0 <= item < self.length:
+            raise IndexError("history index out of range")
+        return self.values[item]
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self):
+        return iter(self.ordered())
+
+    def __eq__(self, other) -> bool:
+        try:
+            return len(self) == len(other) and all(
+                mine == theirs for mine, theirs in zip(self, other)
+            )
+        except TypeError:
+            return False
+
+    def __repr__(self) -> str:
+        return "DiskHistory({!r}, {} values)".format(self.path, self.length)
+
+
+class DecimatedHistory(object):
+    """A history that keeps one value per bucket of k appended values: the last one
+    (i.e. every k-th value), or the min, max or mean of the bucket.
+    Only complete buckets are part of the history.
+
+    If max_history is given, only the last max_history buckets are kept. If a coarser
+    DecimatedHistory is given too, the buckets that fall out are appended to it instead
+    of being dropped, like in round-robin databases. The coarser history aggregates
+    them further, and can have a coarser history of its own. The values of all tiers
+    make up one history, coarsest and oldest first, so its shape is kept while its memory
+    is bounded by the number of tiers and their max_history.
+
+    Use the decimation argument of the containers to decimate all of their histories
+    the same way, so that they still line up (see BaseContainer.histories()).
+    """
+
+    __slots__ = [
+        "k",
+        "aggregate",
+        "combine",
+        "max_history",
+        "buffer",
+        "coarser",
+        "count",
+        "acc",
+    ]
+
+    def __init__(
+        self,
+        k: int,
+        aggregate: str = "last",
+        max_history: Optional[int] = None,
+        coarser: Optional["DecimatedHistory"] = None,
+    ):
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        if aggregate not in DECIMATION_AGGREGATES:
+            raise ValueError(
+                "aggregate must be one of {}".format(", ".join(DECIMATION_AGGREGATES))
+            )
+        if coarser is not None and max_history is None:
+            raise ValueError("a coarser history needs a max_history to overflow from")
+        self.k = k
+        self.aggregate = aggregate
+        self.combine = DECIMATION_AGGREGATES[aggregate]
+        self.max_history = max_history
+        self.buffer = MemoryFloat.new_history_container(max_history=max_history)
+        self.coarser = coarser
+
+        # The number of values in the current bucket, and their aggregate so far
+        self.count = 0
+        self.acc = nan
+
+    @property
+    def decimation(self) -> tuple:
+        """The (k, aggregate, max_history) of every tier, finest first.
+        Only histories with the same decimation line up bucket by bucket."""
+        coarser = self.coarser.decimation if self.coarser is not None else ()
+        return ((self.k, self.aggregate, self.max_history),) + coarser
+
+    @classmethod
+    def tiers(
+        cls, *tiers: Sequence[Any], aggregate: str = "last"
+    ) -> "DecimatedHistory":
+        """Make a chain of histories from (k, max_history) pairs, finest first.
+        The k of each tier is the number of buckets of the previous tier it aggregates,
+        e.g. tiers((60, 1440), (60, 720), (24, None)) keeps per-minute values of one day,
+        per-hour values of 30 days and per-day values forever, for a push per second."""
+        history = None
+        for k, max_history in reversed(tiers):
+            history = cls(k, aggregate, max_history, history)
+        return history
+
+    def append(self, value: float) -> None:
+        self.acc = value if self.count == 0 else self.combine(self.acc, value)
+        self.count += 1
+        if self.count == self.k:
+            bucket = self.acc / self.k if self.aggregate == "mean" else self.acc
+            self.count = 0
+            if self.coarser is not None and len(self.buffer) == self.buffer.max_history:
+                self.coarser.append(self.buffer[0])
+            self.buffer.append(bucket)
+
+    def extend(self, values: Sequence[float]) -> None:
+        for value in values:
+            self.append(value)
+
+    def ordered(self) -> array.array:
+        """Copy of the values of all tiers, oldest first"""
+        values = (
+            self.coarser.ordered() if self.coarser is not None else array.array("d")
+        )
+        values.extend(
+            self.buffer
+            if isinstance(self.buffer, array.array)
+            else self.buffer.ordered()
+        )
+        return values
+
+    def to_numpy(self) -> "np.ndarray":
+        """Copy of the values of all tiers, oldest first"""
+        return np.frombuffer(self.ordered(), dtype=float)
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[float, array.array]:
+        if isinstance(item, slice):
+            return self.ordered()[item]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("history index out of range")
+        coarse = len(self.coarser) if self.coarser is not None else 0
+        if item < coarse:
+            return self.coarser[item]
+        return self.buffer[item - coarse]
+
+    def __len__(self) -> int:
+        coarse = len(self.coarser) if self.coarser is not None else 0
+        return coarse + len(self.buffer)
+
+    def __iter__(self):
+        return iter(self.ordered())
+
+    def __eq__(self, other) -> bool:
+        try:
+            return len(self) == len(other) and all(
+                mine == theirs for mine, theirs in zip(self, other)
+            )
+        except TypeError:
+            return False
+
+    def __repr__(self) -> str:
+        return "DecimatedHistory({}, {!r}, {})".format(
+            self.k, self.aggregate, list(self)
+        )
+
+
+class TransformedHistory(object):
+    """A read-only history that is func of the histories of other MemoryFloats,
+    aligned at the most recent value, as made by MemoryFloat.transform(lazy=True).
+    Nothing is stored: values are computed when they are read, and the history
+    grows along with the histories of the floats. If vectorized is True, slices are
+    computed with a single call of func on numpy arrays.
+
+    Decimated histories only line up with histories that are decimated the same way,
+    and func of the bucket aggregates is only the value of the bucket for the "last"
+    aggregate, so anything else raises a ValueError.
+    """
+
+    __slots__ = ["floats", "func", "vectorized", "decimation"]
+
+    def __init__(
+        self, floats: Sequence["MemoryFloat"], func: FloatFunc, vectorized: bool = False
+    ):
+        decimations = {_decimation(f.history) for f in floats}
+        if len(decimations) > 1:
+            raise ValueError(
+                "can't align histories that are decimated differently: {}".format(
+                    decimations
+                )
+            )
+        self.floats = floats
+        self.func = func
+        self.vectorized = vectorized and np is not None
+        self.decimation = decimations.pop() if decimations else None
+        if self.decimation is not None and any(
+            aggregate != "last" for _, aggregate, _ in self.decimation
+        ):
+            raise ValueError(
+                "only histories decimated with the last aggregate can be transformed"
+            )
+
+    def append(self, value: float) -> None:
+        raise TypeError("a transformed history is read-only")
+
+    def extend(self, values: Sequence[float]) -> None:
+        raise TypeError("a transformed history is read-only")
+
+    def compute(self, start: int, stop: int, step: int = 1) -> array.array:
+        """The values from start to stop, computed all at once if vectorized"""
+        if self.vectorized and step > 0:
+            values = array.array("d")
+            values.frombytes(
+                memoryview(self.compute_numpy(start, stop, step)).cast("B")
+            )
+            return values
+        length = len(self)
+        return array.array(
+            "d",
+            (
+                self.func(*[f.history[time - length] for f in self.floats])
+                for time in range(start, stop, step)
+            ),
+        )
+
+    def compute_numpy(self, start: int, stop: int, step: int = 1) -> "np.ndarray":
+        """The values from start to stop, from a single call of func on numpy arrays"""
+        length = len(self)
+        inputs = []
+        for f in self.floats:
+            offset = len(f.history) - length
+            inputs.append(f.to_numpy()[offset + start : offset + stop : step])
+        values = np.asarray(self.func(*inputs), dtype=float)
+        return np.ascontiguousarray(
+            np.broadcast_to(values, len(range(start, stop, step)))
+        )
+
+    def ordered(self) -> array.array:
+        """All values, oldest first"""
+        return self.compute(0, len(self))
+
+    def to_numpy(self) -> "np.ndarray":
+        if self.vectorized:
+            return self.compute_numpy(0, len(self))
+        return np.frombuffer(self.ordered(), dtype=float)
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[float, array.array]:
+        length = len(self)
+        if isinstance(item, slice):
+            return self.compute(*item.indices(length))
+        if item < 0:
+            item += length
+        if not 0 <= item < length:
+            raise IndexError("history index out of range")
+        return float(self.func(*[f.history[item - length] for f in self.floats]))
+
+    def __len__(self) -> int:
+        return min(len(f.history) for f in self.floats)
+
+    def __iter__(self):
+        return iter(self.ordered())
+
+    def __eq__(self, other) -> bool:
+        try:
+            return len(self) == len(other) and all(
+                mine == theirs for mine, theirs in zip(self, other)
+            )
+        except TypeError:
+            return False
+
+    def __repr__(self) -> str:
+        return "TransformedHistory({})".format(list(self))
+
+
+class WindowBuffer(object):
+    """A fixed-capacity first-in-first-out buffer for the samples in a finite window,
+    kept in a preallocated circular buffer of floats. The window is at most two
+    contiguous segments of the buffer (see segments()), so slices that don't cross
+    the wraparound are returned as zero-copy memoryviews, and the others as copies,
+    like RingHistory does. Note that a view follows the buffer, so it will change
+    on subsequent pushes; use tolist() (or copy the view) to keep the values around.
+    """
+
+    __slots__ = ["capacity", "buffer", "view", "end", "length"]
+
+    def __init__(self, capacity: int, data: Sequence = None):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.buffer = array.array("d", [0.0]) * capacity
+        self.view = memoryview(self.buffer)
+
+        # Index of the next value to write, and the number of values
+        self.end = 0
+        self.length = 0
+
+        if data:
+            self.extend(data)
+
+    def append(self, value: float) -> None:
+        """Append a value, overwriting the oldest one if the buffer is full"""
+        self.buffer[self.end] = value
+        self.end += 1
+        if self.end == self.capacity:
+            self.end = 0
+        if self.length < self.capacity:
+            self.length += 1
+
+    def extend(self, values: Sequence[float]) -> None:
+        """Append several values, overwriting the oldest ones if the buffer is full"""
+        if not isinstance(values, array.array) or values.typecode != "d":
+            values = array.array("d", values)
+        values = values[-self.capacity :]
+        first = min(len(values), self.capacity - self.end)
+        self.view[self.end : self.end + first] = values[:first]
+        self.view[: len(values) - first] = values[first:]
+        self.end = (self.end + len(values)) % self.capacity
+        self.length = min(self.length + len(values), self.capacity)
+
+    def popleft(self) -> float:
+        """Remove and return the oldest value"""
+        if not self.length:
+            raise IndexError("pop from an empty WindowBuffer")
+        value = self.buffer[self.start]
+        self.length -= 1
+        return value
+
+    def clear(self) -> None:
+        self.length = 0
+
+    def segments(self) -> Tuple[memoryview, memoryview]:
+        """The window as two views of the buffer, oldest first.
+        The second one is empty unless the window crosses the wraparound."""
+        start = self.start
+        if start + self.length <= self.capacity:
+            return self.view[start : start + self.length], self.view[:0]
+        return self.view[start:], self.view[: self.end]
+
+    def ordered(self) -> array.array:
+        """Copy of the window, oldest first"""
+        values = array.array("d")
+        for segment in self.segments():
+            values.frombytes(segment.cast("B"))
+        return values
+
+    def tolist(self) -> List[float]:
+        first, second = self.segments()
+        return first.tolist() + second.tolist()
+
+    def to_numpy(self) -> "np.ndarray":
+        """The window, oldest first. This is a view of the buffer as long as the window
+        doesn't cross the wraparound, and a copy when it does."""
+        first, second = self.segments()
+        if not second:
+            return np.frombuffer(first, dtype=float)
+        return np.concatenate(
+            (np.frombuffer(first, dtype=float), np.frombuffer(second, dtype=float))
+        )
+
+    @property
+    def start(self) -> int:
+        """Index of the oldest value in the buffer"""
+        return (self.end - self.length) % self.capacity
+
+    def __getitem__(
+        self, item: Union[int, slice]
+    ) -> Union[float, memoryview, array.array]:
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self.length)
+            offset = (self.end - self.length) % self.capacity
+            if step == 1 and offset + stop <= self.capacity:
+                # The common case, a contiguous slice before the wraparound
+                return self.view[offset + start : offset + max(start, stop)]
+            indices = range(start, stop, step)
+            if not indices:
+                return self.view[:0]
+            first = self.start + indices[0]
+            last = self.start + indices[-1]
+            if first // self.capacity != last // self.capacity:
+                return self.ordered()[item]
+            first %= self.capacity
+            stop = last % self.capacity + (1 if indices.step > 0 else -1)
+            return self.view[first : stop if stop >= 0 else None : indices.step]
+        if item < 0:
+            item += self.length
+        if not 0 <= item < self.length:
+            raise IndexError("WindowBuffer index out of range")
+        return self.buffer[(self.end - self.length + item) % self.capacity]
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self):
+        return itertools.chain(*self.segments())
+
+    def __eq__(self, other) -> bool:
+        try:
+            return len(self) == len(other) and all(
+                mine == theirs for mine, theirs in zip(self, other)
+            )
+        except TypeError:
+            return False
+
+    def __repr__(self) -> str:
+        return "WindowBuffer({}, {})".format(self.capacity, self.tolist())
+
+
+class RollingExtremum(object):
+    """Rolling minimum or maximum of a window, kept up to date in O(1) amortized time.
+    The candidates for the extremum are kept in a monotonic deque together with
+    their sample indices, so that pop() knows when the current extremum leaves the window.
+    The extremum is assigned to the output on every push.
+    If there are NaNs in the window, the extremum is NaN, like in RollingQuantiles.
+    """
+
+    __slots__ = [
+        "output",
+        "outputs",
+        "better",
+        "candidates",
+        "pushed",
+        "popped",
+        "nans",
+    ]
+
+    def __init__(self, output: "MemoryFloat", maximum: bool = False):
+        self.output = output
+        self.outputs = [output]
+        self.better = operator.gt if maximum else operator.lt
+        self.candidates = deque()  # Deque[Tuple[int, float]]
+        self.pushed = 0
+        self.popped = 0
+        self.nans = 0
+
+    def push(self, value: float) -> None:
+        """Add a value to the end of the window"""
+        candidates = self.candidates
+        if value != value:
+            self.nans += 1
+        else:
+            while candidates and self.better(value, candidates[-1][1]):
+                candidates.pop()
+            candidates.append((self.pushed, value))
+        self.pushed += 1
+        self.output.assign(nan if self.nans else candidates[0][1])
+
+    def pop(self, value: float) -> None:
+        """Remove the oldest value from the window"""
+        if value != value:
+            self.nans -= 1
+        elif self.candidates and self.candidates[0][0] == self.popped:
+            self.candidates.popleft()
+        self.popped += 1
+
+
+class CentralMoments(object):
+    """The central moment sums of a window, M2 = sum((x - mean) ** 2),
+    M3 = sum((x - mean) ** 3) and M4 = sum((x - mean) ** 4), updated and downdated in O(1).
+    The update is the one-pass formula of Pebay (2008), which extends Welford's,
+    and the downdate is its exact inverse. The tracker keeps its own mean and M2,
+    so the three sums are consistent with each other on both the scalar and the batch path.
+
+    Downdating cancels: when large values leave the window, what is left of the sums
+    is mostly the rounding error of the large values. So the sums are recomputed exactly
+    from the window whenever M2 or M4 has dropped to a small fraction (CANCELLATION)
+    of its largest value since the last recomputation, and after every window's worth
+    of evictions to bound the drift. Both are amortized O(1) per sample.
+    The tracker keeps its own copy of the window, like RollingExtremum and RollingQuantiles,
+    because push_batch() replays trackers after the window buffer has been updated.
+    """
+
+    __slots__ = [
+        "outputs",
+        "window",
+        "mean",
+        "M2",
+        "M3",
+        "M4",
+        "scale2",
+        "scale4",
+        "evictions",
+    ]
+
+    def __init__(self, M2: "MemoryFloat", M3: "MemoryFloat", M4: "MemoryFloat"):
+        self.outputs = [M2, M3, M4]
+        self.window = deque()
+        self.mean = 0.0
+        self.M2 = 0.0
+        self.M3 = 0.0
+        self.M4 = 0.0
+        self.scale2 = 0.0
+        self.scale4 = 0.0
+        self.evictions = 0
+
+    def push(self, value: float) -> None:
+        """Add a value to the window"""
+        self.window.append(value)
+        n = len(self.window)
+        n1 = n - 1
+        delta = value - self.mean
+        delta_n = delta / n
+        delta_n2 = delta_n * delta_n
+        term = delta * delta_n * n1
+        self.mean += delta_n
+        self.M4 += (
+            term * delta_n2 * (n * n - 3 * n + 3)
+            + 6 * delta_n2 * self.M2
+            - 4 * delta_n * self.M3
+        )
+        self.M3 += term * delta_n * (n - 2) - 3 * delta_n * self.M2
+        self.M2 += term
+        self.scale2 = max(self.scale2, self.M2)
+        self.scale4 = max(self.scale4, self.M4)
+        self.assign()
+
+    def pop(self, value: float) -> None:
+        """Remove the oldest value from the window"""
+        self.window.popleft()
+        n1 = len(self.window)
+        n = n1 + 1
+        self.evictions += 1
+        if n1 == 0:
+            self.recompute()
+            return
+        self.mean = (n * self.mean - value) / n1
+        delta = value - self.mean
+        delta_n = delta / n
+        delta_n2 = delta_n * delta_n
+        term = delta * delta_n * n1
+        self.M2 -= term
+        self.M3 -= term * delta_n * (n - 2) - 3 * delta_n * self.M2
+        self.M4 -= (
+            term * delta_n2 * (n * n - 3 * n + 3)
+            + 6 * delta_n2 * self.M2
+            - 4 * delta_n * self.M3
+        )
+        if (
+            self.evictions >= n1
+            or self.M2 < CANCELLATION * self.scale2
+            or self.M4 < CANCELLATION * self.scale4
+        ):
+            self.recompute()
+        else:
+            self.assign()
+
+    def recompute(self) -> None:
+        """Compute the mean and the sums exactly from the window, with two passes"""
+        window = self.window
+        n = len(window)
+        self.evictions = 0
+        if not n:
+            self.mean = self.M2 = self.M3 = self.M4 = 0.0
+        else:
+            mean = math.fsum(window) / n
+            # Correct the rounding of the mean, which makes it exact for constant windows
+            mean += math.fsum([x - mean for x in window]) / n
+            deltas = [x - mean for x in window]
+            squares = [d * d for d in deltas]
+            self.mean = mean
+            self.M2 = math.fsum(squares)
+            self.M3 = math.fsum([d * s for d, s in zip(deltas, squares)])
+            self.M4 = math.fsum([s * s for s in squares])
+            if self.M2 <= n * (4 * EPSILON * mean) ** 2:
+                # A spread below the resolution of the values is rounding noise
+                self.M2 = self.M3 = self.M4 = 0.0
+        self.scale2 = self.M2
+        self.scale4 = self.M4
+        self.assign()
+
+    def assign(self) -> None:
+        if self.window:
+            for output, value in zip(self.outputs, (self.M2, self.M3, self.M4)):
+                output.assign(value)
+        else:
+            for output in self.outputs:
+                output.assign(nan)
+
+
+class OrderStatistics(object):
+    """A sorted multiset of floats with insertion, removal and access by rank in O(log n).
+    The values are kept in sorted blocks of between load / 2 and 2 * load values.
+    A Fenwick tree over the block lengths finds the block holding a given rank.
+    It is updated in place while the block structure stays the same,
+    and rebuilt lazily after a block is split or merged.
+    """
+
+    __slots__ = ["load", "blocks", "maxes", "tree", "length"]
+
+    def __init__(self, data: Sequence[float] = (), load: int = 512):
+        self.load = load
+        self.blocks = []  # List[List[float]]
+        self.maxes = []  # List[float]
+        self.tree = None  # Optional[List[int]]
+        self.length = 0
+        for value in data:
+            self.add(value)
+
+    def add(self, value: float) -> None:
+        blocks, maxes = self.blocks, self.maxes
+        self.length += 1
+        if not blocks:
+            blocks.append([value])
+            maxes.append(value)
+            self.tree = None
+            return
+
+        i = bisect.bisect_left(maxes, value)
+        if i == len(maxes):
+            i -= 1
+            blocks[i].append(value)
+            maxes[i] = value
+        else:
+            bisect.insort(blocks[i], value)
+
+        if len(blocks[i]) > 2 * self.load:
+            block = blocks[i]
+            blocks[i : i + 1] = [block[: self.load], block[self.load :]]
+            maxes[i : i + 1] = [block[self.load - 1], block[-1]]
+            self.tree = None
+        elif self.tree is not None:
+            self._tree_add(i, 1)
+
+    def remove(self, value: float) -> None:
+        blocks, maxes = self.blocks, self.maxes
+        i = bisect.bisect_left(maxes, value)
+        if i < len(maxes):
+            block = blocks[i]
+            j = bisect.bisect_left(block, value)
+            if block[j] == value:
+                del block[j]
+                self.length -= 1
+                if len(block) < self.load // 2 and len(blocks) > 1:
+                    self._merge(i)
+                elif not block:
+                    del blocks[i]
+                    del maxes[i]
+                    self.tree = None
+                else:
+                    maxes[i] = block[-1]
+                    if self.tree is not None:
+                        self._tree_add(i, -1)
+                return
+        raise ValueError("{} is not in the OrderStatistics".format(value))
+
+    def quantile(self, q: float) -> float:
+        """The q-quantile, interpolating linearly between the closest ranks"""
+        if not self.length:
+            return nan
+        position = q * (self.length - 1)
+        rank = int(position)
+        fraction = position - rank
+        low = self[rank]
+        if not fraction:
+            return low
+        return low + (self[rank + 1] - low) * fraction
+
+    def _merge(self, i: int) -> None:
+        """Merge the block at i with a neighbour, splitting it again if it gets too big"""
+        if i == 0:
+            i = 1
+        blocks, maxes = self.blocks, self.maxes
+        block = blocks[i - 1] + blocks[i]
+        if len(block) > 2 * self.load:
+            half = len(block) // 2
+            blocks[i - 1 : i + 1] = [block[:half], block[half:]]
+            maxes[i - 1 : i + 1] = [block[half - 1], block[-1]]
+        else:
+            blocks[i - 1 : i + 1] = [block]
+            maxes[i - 1 : i + 1] = [block[-1]]
+        self.tree = None
+
+    def _build_tree(self) -> List[int]:
+        tree = [0] + [len(block) for block in self.blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+        return tree
+
+    def _tree_add(self, i: int, delta: int) -> None:
+        tree = self.tree
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def __getitem__(self, rank: int) -> float:
+        if rank < 0:
+            rank += self.length
+        if not 0 <= rank < self.length:
+            raise IndexError("OrderStatistics index out of range")
+        tree = self.tree if self.tree is not None else self._build_tree()
+
+        # Descend the Fenwick tree to the block containing the rank
+        i = 0
+        step = 1 << (len(tree).bit_length() - 1)
+        while step:
+            if i + step < len(tree) and tree[i + step] <= rank:
+                i += step
+                rank -= tree[i]
+            step >>= 1
+        return self.blocks[i][rank]
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self):
+        for block in self.blocks:
+            yield from block
+
+
+class RollingQuantiles(object):
+    """Rolling quantiles of a window, all sharing one OrderStatistics.
+    If there are NaNs in the window, all quantiles are NaN."""
+
+    __slots__ = ["outputs", "quantiles", "order_statistics", "nans"]
+
+    def __init__(self):
+        self.outputs = []  # List[MemoryFloat]
+        self.quantiles = []  # List[float]
+        self.order_statistics = OrderStatistics()
+        self.nans = 0
+
+    def add_output(self, q: float, output: "MemoryFloat") -> None:
+        """Keep the q-quantile of the window in output"""
+        if not 0 <= q <= 1:
+            raise ValueError("quantiles must be between 0 and 1")
+        self.quantiles.append(q)
+        self.outputs.append(output)
+        output.assign(self.quantile(q))
+
+    def quantile(self, q: float) -> float:
+        if self.nans:
+            return nan
+        return self.order_statistics.quantile(q)
+
+    def push(self, value: float) -> None:
+        """Add a value to the window"""
+        if value != value:
+            self.nans += 1
+        else:
+            self.order_statistics.add(value)
+        for q, output in zip(self.quantiles, self.outputs):
+            output.assign(self.quantile(q))
+
+    def pop(self, value: float) -> None:
+        """Remove a value from the window"""
+        if value != value:
+            self.nans -= 1
+        else:
+            self.order_statistics.remove(value)
+
+
 class MemoryFloat(object):
     """A floating point number that knows its own history.
     Every time its save() function gets called, the current value gets appended to the history.
+    If max_history is given, only the last max_history values are kept.
+    If record is False, save() doesn't touch the history at all and only calls the hooks.
+    A history container can be passed in to store the history somewhere else than
+    in an array on the heap, e.g. a DiskHistory; max_history is ignored then.
     """
 
-    __slots__ = ["value", "history", "hooks"]
+    __slots__ = ["value", "history", "hooks", "max_history", "record"]
 
-    def __init__(self, value: float = nan):
+    def __init__(
+        self,
+        value: float = nan,
+        max_history: Optional[int] = None,
+        record: bool = True,
+        history: Any = None,
+    ):
         self.value = value
-        self.history = self.new_history_container()
+        self.max_history = max_history
+        self.record = record
+        if history is None:
+            history = self.new_history_container(max_history=max_history)
+        self.history = history
         self.hooks = []  # List[FloatFunc]
 
     @classmethod
-    def new_history_container(cls, data: Sequence = None):
-        """Using an array for the history seems to save about 20% memory according to profiling."""
+    def new_history_container(cls, data: Sequence = None, max_history: int = None):
+        """Using an array for the history seems to save about 20% memory according to profiling.
+        With a max_history, a preallocated RingHistory is used instead."""
+        if max_history is not None:
+            return RingHistory(max_history, data)
         if data:
             return array.array("d", data)
         else:
             return array.array("d")
 
     @classmethod
-    def transform(cls, *floats: "MemoryFloat", func: FloatFunc) -> "MemoryFloat":
-        values_now = [value.value for value in floats]
-        value = func(*values_now)
-        history = []
-        for time in range(len(floats[0])):
-            values_at_time = [value.history[time] for value in floats]
-            history.append(func(*values_at_time))
-        result = MemoryFloat(value)
-        result.history = cls.new_history_container(history)
-        return result
+    def transform(
+        cls,
+        *floats: "MemoryFloat",
+        func: FloatFunc,
+        vectorized: bool = False,
+        lazy: bool = False,
+    ) -> "MemoryFloat":
+        """Apply func to the values and the histories of the floats.
+        If the histories have different lengths, they are aligned at the most recent value
+        and only the common tail is transformed. Decimated histories can only be transformed
+        together with the same decimation, and only with the last aggregate (see
+        TransformedHistory).
+
+        If vectorized is True, func must work elementwise on numpy arrays (like a ufunc,
+        or arithmetic on its arguments), and it is called once with the whole histories
+        instead of once per value. Without numpy, func is called per value after all.
+
+        If lazy is True, the history of the result is a TransformedHistory, a read-only view
+        that computes the values that are read (one by one, or a slice at a time)
+        and follows the histories of the floats as they grow. Use copy() to materialize it.
+        """
+        value = func(*[f.value for f in floats])
+        if vectorized and np is not None:
+            value = float(value)
+        max_histories = [f.max_history for f in floats if f.max_history is not None]
+        max_history = min(max_histories) if max_histories else None
+        transformed = TransformedHistory(floats, func, vectorized)
+
+        if lazy:
+            return MemoryFloat(value, max_history, record=False, history=transformed)
+        if vectorized and np is not None:
+            values = transformed.to_numpy()
+            if max_history is not None:
+                history = RingHistory(
+                    max_history, array.array("d", values[-max_history:].tobytes())
+                )
+            else:
+                # Wrap the result instead of copying it into an array
+                history = MappedHistory(memoryview(values))
+            return MemoryFloat(value, max_history, history=history)
+        history = transformed.ordered()
+        if max_history is not None:
+            history = RingHistory(max_history, history)
+        return MemoryFloat(value, max_history, history=history)
 
     def save(self) -> None:
-        self.history.append(self.value)
+        if self.record:
+            try:
+                self.history.append(self.value)
+            except BufferError:
+                self.detach_history()
+                self.history.append(self.value)
         for hook in self.hooks:
             hook(self)
 
+    def detach_history(self) -> None:
+        """Continue the history in a GrowableHistory, because a view of the array from
+        to_numpy() is still alive and array.array refuses to resize an exported buffer.
+        This copies the history once; after that, views no longer get in the way."""
+        self.history = GrowableHistory(self.history)
+
     def copy(self) -> "MemoryFloat":
-        result = MemoryFloat(self.value)
-        result.history = self.new_history_container(self.history)
+        result = MemoryFloat(
+            self.value, max_history=self.max_history, record=self.record
+        )
+        result.history = self.new_history_container(self.history, self.max_history)
         return result
 
+    def extend(self, values: Sequence[float]) -> None:
+        """Append several values to the history at once, leaving the last one as the current value.
+        Unlike save(), this does not call any hooks."""
+        if len(values):
+            if self.record:
+                try:
+                    self.history.extend(values)
+                except BufferError:
+                    self.detach_history()
+                    self.history.extend(values)
+            self.value = values[-1]
+
+    def to_numpy(self) -> "np.ndarray":
+        """The history as a numpy array, without copying it where possible.
+        Without a max_history, the result is a view of the history, which keeps the values
+        it was created with: if the view is still alive when the history grows, the history
+        is copied once into a GrowableHistory (see detach_history()), which later views
+        never get in the way of. With a max_history, the result
+        is a view until the circular buffer wraps around and a copy after that,
+        and a view sees later values overwrite the old ones.
+        """
+        if isinstance(self.history, array.array):
+            return np.frombuffer(self.history, dtype=float)
+        return self.history.to_numpy()
+
     def add_hook(self, hook: HookFunc) -> None:
         self.hooks.append(hook)
 
     @classmethod
-    def connect(cls, *inputs: "MemoryFloat", output: "MemoryFloat", func: FloatFunc):
+    def connect(
+        cls, *inputs: "MemoryFloat", output: "MemoryFloat", func: FloatFunc
+    ) -> HookFunc:
+        """Make output follow func(*inputs), updating and saving it
+        once all of the inputs have been saved."""
         pool = set()
-        all_ids = {id(input) for input in inputs}
+        n_inputs = len({id(input) for input in inputs})
 
         def hook(input: "MemoryFloat") -> None:
-            nonlocal pool
             pool.add(id(input))
-            if set(pool) == all_ids:
+            if len(pool) == n_inputs:
+                pool.clear()
                 output.assign(func(*inputs))
                 output.save()
-                pool = set()
 
         for input in inputs:
             input.add_hook(hook)
+        return hook
 
     def __str__(self) -> str:
         return "MemoryFloat(v={:.2f}, history={})".format(
@@ -150,6 +1494,12 @@ class MemoryFloat(object):
     def __rsub__(self, other) -> float:
         return other - self.value
 
+    def __mul__(self, other) -> float:
+        return self.value * other
+
+    def __rmul__(self, other) -> float:
+        return other * self.value
+
     def __rtruediv__(self, other) -> float:
         return other / self.value
 
@@ -157,71 +1507,734 @@ class MemoryFloat(object):
         return self.value / other
 
 
-class Container(object):
+class LazyFloat(MemoryFloat):
+    """A MemoryFloat that is func of other MemoryFloats, computed when it is read
+    instead of on every push. The value is computed from the current values of the inputs,
+    and the history is a TransformedHistory of the histories of the inputs,
+    so it is only as long as the shortest recorded input history.
+    """
+
+    __slots__ = ["inputs", "func"]
+
     def __init__(
         self,
-        data: Optional[Sequence] = None,
-        window_size: Union[int, float] = float("inf"),
+        inputs: Sequence[MemoryFloat],
+        func: FloatFunc,
+        max_history: Optional[int] = None,
     ):
-        """Initialize the data and all metadata"""
-        # Data container - if any data is provided in th initializer,
-        # it will be filled at the end.
-        self.data = deque()
+        self.inputs = inputs
+        self.func = func
+        self.max_history = max_history
+        self.record = False
+        self.history = TransformedHistory(inputs, func)
+        self.hooks = []
+
+    @property
+    def value(self) -> float:
+        return float(self.func(*self.inputs))
+
+    @value.setter
+    def value(self, value: float) -> None:
+        raise AttributeError("the value of a LazyFloat is computed from its inputs")
+
+
+class Summary(object):
+    """The state of a window in a compact, picklable form: n, M, S, sum, reciprocal_sum
+    and optionally min and max (None if not tracked).
+    Summaries of disjoint sets of samples can be combined with merge(),
+    in any order, to get the summary of their union.
+    """
 
-        # Set the window size
-        self.window_size = window_size
+    __slots__ = ["n", "M", "S", "sum", "reciprocal_sum", "min", "max"]
 
-        # The current value.
-        self.value = MemoryFloat(nan)
+    def __init__(
+        self,
+        n: int = 0,
+        M: float = nan,
+        S: float = nan,
+        sum: float = 0,
+        reciprocal_sum: float = nan,
+        min: Optional[float] = None,
+        max: Optional[float] = None,
+    ):
+        self.n = n
+        self.M = M
+        self.S = S
+        self.sum = sum
+        self.reciprocal_sum = reciprocal_sum
+        self.min = min
+        self.max = max
+
+    def merge(self, other: "Summary") -> "Summary":
+        """Combine two summaries using the parallel formulas of Chan et al."""
+        if not other.n:
+            return self.copy()
+        if not self.n:
+            return other.copy()
+        n = self.n + other.n
+        delta = other.M - self.M
+        return Summary(
+            n=n,
+            M=self.M + delta * other.n / n,
+            S=self.S + other.S + delta * delta * self.n * other.n / n,
+            sum=self.sum + other.sum,
+            reciprocal_sum=self.reciprocal_sum + other.reciprocal_sum,
+            min=(
+                None
+                if self.min is None or other.min is None
+                else min(self.min, other.min)
+            ),
+            max=(
+                None
+                if self.max is None or other.max is None
+                else max(self.max, other.max)
+            ),
+        )
 
-        # The number of samples in the window.
-        # This is always less than or equal to the window size.
-        self.n = MemoryFloat(0)
+    def copy(self) -> "Summary":
+        return Summary(*(getattr(self, name) for name in self.__slots__))
 
-        # The current mean.
-        self.M = MemoryFloat(nan)
+    @property
+    def mean(self) -> float:
+        return self.M
 
-        # The current sum.
-        self.sum = MemoryFloat(0)
+    @property
+    def var(self) -> float:
+        return var(self.S, self.n)
 
-        # The current sum of squared differences from the mean.
-        # Used to calculate the variance and standard deviation.
-        self.S = MemoryFloat(nan)
+    @property
+    def std(self) -> float:
+        return std(self.S, self.n)
 
-        # The current sum of reciprocals.
-        # Used to calculate the harmonic mean.
-        self.reciprocal_sum = MemoryFloat(nan)
+    @property
+    def pop_var(self) -> float:
+        return pop_var(self.S, self.n)
 
-        # When adding a new memory float, add it to self.mem_floats
-        # so it gets saved on every push.
-        self.mem_floats = (
-            self.value,
-            self.n,
-            self.S,
-            self.M,
-            self.sum,
-            self.reciprocal_sum,
-        )
+    @property
+    def pop_std(self) -> float:
+        return pop_std(self.S, self.n)
 
-        # Dumb corner case: if the window size is <0,
-        # there is no need to do anything when pushing
-        if self.window_size <= 0:
-            self.push = lambda datapoints: None
+    @property
+    def harmonic_mean(self) -> float:
+        return self.n / self.reciprocal_sum if self.n else nan
 
-        # Push any initial data
-        if data:
-            self.push(*data)
+    def __getstate__(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
 
-    def subscribe(self, varname: str, *inputs: "MemoryFloat", func: FloatFunc) -> None:
-        output = MemoryFloat(nan)
-        setattr(self, varname, output)
-        MemoryFloat.connect(*inputs, output=output, func=func)
+    def __setstate__(self, state: tuple) -> None:
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
 
-    def subscribe_var(self) -> None:
-        self.subscribe("var", self.S, self.n, func=var)
+    def __eq__(self, other) -> bool:
+        if isinstance(other, self.__class__):
+            return self.__getstate__() == other.__getstate__()
+        return False
 
-    def subscribe_std(self) -> None:
-        self.subscribe("std", self.S, self.n, func=std)
+    def __repr__(self) -> str:
+        return "Summary({})".format(
+            ", ".join(
+                "{}={}".format(name, getattr(self, name)) for name in self.__slots__
+            )
+        )
+
+
+class TimedTracker(object):
+    """A tracker (see Container.add_tracker()) whose push and pop are counted and timed.
+    Everything else is passed through, and isinstance() sees the class of the tracker,
+    so the container can treat it like the tracker itself."""
+
+    __slots__ = ["tracker", "calls", "time"]
+
+    def __init__(self, tracker: Any):
+        self.tracker = tracker
+        self.calls = 0
+        self.time = 0.0
+
+    @property
+    def __class__(self) -> type:
+        return type(self.tracker)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.tracker, name)
+
+    def push(self, value: float) -> None:
+        start = time.perf_counter()
+        self.tracker.push(value)
+        self.time += time.perf_counter() - start
+        self.calls += 1
+
+    def pop(self, value: float) -> None:
+        start = time.perf_counter()
+        self.tracker.pop(value)
+        self.time += time.perf_counter() - start
+        self.calls += 1
+
+
+class Instrumentation(object):
+    """Counters and timings of a container, to find out where the time of a push goes.
+    Attach it with BaseContainer.instrument(). While attached, push, push_batch and save
+    of the container are replaced by timed versions, and so are the functions of the
+    subscriptions, its trackers (min, max, quantiles, ...) and the hooks of its MemoryFloats;
+    detaching puts the originals back, so an uninstrumented container pays nothing at all.
+
+    If a sink is given, it is called with stats() at most every interval seconds,
+    after a push.
+    """
+
+    def __init__(
+        self,
+        container: "BaseContainer",
+        sink: Optional[Callable[[Dict[str, Any]], Any]] = None,
+        interval: float = 1.0,
+    ):
+        self.container = container
+        self.sink = sink
+        self.interval = interval
+        self.last_emit = time.perf_counter()
+
+        self.saves = 0
+        self.bulk_pushes = 0
+        self.push_time = 0.0
+        self.history_time = 0.0
+        self.hook_calls = 0
+        self.hook_time = 0.0
+        self.subscription_calls = {}  # Dict[str, int]
+        self.subscription_time = {}  # Dict[str, float]
+        self.subscription_total = 0.0
+
+        # The number of samples in the window when attached, to count evictions
+        self.n0 = container.n.value if hasattr(container, "n") else None
+
+        # Nesting depth of the timed push methods, so nested calls aren't counted twice
+        self.depth = 0
+
+        # The instance attributes that are replaced, and the original hooks
+        self.originals = {}
+        self.hooks = []  # List[Tuple[MemoryFloat, List[HookFunc]]]
+
+    def attach(self) -> None:
+        container = self.container
+        for name, wrap in (
+            ("push", self.wrap_push),
+            ("push_batch", self.wrap_push_batch),
+            ("save", self.wrap_save),
+        ):
+            if hasattr(container, name):
+                self.originals[name] = vars(container).get(name)
+                setattr(container, name, wrap(getattr(container, name)))
+        for mem_float in self.mem_floats():
+            self.hooks.append((mem_float, mem_float.hooks))
+            mem_float.hooks = [self.wrap_hook(hook) for hook in mem_float.hooks]
+        if hasattr(container, "trackers"):
+            container.trackers = [
+                TimedTracker(tracker) for tracker in container.trackers
+            ]
+        container.instrumentation = self
+        container.plan = container.compile_plan()
+
+    def detach(self) -> None:
+        container = self.container
+        for name, original in self.originals.items():
+            if original is None:
+                delattr(container, name)
+            else:
+                setattr(container, name, original)
+        for mem_float, hooks in self.hooks:
+            mem_float.hooks = hooks
+        if hasattr(container, "trackers"):
+            container.trackers = [timed.tracker for timed in container.trackers]
+        container.instrumentation = None
+        container.plan = container.compile_plan()
+
+    def mem_floats(self) -> List["MemoryFloat"]:
+        return [mem_float for name, mem_float in self.named_mem_floats()]
+
+    def named_mem_floats(self) -> List[Tuple[str, "MemoryFloat"]]:
+        return [
+            (name, attr)
+            for name, attr in vars(self.container).items()
+            if isinstance(attr, MemoryFloat)
+        ]
+
+    def wrap_push(self, push: Callable) -> Callable:
+        def timed_push(*args: Any, **kwargs: Any) -> None:
+            self.depth += 1
+            start = time.perf_counter()
+            try:
+                push(*args, **kwargs)
+            finally:
+                self.depth -= 1
+            if not self.depth:
+                self.push_time += time.perf_counter() - start
+                self.maybe_emit()
+
+        return timed_push
+
+    def wrap_push_batch(self, push_batch: Callable) -> Callable:
+        def timed_push_batch(datapoints: Sequence[float], *args: Any) -> None:
+            # The vectorized path doesn't call save(), so count the samples it pushes
+            saves = self.saves
+            self.depth += 1
+            start = time.perf_counter()
+            try:
+                push_batch(datapoints, *args)
+            finally:
+                self.depth -= 1
+            if not self.depth:
+                self.push_time += time.perf_counter() - start
+                self.bulk_pushes += len(datapoints) - (self.saves - saves)
+                self.maybe_emit()
+
+        return timed_push_batch
+
+    def wrap_save(self, save: Callable) -> Callable:
+        def timed_save() -> None:
+            others = self.subscription_total + self.hook_time
+            start = time.perf_counter()
+            save()
+            elapsed = time.perf_counter() - start
+            self.saves += 1
+            self.history_time += elapsed - (
+                self.subscription_total + self.hook_time - others
+            )
+
+        return timed_save
+
+    def wrap_hook(self, hook: HookFunc) -> HookFunc:
+        def timed_hook(mem_float: "MemoryFloat") -> Any:
+            start = time.perf_counter()
+            result = hook(mem_float)
+            self.hook_time += time.perf_counter() - start
+            self.hook_calls += 1
+            return result
+
+        return timed_hook
+
+    def wrap_plan(self, plan: tuple) -> tuple:
+        """Replace the functions of the subscriptions by timed versions"""
+        names = {id(mem_float): name for name, mem_float in self.named_mem_floats()}
+        return tuple(
+            (output, inputs, self.wrap_subscription(names.get(id(output), "?"), func))
+            for output, inputs, func in plan
+        )
+
+    def wrap_subscription(self, name: str, func: FloatFunc) -> FloatFunc:
+        self.subscription_calls.setdefault(name, 0)
+        self.subscription_time.setdefault(name, 0.0)
+
+        def timed_func(*inputs: "MemoryFloat") -> float:
+            start = time.perf_counter()
+            result = func(*inputs)
+            elapsed = time.perf_counter() - start
+            self.subscription_calls[name] += 1
+            self.subscription_time[name] += elapsed
+            self.subscription_total += elapsed
+            return result
+
+        return timed_func
+
+    def maybe_emit(self) -> None:
+        if self.sink is not None:
+            now = time.perf_counter()
+            if now - self.last_emit >= self.interval:
+                self.last_emit = now
+                self.sink(self.stats())
+
+    def stats(self) -> Dict[str, Any]:
+        """The counters and timings since the instrumentation was attached.
+        Times are in seconds. update_time is the time in push and push_batch spent on
+        anything else than saving histories, hooks, subscriptions and trackers: mostly
+        the arithmetic, and the bulk history appends of push_batch."""
+        pushes = self.saves + self.bulk_pushes
+        evictions = 0
+        if self.n0 is not None:
+            evictions = max(int(pushes - (self.container.n.value - self.n0)), 0)
+        history_bytes = 0
+        disk_history_bytes = 0
+        for mem_float in self.mem_floats():
+            history = mem_float.history
+            if isinstance(history, DiskHistory):
+                disk_history_bytes += 8 * len(history)
+            elif isinstance(history, RingHistory):
+                history_bytes += 8 * history.max_history
+            elif isinstance(history, MappedHistory):
+                history_bytes += 8 * len(history.tail)
+            elif isinstance(history, GrowableHistory):
+                history_bytes += 8 * len(history.buffer)
+            elif isinstance(history, TransformedHistory):
+                continue
+            else:
+                history_bytes += 8 * len(history)
+        subscriptions = {
+            name: {
+                "calls": self.subscription_calls[name],
+                "time": self.subscription_time[name],
+            }
+            for name in self.subscription_calls
+        }
+        # Trackers are listed under the names of their outputs, e.g. "median,p95"
+        names = {id(mem_float): name for name, mem_float in self.named_mem_floats()}
+        for timed in getattr(self.container, "trackers", ()):
+            name = ",".join(names.get(id(output), "?") for output in timed.outputs)
+            subscriptions[name] = {"calls": timed.calls, "time": timed.time}
+        subscription_total = sum(stats["time"] for stats in subscriptions.values())
+        return {
+            "pushes": pushes,
+            "evictions": evictions,
+            "push_time": self.push_time,
+            "update_time": self.push_time
+            - self.history_time
+            - self.hook_time
+            - subscription_total,
+            "history_time": self.history_time,
+            "hook_calls": self.hook_calls,
+            "hook_time": self.hook_time,
+            "subscription_time": subscription_total,
+            "subscriptions": subscriptions,
+            "history_bytes": history_bytes,
+            "disk_history_bytes": disk_history_bytes,
+        }
+
+
+class BaseContainer(object):
+    """Bookkeeping shared by all containers: creating MemoryFloats with the
+    history settings of the container, subscriptions and saving."""
+
+    def __init__(
+        self,
+        max_history: Optional[int] = None,
+        record: Optional[Iterable[str]] = None,
+        history_dir: Optional[str] = None,
+        lazy: bool = False,
+        resume: bool = False,
+        decimation: Optional[Sequence[Sequence[Any]]] = None,
+        decimation_aggregate: str = "last",
+    ):
+        if history_dir is not None and max_history is not None:
+            raise ValueError("history_dir and max_history can't be combined")
+        if decimation is not None and (
+            max_history is not None or history_dir is not None
+        ):
+            raise ValueError(
+                "decimation can't be combined with max_history or history_dir"
+            )
+        if history_dir is not None and not resume:
+            existing = [
+                name for name in os.listdir(history_dir) if name.endswith(".hist")
+            ]
+            if existing:
+                raise FileExistsError(
+                    "{} already holds histories ({}), pass resume=True to continue them".format(
+                        history_dir, ", ".join(sorted(existing))
+                    )
+                )
+
+        # The maximum number of values kept in each history (None for no limit)
+        self.max_history = max_history
+
+        # The directory for DiskHistory files, one per quantity (None to keep histories in memory)
+        self.history_dir = history_dir
+
+        # Whether to continue the histories already in history_dir
+        self.resume = resume
+
+        # The (k, max_history) tiers and the aggregate of the DecimatedHistories
+        # of all quantities (None to keep every value)
+        self.decimation = None if decimation is None else tuple(map(tuple, decimation))
+        self.decimation_aggregate = decimation_aggregate
+
+        # The names of the quantities that keep a history (None for all of them)
+        self.record = None if record is None else frozenset(record)
+
+        # When adding a new memory float, add it to self.mem_floats
+        # so it gets saved on every push.
+        self.mem_floats = ()
+
+        # Everything added with subscribe(), in order of subscription,
+        # as (output, inputs, func) tuples.
+        self.subscriptions = []
+
+        # The subscriptions in the order they are evaluated in on every save,
+        # so that every output is computed after all of its inputs.
+        self.plan = ()
+
+        # The Instrumentation attached with instrument(), if any
+        self.instrumentation = None
+
+        # Whether subscriptions are LazyFloats, computed when read instead of on every push
+        self.lazy = lazy
+
+    def new_memory_float(self, name: str, value: float) -> MemoryFloat:
+        """Create a MemoryFloat for the quantity with the given name,
+        with the history settings of the container."""
+        record = self.record is None or name in self.record
+        history = self.new_history(name) if record else None
+        return MemoryFloat(value, self.max_history, record, history)
+
+    def new_history(self, name: str) -> Any:
+        """The history container for the quantity with the given name: a DiskHistory
+        with a history_dir, a DecimatedHistory with a decimation, or else None
+        for the default of MemoryFloat"""
+        if self.history_dir is not None:
+            return DiskHistory(
+                os.path.join(self.history_dir, name + ".hist"), resume=self.resume
+            )
+        if self.decimation is not None:
+            return DecimatedHistory.tiers(
+                *self.decimation, aggregate=self.decimation_aggregate
+            )
+        return None
+
+    def subscribe(self, varname: str, *inputs: "MemoryFloat", func: FloatFunc) -> None:
+        if self.lazy:
+            if self.record is None or varname in self.record:
+                self.check_recorded(varname, inputs)
+            output = LazyFloat(inputs, func, self.max_history)
+        else:
+            output = self.new_memory_float(varname, nan)
+        setattr(self, varname, output)
+        self.subscriptions.append((output, inputs, func))
+        self.plan = self.compile_plan()
+
+    def check_recorded(self, varname: str, inputs: Sequence["MemoryFloat"]) -> None:
+        """Raise a ValueError unless all inputs have a history, which the history
+        of a LazyFloat computed from them needs"""
+
+        def recorded(mem_float: "MemoryFloat") -> bool:
+            if isinstance(mem_float, LazyFloat):
+                return all(recorded(input) for input in mem_float.inputs)
+            return mem_float.record
+
+        names = {id(attr): name for name, attr in vars(self).items()}
+        missing = [names.get(id(input), "?") for input in inputs if not recorded(input)]
+        if missing:
+            raise ValueError(
+                "the history of {} is computed from {}, which must be recorded too".format(
+                    varname, ", ".join(missing)
+                )
+            )
+
+    def compile_plan(self) -> tuple:
+        """Sort the subscriptions topologically, so that subscriptions depending on the output
+        of other subscriptions are evaluated after them."""
+        producers = {id(sub[0]): sub for sub in self.subscriptions}
+        plan = []
+        done = set()
+
+        def visit(sub: tuple) -> None:
+            if id(sub[0]) in done:
+                return
+            done.add(id(sub[0]))
+            for input in sub[1]:
+                if id(input) in producers:
+                    visit(producers[id(input)])
+            plan.append(sub)
+
+        for sub in self.subscriptions:
+            if not isinstance(sub[0], LazyFloat):
+                visit(sub)
+        if self.instrumentation is not None:
+            return self.instrumentation.wrap_plan(plan)
+        return tuple(plan)
+
+    def save(self) -> None:
+        """Save all quantities, then evaluate and save every subscription exactly once"""
+        for mem_float in self.mem_floats:
+            mem_float.save()
+        for output, inputs, func in self.plan:
+            output.value = func(*inputs)
+            output.save()
+
+    def instrument(
+        self,
+        sink: Optional[Callable[[Dict[str, Any]], Any]] = None,
+        interval: float = 1.0,
+    ) -> Instrumentation:
+        """Start counting pushes and evictions and timing pushes, history appends, hooks and
+        subscriptions, see Instrumentation. Hooks added later are not timed."""
+        if self.instrumentation is None:
+            Instrumentation(self, sink, interval).attach()
+        return self.instrumentation
+
+    def uninstrument(self) -> None:
+        """Stop the instrumentation and restore the untimed methods"""
+        if self.instrumentation is not None:
+            self.instrumentation.detach()
+
+    def stats(self) -> Dict[str, Any]:
+        """The counters and timings of the instrumentation (see Instrumentation.stats())"""
+        if self.instrumentation is None:
+            raise RuntimeError("call instrument() first")
+        return self.instrumentation.stats()
+
+    def close(self) -> None:
+        """Close the files of the DiskHistories (see history_dir).
+        Their values can't be read or appended to afterwards."""
+        for attr in vars(self).values():
+            if isinstance(attr, MemoryFloat) and isinstance(attr.history, DiskHistory):
+                attr.history.close()
+
+    def __enter__(self) -> "BaseContainer":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def histories(self) -> Dict[str, "np.ndarray"]:
+        """The recorded histories by name, as numpy arrays (see MemoryFloat.to_numpy).
+        Histories that started late (e.g. a subscription made after some pushes)
+        are shorter, so all of them are aligned at the most recent value and cut to the
+        common length, which is a view and not a copy. Histories that are decimated
+        differently (see DecimatedHistory) can't be aligned, so they raise a ValueError.
+        """
+        recorded = {
+            name: attr
+            for name, attr in vars(self).items()
+            if isinstance(attr, MemoryFloat) and attr.record
+        }
+        decimations = {_decimation(attr.history) for attr in recorded.values()}
+        if len(decimations) > 1:
+            raise ValueError(
+                "the histories are decimated differently, so they can't be aligned: "
+                "{}".format(
+                    {name: _decimation(attr.history) for name, attr in recorded.items()}
+                )
+            )
+        histories = {name: attr.to_numpy() for name, attr in recorded.items()}
+        length = min((len(history) for history in histories.values()), default=0)
+        return {
+            name: history[len(history) - length :]
+            for name, history in histories.items()
+        }
+
+    def to_arrow(self) -> "pyarrow.Table":
+        """The recorded histories as a pyarrow Table with one column per quantity.
+        The columns wrap the histories without copying wherever histories() does,
+        and keep the values they were created with while the histories grow."""
+        import pyarrow
+
+        return pyarrow.table(
+            {name: pyarrow.array(history) for name, history in self.histories().items()}
+        )
+
+    def to_pandas(self) -> "pandas.DataFrame":
+        """The recorded histories as a pandas DataFrame with one column per quantity.
+        The DataFrame is built with copy=False, which wraps the histories without copying
+        them on pandas versions that keep one block per column (pandas 2 and later).
+        Older versions consolidate the columns into a single 2-D block, which is a copy.
+        """
+        import pandas
+
+        return pandas.DataFrame(self.histories(), copy=False)
+
+
+class Container(BaseContainer):
+    def __init__(
+        self,
+        data: Optional[Sequence] = None,
+        window_size: Union[int, float] = float("inf"),
+        max_history: Optional[int] = None,
+        record: Optional[Iterable[str]] = None,
+        history_dir: Optional[str] = None,
+        lazy: bool = False,
+        resume: bool = False,
+        decimation: Optional[Sequence[Sequence[Any]]] = None,
+        decimation_aggregate: str = "last",
+    ):
+        """Initialize the data and all metadata.
+        If max_history is given, every MemoryFloat only keeps the last max_history values.
+        If record is given, only the quantities it names (e.g. "value", "n", "M", "std")
+        keep a history, the rest only hold their current value.
+        The default is to record everything.
+        If history_dir is given, the histories are DiskHistories in files named after
+        the quantities (e.g. std.hist) in that directory, instead of arrays in memory.
+        A directory that already holds histories raises FileExistsError, unless resume
+        is True, in which case the histories in it are continued (the window starts empty).
+        Call close() or use the container as a context manager to close the files.
+        If decimation is given, the histories are DecimatedHistories made by
+        DecimatedHistory.tiers(*decimation, aggregate=decimation_aggregate),
+        e.g. decimation=((60, 1440), (24, None)) keeps one value per minute for a day
+        and one per day forever, for a push per second.
+        If lazy is True, subscriptions (std, zscore, ...) are LazyFloats, which are computed
+        when they are read rather than on every push, so pushing costs the same no matter
+        how many there are. Their histories are computed from the histories of n, M, S, ...,
+        so subscribing to a recorded one raises a ValueError unless those are recorded.
+        min, max and quantiles are still updated on every push.
+        """
+        # Set the window size
+        self.window_size = window_size
+
+        # Data container - if any data is provided in th initializer,
+        # it will be filled at the end.
+        # Finite windows use a preallocated buffer of floats, infinite windows a deque.
+        if 0 < window_size < float("inf"):
+            self.data = WindowBuffer(math.ceil(window_size))
+        else:
+            self.data = deque()
+
+        super().__init__(
+            max_history,
+            record,
+            history_dir,
+            lazy,
+            resume,
+            decimation,
+            decimation_aggregate,
+        )
+
+        # The current value.
+        self.value = self.new_memory_float("value", nan)
+
+        # The number of samples in the window.
+        # This is always less than or equal to the window size.
+        self.n = self.new_memory_float("n", 0)
+
+        # The current mean.
+        self.M = self.new_memory_float("M", nan)
+
+        # The current sum.
+        self.sum = self.new_memory_float("sum", 0)
+
+        # The current sum of squared differences from the mean.
+        # Used to calculate the variance and standard deviation.
+        self.S = self.new_memory_float("S", nan)
+
+        # The current sum of reciprocals.
+        # Used to calculate the harmonic mean.
+        self.reciprocal_sum = self.new_memory_float("reciprocal_sum", nan)
+
+        # The largest S since M and S were last computed exactly from the window.
+        # Evicting values cancels S, see _pop().
+        self.S_max = 0.0
+
+        # When adding a new memory float, add it to self.mem_floats
+        # so it gets saved on every push.
+        self.mem_floats = (
+            self.value,
+            self.n,
+            self.S,
+            self.M,
+            self.sum,
+            self.reciprocal_sum,
+        )
+
+        # Statistics that need to see every push and pop, like RollingExtremum
+        self.trackers = []
+
+        # Dumb corner case: if the window size is <0,
+        # there is no need to do anything when pushing
+        if self.window_size <= 0:
+            self.push = lambda datapoints: None
+
+        # Push any initial data
+        if data:
+            self.push(*data)
+
+    def subscribe_var(self) -> None:
+        self.subscribe("var", self.S, self.n, func=var)
+
+    def subscribe_std(self) -> None:
+        self.subscribe("std", self.S, self.n, func=std)
 
     def subscribe_pop_var(self) -> None:
         self.subscribe("pop_var", self.S, self.n, func=pop_var)
@@ -240,9 +2253,286 @@ class Container(object):
             "harmonic_mean", self.reciprocal_sum, self.n, func=lambda rec, n: n / rec
         )
 
-    def __getitem__(self, item: Union[int, slice]) -> Union[float, List[float]]:
-        """Enable slicing syntax on the container."""
-        if isinstance(item, slice):
+    def add_tracker(self, tracker: Any) -> None:
+        """Add a tracker that sees every push and pop.
+        Its current outputs are saved along with the other quantities of the container.
+        """
+        for datapoint in self.data:
+            tracker.push(datapoint)
+        if self.instrumentation is not None:
+            tracker = TimedTracker(tracker)
+        self.trackers.append(tracker)
+        self.mem_floats += tuple(tracker.outputs)
+
+    def subscribe_min(self) -> None:
+        self.min = self.new_memory_float("min", nan)
+        self.add_tracker(RollingExtremum(self.min, maximum=False))
+
+    def subscribe_max(self) -> None:
+        self.max = self.new_memory_float("max", nan)
+        self.add_tracker(RollingExtremum(self.max, maximum=True))
+
+    def subscribe_range(self) -> None:
+        """Peak-to-peak range, i.e. max - min"""
+        if not hasattr(self, "min"):
+            self.subscribe_min()
+        if not hasattr(self, "max"):
+            self.subscribe_max()
+        self.subscribe("range", self.max, self.min, func=lambda hi, lo: hi - lo)
+
+    def subscribe_quantile(self, q: float, varname: Optional[str] = None) -> None:
+        """Rolling q-quantile. The default name is based on the percentile,
+        e.g. p95 for q=0.95 or p99_9 for q=0.999.
+        All quantiles of a container share the same order statistics."""
+        if varname is None:
+            varname = "p" + "{:g}".format(q * 100).replace(".", "_")
+        output = self.new_memory_float(varname, nan)
+        for tracker in self.trackers:
+            if isinstance(tracker, RollingQuantiles):
+                tracker.add_output(q, output)
+                self.mem_floats += (output,)
+                break
+        else:
+            tracker = RollingQuantiles()
+            tracker.add_output(q, output)
+            self.add_tracker(tracker)
+        setattr(self, varname, output)
+
+    def subscribe_median(self) -> None:
+        self.subscribe_quantile(0.5, "median")
+
+    def add_central_moments(self) -> None:
+        """Start tracking M2, M3 and M4, the sums of the second, third and fourth powers
+        of the differences from the mean, unless they are tracked already.
+        M2 is the same as S up to rounding, but consistent with M3 and M4."""
+        if not hasattr(self, "M3"):
+            self.M2 = self.new_memory_float("M2", nan)
+            self.M3 = self.new_memory_float("M3", nan)
+            self.M4 = self.new_memory_float("M4", nan)
+            self.add_tracker(CentralMoments(self.M2, self.M3, self.M4))
+
+    def subscribe_skewness(self) -> None:
+        self.add_central_moments()
+        self.subscribe("skewness", self.M2, self.M3, self.n, func=skewness)
+
+    def subscribe_pop_skewness(self) -> None:
+        self.add_central_moments()
+        self.subscribe("pop_skewness", self.M2, self.M3, self.n, func=pop_skewness)
+
+    def subscribe_kurtosis(self) -> None:
+        """Excess kurtosis, which is 0 for a normal distribution"""
+        self.add_central_moments()
+        self.subscribe("kurtosis", self.M2, self.M4, self.n, func=kurtosis)
+
+    def subscribe_pop_kurtosis(self) -> None:
+        """Excess kurtosis, which is 0 for a normal distribution"""
+        self.add_central_moments()
+        self.subscribe("pop_kurtosis", self.M2, self.M4, self.n, func=pop_kurtosis)
+
+    def summary(self) -> Summary:
+        """The current state of the window as a Summary.
+        min and max are included if they are subscribed to."""
+        return Summary(
+            n=int(self.n.value),
+            M=self.M.value,
+            S=self.S.value,
+            sum=self.sum.value,
+            reciprocal_sum=self.reciprocal_sum.value,
+            min=self.min.value if hasattr(self, "min") else None,
+            max=self.max.value if hasattr(self, "max") else None,
+        )
+
+    def to_numpy(self) -> "np.ndarray":
+        """The contents of the window, oldest first.
+        With a finite window, this is a view of the window buffer, which later pushes write into,
+        so copy it if it must outlive the next push, unless the window crosses the wraparound
+        of the buffer, in which case it is a copy (see WindowBuffer.to_numpy()).
+        With an infinite window, the values are kept in a deque, so they have to be copied.
+        """
+        if isinstance(self.data, WindowBuffer):
+            return self.data.to_numpy()
+        return np.fromiter(self.data, dtype=float, count=len(self.data))
+
+    def save_snapshot(self, path: str) -> None:
+        """Write the state of the container to a binary file that load_snapshot() can restore:
+        the window, the running quantities, the subscriptions, and every MemoryFloat's value
+        and history. Only the subscribe_* methods can be restored, not subscribe() calls with
+        custom functions, so those raise a ValueError. So do decimated histories, whose
+        partial buckets aren't saved. TimeContainers are snapshotted with their timestamps.
+        Only Containers and TimeContainers have snapshots; the other containers
+        (EWContainer, PairedContainer, VectorContainer) don't.
+
+        The file starts with SNAPSHOT_MAGIC and the length of a JSON header,
+        followed by the header and then the windows and histories as raw native doubles,
+        each at an offset (in doubles) given in the header.
+        """
+        for name, attr in vars(self).items():
+            if isinstance(attr, MemoryFloat) and _decimation(attr.history):
+                raise ValueError("can't snapshot the decimated history of " + name)
+        names = {
+            id(attr): name
+            for name, attr in vars(self).items()
+            if isinstance(attr, MemoryFloat)
+        }
+
+        # Trackers first, so subscribe_range() finds the min and max it needs on restore
+        subscriptions = []
+        for tracker in self.trackers:
+            if isinstance(tracker, RollingQuantiles):
+                for q, output in zip(tracker.quantiles, tracker.outputs):
+                    subscriptions.append(["subscribe_quantile", q, names[id(output)]])
+            elif isinstance(tracker, RollingExtremum):
+                subscriptions.append(["subscribe_" + names[id(tracker.output)]])
+            # CentralMoments is added again by the subscriptions that need it
+        for output, _, _ in self.subscriptions:
+            method = SUBSCRIBE_METHODS.get(
+                names[id(output)], "subscribe_" + names[id(output)]
+            )
+            if not hasattr(Container, method):
+                raise ValueError(
+                    "can't snapshot the custom subscription {}".format(
+                        names[id(output)]
+                    )
+                )
+            subscriptions.append([method])
+
+        buffers = []
+        offset = 0
+
+        def add_buffer(values: Sequence[float]) -> list:
+            nonlocal offset
+            if not isinstance(values, (array.array, memoryview)):
+                values = array.array("d", values)
+            buffers.append(values)
+            offset += len(values)
+            return [offset - len(values), len(values)]
+
+        floats = {}
+        for name, attr in vars(self).items():
+            # LazyFloats are recomputed from the other histories after loading
+            if isinstance(attr, MemoryFloat) and not isinstance(attr, LazyFloat):
+                if isinstance(attr.history, array.array):
+                    history = attr.history
+                elif isinstance(attr.history, DiskHistory):
+                    history = attr.history.view()
+                else:
+                    history = attr.history.ordered()
+                # Counts like n are ints, anything else becomes a float
+                value = attr.value
+                if not isinstance(value, int):
+                    value = float(value)
+                floats[name] = {
+                    "value": value,
+                    "record": attr.record,
+                    "history": add_buffer(history),
+                }
+
+        header = {
+            "byteorder": sys.byteorder,
+            "type": type(self).__name__,
+            **self.snapshot_header(add_buffer),
+            "max_history": self.max_history,
+            "record": None if self.record is None else sorted(self.record),
+            "lazy": self.lazy,
+            "window": add_buffer(self.data),
+            "subscriptions": subscriptions,
+            "floats": floats,
+        }
+        header = json.dumps(header).encode()
+        # Pad the header so the doubles are aligned
+        header += b" " * (-len(header) % 8)
+
+        # Write to a temporary file and move it over the target, so that a crash can't
+        # leave a partial snapshot behind, and a container restored from the target
+        # (whose histories are mapped from it) keeps its histories
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with open(fd, "wb") as f:
+                f.write(SNAPSHOT_MAGIC)
+                f.write(struct.pack("<Q", len(header)))
+                f.write(header)
+                for values in buffers:
+                    f.write(values)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def snapshot_header(self, add_buffer: Callable[[Sequence[float]], list]) -> dict:
+        """The entries of the snapshot header that are specific to the type of container.
+        add_buffer() stores values after the header and returns where to find them."""
+        return {"window_size": self.window_size}
+
+    @classmethod
+    def from_snapshot_header(
+        cls, header: dict, buffer: Callable[[list], memoryview], **kwargs: Any
+    ) -> "Container":
+        """Create an empty container from the entries written by snapshot_header()"""
+        return cls(window_size=header["window_size"], **kwargs)
+
+    @classmethod
+    def load_snapshot(cls, path: str) -> "Container":
+        """Restore a container written with save_snapshot().
+        The file is memory-mapped and histories without a max_history become MappedHistories
+        over the mapping, so restoring takes the same time no matter how long they are.
+        Histories with a max_history, the window and the subscriptions' trackers are rebuilt,
+        which takes time proportional to max_history and the window size.
+        The snapshot must be of a container of type cls, so a TimeContainer is restored
+        with TimeContainer.load_snapshot(), and anything else raises a ValueError.
+        """
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[: len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError("{} is not a rollstats snapshot".format(path))
+        (header_length,) = struct.unpack_from("<Q", mapped, len(SNAPSHOT_MAGIC))
+        start = len(SNAPSHOT_MAGIC) + 8
+        header = json.loads(mapped[start : start + header_length])
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(
+                "the snapshot was written on a machine with another byte order"
+            )
+        if header.get("type", "Container") != cls.__name__:
+            raise ValueError(
+                "{} is a snapshot of a {}, not of a {}".format(
+                    path, header.get("type", "Container"), cls.__name__
+                )
+            )
+        doubles = memoryview(mapped)[start + header_length :].cast("d")
+
+        def buffer(location: list) -> memoryview:
+            offset, length = location
+            return doubles[offset : offset + length]
+
+        container = cls.from_snapshot_header(
+            header,
+            buffer,
+            max_history=header["max_history"],
+            record=header["record"],
+            lazy=header["lazy"],
+        )
+        container.data.extend(buffer(header["window"]))
+        for method, *args in header["subscriptions"]:
+            getattr(container, method)(*args)
+        for name, saved in header["floats"].items():
+            mem_float = getattr(container, name)
+            mem_float.value = saved["value"]
+            mem_float.record = saved["record"]
+            history = buffer(saved["history"])
+            if container.max_history is not None:
+                mem_float.history = RingHistory(container.max_history, history)
+            elif len(history):
+                mem_float.history = MappedHistory(history)
+        return container
+
+    def __getitem__(
+        self, item: Union[int, slice]
+    ) -> Union[float, List[float], memoryview]:
+        """Enable slicing syntax on the container.
+        With a finite window, slices are zero-copy memoryviews of the window buffer,
+        or copies if they cross its wraparound (see WindowBuffer).
+        With an infinite window, slices are lists."""
+        if isinstance(item, slice) and isinstance(self.data, deque):
             return list(self.data)[item]
         return self.data[item]
 
@@ -258,12 +2548,13 @@ class Container(object):
             return False
 
     def push(self, *datapoints: float) -> None:
-        self.data.extend(datapoints)
-
         for datapoint in datapoints:
             self.value.assign(datapoint)
             if self.n >= self.window_size:
                 self._pop()
+            self.data.append(datapoint)
+            for tracker in self.trackers:
+                tracker.push(datapoint)
 
             if datapoint == 0:
                 reciprocal = nan
@@ -285,9 +2576,250 @@ class Container(object):
 
             self.save()
 
+    def push_batch(self, datapoints: Sequence[float]) -> None:
+        """Push a whole chunk of datapoints at once.
+
+        The result is the same as push(*datapoints), but if numpy is available,
+        n, M, S, sum and reciprocal_sum are computed for the whole chunk with vectorized
+        (windowed) cumulative sums, and the histories are appended in bulk.
+        Subscriptions are still evaluated once per datapoint.
+
+        Accepts numpy arrays or anything else that numpy.asarray() understands,
+        including objects supporting the buffer protocol.
+        Falls back to the scalar push() if numpy is missing, if the chunk is shorter
+        than BATCH_MIN_SIZE, if it contains NaNs or infinities, or if any hooks are installed.
+        """
+        if self.window_size <= 0:
+            return
+        if np is None:
+            self.push(*datapoints)
+            return
+
+        x = np.asarray(datapoints, dtype=float).ravel()
+        if not len(x):
+            return
+        if len(x) < BATCH_MIN_SIZE or not self._can_push_batch(x):
+            self.push(*x.tolist())
+            return
+
+        n0 = int(self.n.value)
+        batch_len = len(x)
+        capacity = self.window_size
+        if not math.isinf(capacity):
+            capacity = math.ceil(capacity)
+        ends = np.arange(n0 + 1, n0 + 1 + batch_len)
+
+        # The window contents before the chunk followed by the chunk itself.
+        # With an infinite window nothing is ever evicted, so the old contents are not needed.
+        if math.isinf(capacity):
+            full = x
+            n = ends
+            evicted = np.zeros(batch_len)
+            evicting = np.zeros(batch_len, dtype=bool)
+        else:
+            full = np.concatenate((np.asarray(self[:], dtype=float), x))
+            n = np.minimum(ends, capacity)
+            evicting = ends > capacity
+            evicted = np.where(evicting, full[np.maximum(ends - 1 - capacity, 0)], 0)
+
+        # Mean and sum of squared differences, first while the window is still growing
+        # (merged with the running state), then while it is sliding (recomputed per window)
+        M = np.empty(batch_len)
+        S = np.empty(batch_len)
+        growing = int(batch_len - np.count_nonzero(evicting))
+        if growing:
+            self._batch_moments_growing(x[:growing], n0, M[:growing], S[:growing])
+        if growing < batch_len:
+            self._batch_moments_sliding(
+                full, ends[growing:] - 1, capacity, M[growing:], S[growing:]
+            )
+
+        # Running sums, including the evicted values like _pop() does.
+        with np.errstate(divide="ignore"):
+            reciprocal = np.where(x == 0, nan, 1 / np.where(x == 0, 1, x))
+            reciprocal_evicted = np.where(
+                evicted == 0,
+                np.where(evicting, nan, 0),
+                1 / np.where(evicted == 0, 1, evicted),
+            )
+        sums = self.sum.value + np.cumsum(x - evicted)
+        if capacity == 1:
+            # The window is emptied before every push, which resets the reciprocal sum
+            reciprocal_sums = reciprocal
+        else:
+            reciprocal_sum_0 = self.reciprocal_sum.value if n0 else 0
+            reciprocal_sums = reciprocal_sum_0 + np.cumsum(
+                reciprocal - reciprocal_evicted
+            )
+
+        # Update the window contents (the window buffer drops the oldest values by itself)
+        if math.isinf(capacity):
+            self.data.extend(x.tolist())
+        else:
+            self.data.extend(array.array("d", x[-capacity:].tobytes()))
+
+        # Update all histories in bulk
+        batch_values = {}
+        for mem_float, values in (
+            (self.value, x),
+            (self.n, n),
+            (self.S, S),
+            (self.M, M),
+            (self.sum, sums),
+            (self.reciprocal_sum, reciprocal_sums),
+        ):
+            values = array.array("d", values.astype(float).tobytes())
+            mem_float.extend(values)
+            batch_values[id(mem_float)] = values
+
+        # Replay the trackers for every datapoint
+        if self.trackers:
+            datapoints = x.tolist()
+            evictions = evicting.tolist()
+            evicted_datapoints = evicted.tolist()
+        for tracker in self.trackers:
+            results = [array.array("d") for output in tracker.outputs]
+            for datapoint, evict, out in zip(datapoints, evictions, evicted_datapoints):
+                if evict:
+                    tracker.pop(out)
+                tracker.push(datapoint)
+                for result, output in zip(results, tracker.outputs):
+                    result.append(output.value)
+            for result, output in zip(results, tracker.outputs):
+                output.extend(result)
+                batch_values[id(output)] = result
+
+        # Replay the subscriptions for every datapoint
+        for output, inputs, func in self.plan:
+            results = array.array("d")
+            for row in zip(*(batch_values[id(input)] for input in inputs)):
+                for input, value in zip(inputs, row):
+                    input.value = value
+                results.append(func(*inputs))
+            output.extend(results)
+            batch_values[id(output)] = results
+        self.n.assign(int(n[-1]))
+        # The batch computes S relative to the window, like a recomputation in _pop()
+        self.S_max = float(S[-1])
+
+    def _can_push_batch(self, x: "np.ndarray") -> bool:
+        """Check whether push_batch() can use the vectorized path for x"""
+        if not np.all(np.isfinite(x)):
+            return False
+
+        # A NaN mean sticks forever in the scalar update, so let push() deal with it
+        if self.n > 0 and math.isnan(self.M.value):
+            return False
+
+        # Hooks can't be replayed, and subscriptions can only be replayed
+        # if their inputs are updated by this container.
+        known_floats = {id(mem_float) for mem_float in self.mem_floats}
+        for output, inputs, func in self.plan:
+            if not all(id(input) in known_floats for input in inputs):
+                return False
+            known_floats.add(id(output))
+        for output, inputs, func in self.plan:
+            if output.hooks:
+                return False
+        return not any(mem_float.hooks for mem_float in self.mem_floats)
+
+    def _batch_moments_growing(
+        self, x: "np.ndarray", n0: int, M: "np.ndarray", S: "np.ndarray"
+    ) -> None:
+        """Fill in M and S for a chunk where nothing gets evicted.
+        Each block's prefix statistics are merged with the running state
+        using the parallel variance formula."""
+        n_prev = n0
+        M_prev = self.M.value if n0 else 0.0
+        S_prev = self.S.value if n0 else 0.0
+        for start in range(0, len(x), BATCH_BLOCK_SIZE):
+            block = x[start : start + BATCH_BLOCK_SIZE]
+            shift = block.mean()
+            k = np.arange(1, len(block) + 1)
+            shifted_sum = np.cumsum(block - shift)
+            shifted_sum_sq = np.cumsum((block - shift) ** 2)
+            block_M = shift + shifted_sum / k
+            block_S = _clip_rounding(
+                shifted_sum_sq - shifted_sum**2 / k, shifted_sum_sq
+            )
+
+            n_total = n_prev + k
+            delta = block_M - M_prev
+            M[start : start + len(block)] = M_prev + delta * k / n_total
+            S[start : start + len(block)] = (
+                S_prev + block_S + delta**2 * n_prev * k / n_total
+            )
+
+            n_prev = n_total[-1]
+            M_prev = M[start + len(block) - 1]
+            S_prev = S[start + len(block) - 1]
+
+    @staticmethod
+    def _batch_moments_sliding(
+        full: "np.ndarray",
+        last: "np.ndarray",
+        capacity: int,
+        M: "np.ndarray",
+        S: "np.ndarray",
+    ) -> None:
+        """Fill in M and S for full windows ending at the indices in last (inclusive).
+        The windowed sums are computed block by block, relative to a local shift,
+        and windows where S has cancelled are recomputed from their values."""
+        block_size = max(capacity, BATCH_BLOCK_SIZE)
+        for start in range(0, len(last), block_size):
+            block_last = last[start : start + block_size]
+            first = block_last[0] + 1 - capacity
+            segment = full[first : block_last[-1] + 1]
+            shift = segment.mean()
+            shifted_sum = np.concatenate(([0.0], np.cumsum(segment - shift)))
+            shifted_sum_sq = np.concatenate(([0.0], np.cumsum((segment - shift) ** 2)))
+            window_ends = block_last + 1 - first
+            window_sum = shifted_sum[window_ends] - shifted_sum[window_ends - capacity]
+            window_sum_sq = (
+                shifted_sum_sq[window_ends] - shifted_sum_sq[window_ends - capacity]
+            )
+            block_M = shift + window_sum / capacity
+            block_S = window_sum_sq - window_sum**2 / capacity
+
+            # Like in _pop(), a window whose S is a small fraction of the sums it was
+            # computed from is mostly rounding error, e.g. when a large value has just
+            # left it, so its M and S are computed from the window itself
+            cancelled = np.flatnonzero(
+                block_S < CANCELLATION * shifted_sum_sq[window_ends]
+            )
+            if len(cancelled):
+                cancelled_ends = window_ends[cancelled]
+                # Windows without a change in value need no recomputation
+                changes = np.concatenate(([0], np.cumsum(segment[1:] != segment[:-1])))
+                constant = (
+                    changes[cancelled_ends - 1] == changes[cancelled_ends - capacity]
+                )
+                block_M[cancelled[constant]] = segment[cancelled_ends[constant] - 1]
+                block_S[cancelled[constant]] = 0
+                cancelled = cancelled[~constant]
+                offsets = np.arange(capacity)
+                chunk = max(1, BATCH_BLOCK_SIZE // capacity)
+                for i in range(0, len(cancelled), chunk):
+                    windows = full[
+                        block_last[cancelled[i : i + chunk], None]
+                        + 1
+                        - capacity
+                        + offsets
+                    ]
+                    window_M = windows.mean(axis=1)
+                    window_M += (windows - window_M[:, None]).mean(axis=1)
+                    block_M[cancelled[i : i + chunk]] = window_M
+                    block_S[cancelled[i : i + chunk]] = (
+                        (windows - window_M[:, None]) ** 2
+                    ).sum(axis=1)
+
+            M[start : start + len(block_last)] = block_M
+            S[start : start + len(block_last)] = block_S
+
     def _pop(self) -> None:
         out = self.data.popleft()
-        prev_M = self.M.value
+        for tracker in self.trackers:
+            tracker.pop(out)
 
         self.n -= 1
         self.sum -= out
@@ -297,14 +2829,1039 @@ class Container(object):
             self.reciprocal_sum.assign(nan)
         else:
             cur_diff = out - self.M
+            self.S_max = max(self.S_max, self.S.value)
             self.M -= cur_diff / self.n
-            self.S -= cur_diff * (out - prev_M)
+            self.S -= cur_diff * (out - self.M)
+            if self.S < 0 or self.S < CANCELLATION * self.S_max:
+                # What is left of S is mostly the rounding error of the values
+                # that have left the window, so compute M and S from the window.
+                # This happens at most once per drop of S by a factor of CANCELLATION.
+                M, S = _exact_moments(self.data)
+                self.M.assign(M)
+                self.S.assign(S)
+                self.S_max = S
 
             if out == 0:
                 self.reciprocal_sum.assign(nan)
             else:
                 self.reciprocal_sum -= 1 / out
 
+
+class TimeContainer(Container):
+    """A container whose window is a time span rather than a number of samples.
+    Every sample is pushed with a timestamp, and samples that are horizon or more
+    older than the newest one are evicted with the same incremental update as in Container.
+    Each sample is evicted exactly once, so the cost per sample stays O(1) amortized
+    even when a burst evicts many samples at once.
+    """
+
+    def __init__(
+        self,
+        horizon: float,
+        max_history: Optional[int] = None,
+        record: Optional[Iterable[str]] = None,
+        record_timestamps: bool = False,
+        history_dir: Optional[str] = None,
+        lazy: bool = False,
+        resume: bool = False,
+        decimation: Optional[Sequence[Sequence[Any]]] = None,
+        decimation_aggregate: str = "last",
+    ):
+        """Initialize the data and all metadata.
+        If record_timestamps is True, the timestamp of each push is kept
+        in the history of self.timestamp."""
+        # The timestamps of the samples in the window, oldest first.
+        self.timestamps = deque()
+
+        # Set the length of the window in time.
+        self.horizon = horizon
+
+        super().__init__(
+            max_history=max_history,
+            record=record,
+            history_dir=history_dir,
+            lazy=lazy,
+            resume=resume,
+            decimation=decimation,
+            decimation_aggregate=decimation_aggregate,
+        )
+
+        # The timestamp of the most recent push.
+        history = self.new_history("timestamp") if record_timestamps else None
+        self.timestamp = MemoryFloat(nan, max_history, record_timestamps, history)
+        self.mem_floats += (self.timestamp,)
+
+    def snapshot_header(self, add_buffer: Callable[[Sequence[float]], list]) -> dict:
+        return {
+            "horizon": self.horizon,
+            "record_timestamps": self.timestamp.record,
+            "timestamps": add_buffer(self.timestamps),
+        }
+
+    @classmethod
+    def from_snapshot_header(
+        cls, header: dict, buffer: Callable[[list], memoryview], **kwargs: Any
+    ) -> "TimeContainer":
+        container = cls(
+            horizon=header["horizon"],
+            record_timestamps=header["record_timestamps"],
+            **kwargs,
+        )
+        container.timestamps.extend(buffer(header["timestamps"]))
+        return container
+
+    def push(self, datapoint: float, timestamp: float) -> None:
+        """Push a datapoint with its timestamp.
+        Timestamps must not decrease from one push to the next."""
+        if timestamp < self.timestamp.value:
+            raise ValueError(
+                "timestamp {} is older than the previous one ({})".format(
+                    timestamp, self.timestamp.value
+                )
+            )
+        horizon_start = timestamp - self.horizon
+        while self.timestamps and self.timestamps[0] <= horizon_start:
+            self._pop()
+        self.timestamps.append(timestamp)
+        self.timestamp.assign(timestamp)
+        super().push(datapoint)
+
+    def push_batch(
+        self, datapoints: Sequence[float], timestamps: Sequence[float]
+    ) -> None:
+        """Push several datapoints with their timestamps"""
+        if len(datapoints) != len(timestamps):
+            raise ValueError("there must be one timestamp per datapoint")
+        for datapoint, timestamp in zip(datapoints, timestamps):
+            self.push(datapoint, timestamp)
+
+    def _pop(self) -> None:
+        self.timestamps.popleft()
+        super()._pop()
+
+    def __eq__(self, other) -> bool:
+        """Enable checking containers against each other for inequality"""
+        if isinstance(other, self.__class__):
+            return (
+                self.horizon == other.horizon
+                and self.timestamps == other.timestamps
+                and self.data == other.data
+            )
+        else:
+            return False
+
+
+class EWContainer(BaseContainer):
+    """Exponentially weighted statistics, using O(1) memory regardless of the number of samples.
+    The decay is given by exactly one of alpha, span (alpha = 2 / (span + 1))
+    or halflife (the age at which a sample has half the weight of a new one).
+    Ages are counted in samples, or in time units if timestamps are pushed.
+
+    Each sample has the weight decay ** age, where decay = 1 - alpha,
+    and the statistics are the weighted mean and variance of all samples so far.
+    """
+
+    def __init__(
+        self,
+        alpha: Optional[float] = None,
+        span: Optional[float] = None,
+        halflife: Optional[float] = None,
+        max_history: Optional[int] = None,
+        record: Optional[Iterable[str]] = None,
+        history_dir: Optional[str] = None,
+        lazy: bool = False,
+        resume: bool = False,
+        decimation: Optional[Sequence[Sequence[Any]]] = None,
+        decimation_aggregate: str = "last",
+    ):
+        """Initialize the decay and all metadata (see Container for the history settings)"""
+        if sum(param is not None for param in (alpha, span, halflife)) != 1:
+            raise ValueError("exactly one of alpha, span and halflife must be given")
+        if span is not None:
+            alpha = 2 / (span + 1)
+        elif halflife is not None:
+            alpha = 1 - 0.5 ** (1 / halflife)
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+
+        # The factor by which all weights are multiplied per sample or time unit
+        self.decay = 1 - alpha
+
+        # The timestamp of the previous push, if any
+        self.last_timestamp = None
+
+        super().__init__(
+            max_history,
+            record,
+            history_dir,
+            lazy,
+            resume,
+            decimation,
+            decimation_aggregate,
+        )
+
+        # The current value.
+        self.value = self.new_memory_float("value", nan)
+
+        # The sum of the weights and the sum of the squared weights.
+        self.W = self.new_memory_float("W", 0)
+        self.W2 = self.new_memory_float("W2", 0)
+
+        # The current weighted mean.
+        self.M = self.new_memory_float("M", nan)
+
+        # The current weighted sum of squared differences from the mean.
+        self.S = self.new_memory_float("S", nan)
+
+        self.mem_floats = (self.value, self.W, self.W2, self.M, self.S)
+
+    def subscribe_mean(self) -> None:
+        self.subscribe("mean", self.M, func=lambda x: x)
+
+    def subscribe_var(self) -> None:
+        self.subscribe("var", self.S, self.W, self.W2, func=ew_var)
+
+    def subscribe_std(self) -> None:
+        self.subscribe("std", self.S, self.W, self.W2, func=ew_std)
+
+    def subscribe_pop_var(self) -> None:
+        self.subscribe("pop_var", self.S, self.W, func=ew_pop_var)
+
+    def subscribe_pop_std(self) -> None:
+        self.subscribe("pop_std", self.S, self.W, func=ew_pop_std)
+
+    def subscribe_z_score(self) -> None:
+        self.subscribe(
+            "zscore", self.S, self.W, self.W2, self.value, self.M, func=ew_zscore
+        )
+
+    def push(self, datapoint: float, timestamp: Optional[float] = None) -> None:
+        """Push a datapoint. If a timestamp is given, the weights of the older samples
+        decay according to the time since the previous push, otherwise by one step."""
+        if timestamp is None:
+            decay = self.decay
+        elif self.last_timestamp is None:
+            decay = 1
+        elif timestamp < self.last_timestamp:
+            raise ValueError(
+                "timestamp {} is older than the previous one ({})".format(
+                    timestamp, self.last_timestamp
+                )
+            )
+        else:
+            decay = self.decay ** (timestamp - self.last_timestamp)
+        if timestamp is not None:
+            self.last_timestamp = timestamp
+
+        self.value.assign(datapoint)
+        prev_W = self.W.value * decay
+        self.W.assign(prev_W + 1)
+        self.W2.assign(self.W2.value * decay * decay + 1)
+        if prev_W == 0:
+            # First sample, or all previous samples have decayed away
+            self.M.assign(datapoint)
+            self.S.assign(0)
+        else:
+            prev_M = self.M.value
+            cur_diff = datapoint - prev_M
+            self.M += cur_diff / self.W
+            self.S.assign(self.S.value * decay + cur_diff * (datapoint - self.M))
+
+        self.save()
+
+    def push_batch(
+        self,
+        datapoints: Sequence[float],
+        timestamps: Optional[Sequence[float]] = None,
+    ) -> None:
+        """Push several datapoints, optionally with their timestamps"""
+        if timestamps is None:
+            timestamps = [None] * len(datapoints)
+        elif len(datapoints) != len(timestamps):
+            raise ValueError("there must be one timestamp per datapoint")
+        for datapoint, timestamp in zip(datapoints, timestamps):
+            self.push(datapoint, timestamp)
+
+
+class PairedContainer(BaseContainer):
+    """Rolling statistics between two paired streams, pushed together as push(x, y):
+    covariance, correlation and the least squares line through the window.
+    Like Container, it keeps the mean and the sum of squared differences of each stream
+    (Mx, My, Sx, Sy), and also the co-moment C, the sum of (x - Mx) * (y - My),
+    which gets the same O(1) Welford update and eviction as S.
+    """
+
+    def __init__(
+        self,
+        window_size: Union[int, float] = float("inf"),
+        max_history: Optional[int] = None,
+        record: Optional[Iterable[str]] = None,
+        history_dir: Optional[str] = None,
+        lazy: bool = False,
+        resume: bool = False,
+        decimation: Optional[Sequence[Sequence[Any]]] = None,
+        decimation_aggregate: str = "last",
+    ):
+        """Initialize the data and all metadata (see Container for the history settings)"""
+        self.window_size = window_size
+
+        # The pairs in the window, as one buffer per stream
+        if 0 < window_size < float("inf"):
+            self.data_x = WindowBuffer(math.ceil(window_size))
+            self.data_y = WindowBuffer(math.ceil(window_size))
+        else:
+            self.data_x = deque()
+            self.data_y = deque()
+
+        super().__init__(
+            max_history,
+            record,
+            history_dir,
+            lazy,
+            resume,
+            decimation,
+            decimation_aggregate,
+        )
+
+        # The current pair.
+        self.x = self.new_memory_float("x", nan)
+        self.y = self.new_memory_float("y", nan)
+
+        # The number of pairs in the window.
+        self.n = self.new_memory_float("n", 0)
+
+        # The current means.
+        self.Mx = self.new_memory_float("Mx", nan)
+        self.My = self.new_memory_float("My", nan)
+
+        # The current sums of squared differences from the means.
+        self.Sx = self.new_memory_float("Sx", nan)
+        self.Sy = self.new_memory_float("Sy", nan)
+
+        # The current sum of products of the differences from the means.
+        self.C = self.new_memory_float("C", nan)
+
+        # The largest Sx and Sy since the sums were last computed exactly, see Container
+        self.Sx_max = 0.0
+        self.Sy_max = 0.0
+
+        self.mem_floats = (
+            self.x,
+            self.y,
+            self.n,
+            self.Mx,
+            self.My,
+            self.Sx,
+            self.Sy,
+            self.C,
+        )
+
+    def subscribe_cov(self) -> None:
+        self.subscribe("cov", self.C, self.n, func=cov)
+
+    def subscribe_pop_cov(self) -> None:
+        self.subscribe("pop_cov", self.C, self.n, func=pop_cov)
+
+    def subscribe_corr(self) -> None:
+        self.subscribe("corr", self.C, self.Sx, self.Sy, func=corr)
+
+    def subscribe_slope(self) -> None:
+        self.subscribe("slope", self.C, self.Sx, func=slope)
+
+    def subscribe_intercept(self) -> None:
+        self.subscribe("intercept", self.C, self.Sx, self.Mx, self.My, func=intercept)
+
+    def subscribe_r_squared(self) -> None:
+        self.subscribe("r_squared", self.C, self.Sx, self.Sy, func=r_squared)
+
+    def push(self, x: float, y: float) -> None:
+        """Push a pair of datapoints"""
+        if self.window_size <= 0:
+            return
+        self.x.assign(x)
+        self.y.assign(y)
+        if self.n >= self.window_size:
+            self._pop()
+        self.data_x.append(x)
+        self.data_y.append(y)
+
+        self.n += 1
+        if self.n == 1:
+            self.Mx.assign(x)
+            self.My.assign(y)
+            self.Sx.assign(0)
+            self.Sy.assign(0)
+            self.C.assign(0)
+        else:
+            diff_x = x - self.Mx.value
+            diff_y = y - self.My.value
+            self.Mx += diff_x / self.n
+            self.My += diff_y / self.n
+            self.Sx += diff_x * (x - self.Mx)
+            self.Sy += diff_y * (y - self.My)
+            self.C += diff_x * (y - self.My)
+
+        self.save()
+
+    def push_batch(self, xs: Sequence[float], ys: Sequence[float]) -> None:
+        """Push several pairs of datapoints"""
+        if len(xs) != len(ys):
+            raise ValueError("there must be one y per x")
+        for x, y in zip(xs, ys):
+            self.push(x, y)
+
+    def _pop(self) -> None:
+        out_x = self.data_x.popleft()
+        out_y = self.data_y.popleft()
+
+        self.n -= 1
+        if self.n == 0:
+            for mem_float in (self.Mx, self.My, self.Sx, self.Sy, self.C):
+                mem_float.assign(nan)
+            return
+        diff_x = out_x - self.Mx.value
+        diff_y = out_y - self.My.value
+        self.Sx_max = max(self.Sx_max, self.Sx.value)
+        self.Sy_max = max(self.Sy_max, self.Sy.value)
+        self.Mx -= diff_x / self.n
+        self.My -= diff_y / self.n
+        self.Sx -= diff_x * (out_x - self.Mx)
+        self.Sy -= diff_y * (out_y - self.My)
+        self.C -= diff_x * (out_y - self.My)
+
+        # Recompute the sums from the window when they have cancelled, like Container
+        if (
+            self.Sx < 0
+            or self.Sy < 0
+            or self.Sx < CANCELLATION * self.Sx_max
+            or self.Sy < CANCELLATION * self.Sy_max
+        ):
+            Mx, Sx = _exact_moments(self.data_x)
+            My, Sy = _exact_moments(self.data_y)
+            self.Mx.assign(Mx)
+            self.My.assign(My)
+            self.Sx.assign(Sx)
+            self.Sy.assign(Sy)
+            self.C.assign(
+                math.fsum(
+                    [(x - Mx) * (y - My) for x, y in zip(self.data_x, self.data_y)]
+                )
+            )
+            self.Sx_max = Sx
+            self.Sy_max = Sy
+
+    def __len__(self) -> int:
+        return len(self.data_x)
+
+
+class SeriesView(object):
+    """A view of one series in a ContainerGroup, with the current statistics of its window"""
+
+    __slots__ = ["group", "slot"]
+
+    def __init__(self, group: "ContainerGroup", slot: int):
+        self.group = group
+        self.slot = slot
+
+    @property
+    def value(self) -> float:
+        return self.group.value[self.slot]
+
+    @property
+    def n(self) -> int:
+        return int(self.group.n[self.slot])
+
+    @property
+    def M(self) -> float:
+        return self.group.M[self.slot]
+
+    @property
+    def S(self) -> float:
+        return self.group.S[self.slot]
+
+    @property
+    def sum(self) -> float:
+        return self.group.sum[self.slot]
+
+    @property
+    def reciprocal_sum(self) -> float:
+        return self.group.reciprocal_sum[self.slot]
+
+    @property
+    def mean(self) -> float:
+        return self.M
+
+    @property
+    def var(self) -> float:
+        return var(self.S, self.n)
+
+    @property
+    def std(self) -> float:
+        return std(self.S, self.n)
+
+    @property
+    def pop_var(self) -> float:
+        return pop_var(self.S, self.n)
+
+    @property
+    def pop_std(self) -> float:
+        return pop_std(self.S, self.n)
+
+    @property
+    def zscore(self) -> float:
+        return zscore(self.S, self.n, self.value, self.M)
+
+    @property
+    def harmonic_mean(self) -> float:
+        return self.n / self.reciprocal_sum
+
+    def summary(self) -> Summary:
+        return Summary(self.n, self.M, self.S, self.sum, self.reciprocal_sum)
+
+    def tolist(self) -> List[float]:
+        """The contents of the window, oldest first (only for finite windows)"""
+        group = self.group
+        if group.capacity is None:
+            raise TypeError("window contents are only kept for finite windows")
+        base = self.slot * group.capacity
+        head = group.head[self.slot]
+        n = self.n
+        return [group.ring[base + (head - n + i) % group.capacity] for i in range(n)]
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[float, List[float]]:
+        return self.tolist()[item]
+
+    def __len__(self) -> int:
+        return self.n
+
+
+class ContainerGroup(object):
+    """Rolling statistics for many keyed series in one object.
+    The state of all series is kept in struct-of-arrays form, with one array each
+    for value, n, M, S, sum and reciprocal_sum, and the windows of all series in one
+    flat array of ring buffers. The statistics are updated in the same way as in Container,
+    but without histories and without the per-series overhead of Container objects.
+    Use group[key] to get a SeriesView of one series.
+    """
+
+    def __init__(self, window_size: Union[int, float] = float("inf")):
+        """Initialize an empty group"""
+        self.window_size = window_size
+
+        # Samples in the window of each series (finite windows only).
+        # Series i uses ring[i * capacity:(i + 1) * capacity],
+        # and head[i] is the index of the next sample to write in it.
+        if 0 < window_size < float("inf"):
+            self.capacity = math.ceil(window_size)
+        else:
+            self.capacity = None
+        self.ring = array.array("d")
+        self.head = array.array("q")
+
+        # The slot of each key in the arrays below
+        self.slots = {}
+
+        # One entry per series, with the same meaning as in Container
+        self.value = array.array("d")
+        self.n = array.array("d")
+        self.M = array.array("d")
+        self.S = array.array("d")
+        self.sum = array.array("d")
+        self.reciprocal_sum = array.array("d")
+
+        # The largest S of each series since it was last computed exactly, see Container
+        self.S_max = array.array("d")
+
+    def slot(self, key: Any) -> int:
+        """The slot of the series with the given key, adding it if it's new"""
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.slots)
+            for values, initial in (
+                (self.value, nan),
+                (self.n, 0),
+                (self.M, nan),
+                (self.S, nan),
+                (self.sum, 0),
+                (self.reciprocal_sum, nan),
+                (self.S_max, 0),
+                (self.head, 0),
+            ):
+                values.append(initial)
+            if self.capacity is not None:
+                self.ring.frombytes(bytes(8 * self.capacity))
+        return slot
+
+    def push(self, key: Any, datapoint: float) -> None:
+        """Push a datapoint to the series with the given key"""
+        if self.window_size <= 0:
+            return
+        i = self.slot(key)
+        self.value[i] = datapoint
+        if self.n[i] >= self.window_size:
+            self._pop(i)
+        if self.capacity is not None:
+            self.ring[i * self.capacity + self.head[i]] = datapoint
+            self.head[i] = (self.head[i] + 1) % self.capacity
+
+        if datapoint == 0:
+            reciprocal = nan
+        else:
+            reciprocal = 1 / datapoint
+
+        n = self.n[i] = self.n[i] + 1
+        self.sum[i] += datapoint
+        if n == 1:
+            self.S[i] = 0
+            self.M[i] = datapoint
+            self.reciprocal_sum[i] = reciprocal
+        else:
+            cur_diff = datapoint - self.M[i]
+            self.M[i] += cur_diff / n
+            self.S[i] += cur_diff * (datapoint - self.M[i])
+            self.reciprocal_sum[i] += reciprocal
+
+    def push_batch(self, keys: Sequence[Any], datapoints: Sequence[float]) -> None:
+        """Push datapoints to the series with the corresponding keys, in order.
+        If numpy is available, the batch is split into rounds where every key appears
+        at most once, and each round is applied to all of its series in one vectorized update.
+        Rounds shorter than BATCH_MIN_SIZE, e.g. the later occurrences of a key that
+        is much more frequent than the others, are pushed one by one instead.
+        """
+        if len(keys) != len(datapoints):
+            raise ValueError("there must be one key per datapoint")
+        if self.window_size <= 0:
+            return
+        if np is None or len(keys) < BATCH_MIN_SIZE:
+            for key, datapoint in zip(keys, datapoints):
+                self.push(key, datapoint)
+            return
+
+        slots = np.fromiter((self.slot(key) for key in keys), dtype=np.int64)
+        x = np.asarray(datapoints, dtype=float)
+
+        # Number the occurrences of each slot, and sort the batch into rounds by that number
+        order = np.argsort(slots, kind="stable")
+        sorted_slots = slots[order]
+        group_starts = np.flatnonzero(
+            np.r_[True, sorted_slots[1:] != sorted_slots[:-1]]
+        )
+        group_sizes = np.diff(np.r_[group_starts, len(slots)])
+        occurrence = np.empty(len(slots), dtype=np.int64)
+        occurrence[order] = np.arange(len(slots)) - np.repeat(group_starts, group_sizes)
+        rounds = np.argsort(occurrence, kind="stable")
+        round_sizes = np.bincount(occurrence)
+
+        start = 0
+        for size in round_sizes:
+            if size < BATCH_MIN_SIZE:
+                break
+            batch = rounds[start : start + size]
+            self._push_round(slots[batch], x[batch])
+            start += size
+
+        # Rounds only get shorter, so the rest are all too short to vectorize.
+        # Pushing them in the order of the batch keeps the order within each series.
+        rest = np.sort(rounds[start:])
+        for index, datapoint in zip(rest.tolist(), x[rest].tolist()):
+            self.push(keys[index], datapoint)
+
+    def _push_round(self, idx: "np.ndarray", x: "np.ndarray") -> None:
+        """Vectorized push() of the datapoints x to the distinct slots idx"""
+        value, N, M, S, sums, reciprocal_sum = (
+            np.frombuffer(values, dtype=float)
+            for values in (
+                self.value,
+                self.n,
+                self.M,
+                self.S,
+                self.sum,
+                self.reciprocal_sum,
+            )
+        )
+        value[idx] = x
+        n = N[idx]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            evict = n >= self.window_size
+            if self.capacity is not None:
+                ring = np.frombuffer(self.ring, dtype=float)
+                head = np.frombuffer(self.head, dtype=np.int64)
+                if evict.any():
+                    self._pop_round(
+                        idx[evict], N, M, S, sums, reciprocal_sum, ring, head
+                    )
+                    n = N[idx]
+                ring[idx * self.capacity + head[idx]] = x
+                head[idx] = (head[idx] + 1) % self.capacity
+
+            reciprocal = np.where(x == 0, nan, 1 / x)
+            n = n + 1
+            N[idx] = n
+            sums[idx] += x
+            cur_diff = x - M[idx]
+            new_M = M[idx] + cur_diff / n
+            new_S = S[idx] + cur_diff * (x - new_M)
+            new_reciprocal_sum = reciprocal_sum[idx] + reciprocal
+
+        first = n == 1
+        M[idx] = np.where(first, x, new_M)
+        S[idx] = np.where(first, 0, new_S)
+        reciprocal_sum[idx] = np.where(first, reciprocal, new_reciprocal_sum)
+
+    def _pop_round(self, idx, N, M, S, sums, reciprocal_sum, ring, head) -> None:
+        """Vectorized _pop() of the oldest samples of the distinct slots idx"""
+        n = N[idx]
+        out = ring[
+            idx * self.capacity + (head[idx] - n.astype(np.int64)) % self.capacity
+        ]
+        n = n - 1
+        N[idx] = n
+        sums[idx] -= out
+        S_max = np.frombuffer(self.S_max, dtype=float)
+        S_max[idx] = np.fmax(S_max[idx], S[idx])
+        cur_diff = out - M[idx]
+        new_M = M[idx] - cur_diff / n
+        new_S = S[idx] - cur_diff * (out - new_M)
+        new_reciprocal_sum = np.where(out == 0, nan, reciprocal_sum[idx] - 1 / out)
+
+        empty = n == 0
+        M[idx] = np.where(empty, nan, new_M)
+        S[idx] = np.where(empty, nan, new_S)
+        reciprocal_sum[idx] = np.where(empty, nan, new_reciprocal_sum)
+        cancelled = ~empty & ((new_S < 0) | (new_S < CANCELLATION * S_max[idx]))
+        for i in idx[cancelled].tolist():
+            self._recompute(i)
+
+    def _pop(self, i: int) -> None:
+        n = self.n[i]
+        out = self.ring[i * self.capacity + (self.head[i] - int(n)) % self.capacity]
+
+        n = self.n[i] = n - 1
+        self.sum[i] -= out
+        if n == 0:
+            self.S[i] = nan
+            self.M[i] = nan
+            self.reciprocal_sum[i] = nan
+        else:
+            cur_diff = out - self.M[i]
+            self.S_max[i] = max(self.S_max[i], self.S[i])
+            self.M[i] -= cur_diff / n
+            self.S[i] -= cur_diff * (out - self.M[i])
+            if self.S[i] < 0 or self.S[i] < CANCELLATION * self.S_max[i]:
+                self._recompute(i)
+
+            if out == 0:
+                self.reciprocal_sum[i] = nan
+            else:
+                self.reciprocal_sum[i] -= 1 / out
+
+    def _recompute(self, i: int) -> None:
+        """Compute M and S of series i from its window, after they have cancelled"""
+        n = int(self.n[i])
+        start = i * self.capacity
+        window = [
+            self.ring[start + (self.head[i] - n + j) % self.capacity] for j in range(n)
+        ]
+        self.M[i], self.S[i] = _exact_moments(window)
+        self.S_max[i] = self.S[i]
+
+    def keys(self):
+        return self.slots.keys()
+
+    def __getitem__(self, key: Any) -> SeriesView:
+        return SeriesView(self, self.slots[key])
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.slots
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+
+def vector_var(S: "MemoryVector", n: float) -> "np.ndarray":
+    """Sample variance of each column"""
+    S = np.asarray(S)
+    return S / (n - 1) if n > 1 else np.full(S.shape, nan)
+
+
+def vector_std(S: "MemoryVector", n: float) -> "np.ndarray":
+    """Sample standard deviation of each column"""
+    return np.sqrt(vector_var(S, n))
+
+
+def vector_pop_var(S: "MemoryVector", n: float) -> "np.ndarray":
+    """Population variance of each column"""
+    S = np.asarray(S)
+    return S / n if n > 1 else np.full(S.shape, nan)
+
+
+def vector_pop_std(S: "MemoryVector", n: float) -> "np.ndarray":
+    """Population standard deviation of each column"""
+    return np.sqrt(vector_pop_var(S, n))
+
+
+def vector_zscore(
+    S: "MemoryVector", n: float, value: "MemoryVector", M: "MemoryVector"
+) -> "np.ndarray":
+    """Sample z-score of each column"""
+    S = np.asarray(S)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = (np.asarray(value) - np.asarray(M)) / vector_std(S, n)
+    return np.where((S > 0) & (n > 0), result, nan)
+
+
+class VectorHistory(object):
+    """The history of a vector, as the rows of a 2-D array.
+    Without max_history, the array grows by doubling, so appending is O(1) amortized
+    and self.array is a view of the rows so far. With max_history, the rows are kept
+    in a preallocated circular buffer, and self.array is an ordered copy if it wraps around.
+    """
+
+    __slots__ = ["width", "max_history", "buffer", "end", "length"]
+
+    def __init__(self, width: int, max_history: Optional[int] = None):
+        if max_history is not None and max_history < 1:
+            raise ValueError("max_history must be at least 1")
+        self.width = width
+        self.max_history = max_history
+        self.buffer = np.empty((max_history or 16, width))
+        self.end = 0
+        self.length = 0
+
+    def append(self, row: "np.ndarray") -> None:
+        if self.max_history is None:
+            if self.length == len(self.buffer):
+                self.buffer = np.concatenate((self.buffer, np.empty_like(self.buffer)))
+            self.buffer[self.length] = row
+            self.length += 1
+            return
+        self.buffer[self.end] = row
+        self.end = (self.end + 1) % self.max_history
+        self.length = min(self.length + 1, self.max_history)
+
+    @property
+    def array(self) -> "np.ndarray":
+        """The history as a (len(self), width) array, oldest row first"""
+        if self.max_history is None or self.length < self.max_history:
+            return self.buffer[: self.length]
+        return np.roll(self.buffer, -self.end, axis=0)
+
+    def __getitem__(self, item: Union[int, slice]) -> "np.ndarray":
+        return self.array[item]
+
+    def __len__(self) -> int:
+        return self.length
+
+
+class MemoryVector(object):
+    """A vector of floats that knows its own history, like MemoryFloat does for a single float.
+    Every time its save() function gets called, the current value is copied into the history.
+    """
+
+    __slots__ = ["value", "history", "hooks", "record"]
+
+    def __init__(
+        self,
+        value: "np.ndarray",
+        max_history: Optional[int] = None,
+        record: bool = True,
+    ):
+        self.value = value
+        self.history = VectorHistory(len(value), max_history)
+        self.hooks = []  # List[HookFunc]
+        self.record = record
+
+    def assign(self, value: "np.ndarray") -> None:
+        self.value = value
+
     def save(self) -> None:
-        for mem_float in self.mem_floats:
-            mem_float.save()
+        if self.record:
+            self.history.append(self.value)
+        for hook in self.hooks:
+            hook(self)
+
+    def add_hook(self, hook: HookFunc) -> None:
+        self.hooks.append(hook)
+
+    def __array__(self, dtype=None, copy=None) -> "np.ndarray":
+        return np.asarray(self.value, dtype=dtype)
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[float, "np.ndarray"]:
+        return self.value[item]
+
+    def __len__(self) -> int:
+        return len(self.history)
+
+    def __repr__(self) -> str:
+        return "MemoryVector(v={}, history={} rows)".format(
+            self.value, len(self.history)
+        )
+
+
+class VectorContainer(BaseContainer):
+    """Rolling statistics over many columns at once, e.g. a row of sensor readings per tick.
+    Every push takes a whole row, and value, M, S, sum and reciprocal_sum are MemoryVectors
+    updated with one vectorized operation across all columns, using the same update and
+    eviction math as Container. n is shared by all columns and is a MemoryFloat.
+    Histories are 2-D arrays with one row per push and one column per column.
+    Requires numpy.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        window_size: Union[int, float] = float("inf"),
+        max_history: Optional[int] = None,
+        record: Optional[Iterable[str]] = None,
+    ):
+        """Initialize the data and all metadata"""
+        if np is None:
+            raise ImportError("VectorContainer requires numpy")
+        self.width = width
+        self.window_size = window_size
+
+        # The rows in the window. The rows are kept in a circular buffer if the window
+        # is finite, with head the index of the next row to write.
+        if 0 < window_size < float("inf"):
+            self.data = np.zeros((math.ceil(window_size), width))
+        else:
+            self.data = np.zeros((16, width))
+        self.head = 0
+
+        super().__init__(max_history, record)
+
+        self.value = self.new_memory_float("value", nan)
+        self.n = MemoryFloat(0, max_history, self.record is None or "n" in self.record)
+        self.M = self.new_memory_float("M", nan)
+        self.sum = self.new_memory_float("sum", 0)
+        self.S = self.new_memory_float("S", nan)
+        self.reciprocal_sum = self.new_memory_float("reciprocal_sum", nan)
+        # The largest S of each column since it was last computed exactly, see Container
+        self.S_max = np.zeros(width)
+        self.mem_floats = (
+            self.value,
+            self.n,
+            self.S,
+            self.M,
+            self.sum,
+            self.reciprocal_sum,
+        )
+
+    def new_memory_float(self, name: str, value: float) -> MemoryVector:
+        """Create a MemoryVector for the quantity with the given name,
+        with the history settings of the container."""
+        record = self.record is None or name in self.record
+        return MemoryVector(np.full(self.width, value), self.max_history, record)
+
+    def subscribe_var(self) -> None:
+        self.subscribe("var", self.S, self.n, func=vector_var)
+
+    def subscribe_std(self) -> None:
+        self.subscribe("std", self.S, self.n, func=vector_std)
+
+    def subscribe_pop_var(self) -> None:
+        self.subscribe("pop_var", self.S, self.n, func=vector_pop_var)
+
+    def subscribe_pop_std(self) -> None:
+        self.subscribe("pop_std", self.S, self.n, func=vector_pop_std)
+
+    def subscribe_z_score(self) -> None:
+        self.subscribe("zscore", self.S, self.n, self.value, self.M, func=vector_zscore)
+
+    def subscribe_mean(self) -> None:
+        self.subscribe("mean", self.M, func=lambda x: np.array(x))
+
+    def subscribe_harmonic_mean(self) -> None:
+        self.subscribe(
+            "harmonic_mean",
+            self.reciprocal_sum,
+            self.n,
+            func=lambda rec, n: n / np.asarray(rec),
+        )
+
+    def push(self, row: Sequence[float]) -> None:
+        """Push one row, with one value per column"""
+        if self.window_size <= 0:
+            return
+        datapoint = np.array(row, dtype=float)
+        if datapoint.shape != (self.width,):
+            raise ValueError(
+                "expected a row of {} values, got shape {}".format(
+                    self.width, datapoint.shape
+                )
+            )
+        self.value.assign(datapoint)
+        if self.n >= self.window_size:
+            self._pop()
+
+        if self.head == len(self.data):
+            # Only happens with an infinite window
+            self.data = np.concatenate((self.data, np.zeros_like(self.data)))
+        self.data[self.head] = datapoint
+        self.head += 1
+        if self.head == len(self.data) and self.window_size < float("inf"):
+            self.head = 0
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            reciprocal = np.where(datapoint == 0, nan, 1 / datapoint)
+            self.n += 1
+            self.sum.assign(self.sum.value + datapoint)
+            if self.n == 1:
+                self.S.assign(np.zeros(self.width))
+                self.M.assign(datapoint)
+                self.reciprocal_sum.assign(reciprocal)
+            else:
+                cur_diff = datapoint - self.M.value
+                self.M.assign(self.M.value + cur_diff / self.n.value)
+                self.S.assign(self.S.value + cur_diff * (datapoint - self.M.value))
+                self.reciprocal_sum.assign(self.reciprocal_sum.value + reciprocal)
+
+        self.save()
+
+    def push_batch(self, rows: Sequence[Sequence[float]]) -> None:
+        """Push several rows, e.g. a 2-D array with one row per tick"""
+        for row in rows:
+            self.push(row)
+
+    def _pop(self) -> None:
+        out = self.data[(self.head - int(self.n.value)) % len(self.data)].copy()
+
+        self.n -= 1
+        self.sum.assign(self.sum.value - out)
+        if self.n == 0:
+            self.S.assign(np.full(self.width, nan))
+            self.M.assign(np.full(self.width, nan))
+            self.reciprocal_sum.assign(np.full(self.width, nan))
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                self.S_max = np.fmax(self.S_max, self.S.value)
+                cur_diff = out - self.M.value
+                M = self.M.value - cur_diff / self.n.value
+                S = self.S.value - cur_diff * (out - M)
+                # Recompute the columns whose S has cancelled, like Container
+                cancelled = (S < 0) | (S < CANCELLATION * self.S_max)
+                if cancelled.any():
+                    window = self.window()[:, cancelled]
+                    window_M = window.mean(axis=0)
+                    window_M += (window - window_M).mean(axis=0)
+                    M[cancelled] = window_M
+                    S[cancelled] = ((window - window_M) ** 2).sum(axis=0)
+                    self.S_max[cancelled] = S[cancelled]
+                self.M.assign(M)
+                self.S.assign(S)
+                self.reciprocal_sum.assign(
+                    np.where(out == 0, nan, self.reciprocal_sum.value - 1 / out)
+                )
+
+    def window(self) -> "np.ndarray":
+        """The rows in the window, oldest first, as a (n, width) array"""
+        n = int(self.n.value)
+        indices = np.arange(self.head - n, self.head) % len(self.data)
+        return self.data[indices]
+
+    def __len__(self) -> int:
+        return int(self.n.value)
@@ -0,0 +1,176 @@
+"""Feeding containers from asyncio code.
+
+Pushing one sample at a time from coroutines spends most of the time on per-sample overhead.
+A Feeder instead collects the samples in a bounded queue, and pushes whatever has arrived
+as one micro-batch through push_batch, so the bulk path does the work.
+When the queue is full, put() waits, which slows the producers down to the rate
+the container can keep up with.
+"""
+
+import asyncio
+
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Optional, Sequence, Union
+
+# Marks the end of the samples in the queue
+_CLOSED = object()
+
+
+class Feeder(object):
+    """Push the samples put into a queue into a container, in micro-batches of up to max_batch.
+
+    The container can be anything with push and push_batch methods. If columns is False,
+    every sample is one datapoint. If columns is True, every sample is a tuple of
+    push arguments, e.g. (datapoint, timestamp) for a TimeContainer or (key, datapoint)
+    for a ContainerGroup, and the batch is passed to push_batch column by column.
+
+    Use it as an async context manager, or call start() and close() yourself:
+
+        async with Feeder(container) as feeder:
+            await feeder.consume(messages)
+
+    If pushing a batch raises an exception, the feeder stops: the samples that are still
+    queued or put later are dropped, and put(), next_update(), stream() and close()
+    raise the exception.
+    """
+
+    def __init__(
+        self,
+        container: Any,
+        max_batch: int = 1024,
+        max_queue: int = 65536,
+        columns: bool = False,
+        queue: Optional[asyncio.Queue] = None,
+    ):
+        self.container = container
+        self.max_batch = max_batch
+        self.columns = columns
+
+        # The samples waiting to be pushed. Pass in a queue to consume it directly.
+        self.queue = queue if queue is not None else asyncio.Queue(max_queue)
+
+        # Set after every batch, then replaced by a fresh event for the next one
+        self.updated = asyncio.Event()
+
+        # The number of batches pushed so far
+        self.batches = 0
+
+        self.closed = False
+        self.task = None
+
+        # The exception that stopped the feeder, if pushing a batch failed
+        self.error = None
+
+    def start(self) -> None:
+        """Start pushing the samples in the queue in the background"""
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    async def close(self) -> None:
+        """Push the samples that are still in the queue, then stop"""
+        if self.task is not None and not self.task.done():
+            await self.queue.put(_CLOSED)
+            await self.task
+        self.closed = True
+        self.check()
+
+    def check(self) -> None:
+        """Raise the exception that stopped the feeder, if any"""
+        if self.error is not None:
+            raise self.error
+
+    async def __aenter__(self) -> "Feeder":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        try:
+            await self.close()
+        except Exception:
+            # Don't replace an exception that is already on its way out, which is
+            # most likely the same one, raised by put() or next_update()
+            if exc_info[0] is None:
+                raise
+
+    async def put(self, sample: Any) -> None:
+        """Add a sample to the queue, waiting while it is full"""
+        self.check()
+        await self.queue.put(sample)
+
+    async def consume(self, source: Union[AsyncIterable, asyncio.Queue]) -> None:
+        """Put every sample of an async iterable into the queue. A queue is consumed forever,
+        so run it as a task and cancel it, or pass it as queue to the constructor instead.
+        """
+        if isinstance(source, asyncio.Queue):
+            while True:
+                await self.put(await source.get())
+        async for sample in source:
+            await self.put(sample)
+
+    async def run(self) -> None:
+        """Push batches until the feeder is closed"""
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            closed = batch[-1] is _CLOSED
+            if closed:
+                batch.pop()
+            if batch:
+                try:
+                    self.push(batch)
+                except Exception as error:
+                    self.error = error
+            if closed or self.error is not None:
+                self.closed = True
+                self.notify()
+                break
+
+        # After a failure, keep emptying the queue so that producers waiting in put()
+        # aren't stuck, until close() puts the end marker in
+        while not closed:
+            closed = await self.queue.get() is _CLOSED
+
+    def push(self, batch: Sequence[Any]) -> None:
+        if len(batch) == 1:
+            # Under light load most batches are a single sample,
+            # which is cheaper to push directly than through the bulk path
+            if self.columns:
+                self.container.push(*batch[0])
+            else:
+                self.container.push(batch[0])
+        elif self.columns:
+            self.container.push_batch(*zip(*batch))
+        else:
+            self.container.push_batch(batch)
+        self.batches += 1
+        self.notify()
+
+    def notify(self) -> None:
+        updated, self.updated = self.updated, asyncio.Event()
+        updated.set()
+
+    async def next_update(self, *names: str) -> Optional[Dict[str, float]]:
+        """Wait for the next batch to be pushed and return the current values of the
+        quantities with the given names (e.g. "std", "zscore"), or None once the feeder is closed.
+        """
+        if self.closed:
+            self.check()
+            return None
+        batches = self.batches
+        await self.updated.wait()
+        if self.batches == batches:
+            # Woken up by close(), or by a failed batch
+            self.check()
+            return None
+        return {name: getattr(self.container, name).value for name in names}
+
+    async def stream(self, *names: str) -> AsyncIterator[Dict[str, float]]:
+        """Yield the current values of the quantities with the given names after every batch,
+        until the feeder is closed. A consumer that is slower than the batches skips to the
+        latest values rather than queueing them up; use the histories to see every sample.
+        """
+        while True:
+            update = await self.next_update(*names)
+            if update is None:
+                return
+            yield update
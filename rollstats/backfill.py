@@ -0,0 +1,142 @@
+"""Offline computation of rolling statistics over large historical series.
+
+The series is split into chunks that are processed in a pool of worker processes.
+Each worker warms its Container up with the window_size - 1 samples preceding its chunk,
+so the windows (and therefore the statistics) are the same as in a serial run,
+and the per-sample histories of the chunks are stitched back together in order.
+"""
+
+import array
+import math
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Sequence
+
+from rollstats import SUBSCRIBE_METHODS, Container, nan, np
+
+# Quantities that are always present in a Container
+BASE_QUANTITIES = ("value", "n", "M", "S", "sum", "reciprocal_sum")
+
+# Chunks are at least this many windows long, to keep the warm-up overhead small
+MIN_WINDOWS_PER_CHUNK = 16
+
+
+def backfill(
+    data: Sequence[float],
+    window_size: int,
+    names: Sequence[str] = ("mean", "std", "zscore"),
+    processes: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> Dict[str, array.array]:
+    """Compute the history of each of the quantities in names for a Container
+    with the given window_size that all of data is pushed into.
+
+    names can contain the base quantities (value, n, M, S, sum, reciprocal_sum)
+    and anything that can be subscribed to (mean, std, zscore, min, median, ...).
+    The result maps each name to an array("d") with one value per sample,
+    which matches a serial run up to floating point rounding.
+
+    The work is spread over the given number of processes (default: one per CPU).
+    """
+    if not 0 < window_size < float("inf"):
+        raise ValueError("backfill needs a positive, finite window size")
+    for name in names:
+        if name not in BASE_QUANTITIES and not hasattr(
+            Container, _subscribe_method(name)
+        ):
+            raise ValueError("{} can not be backfilled".format(name))
+
+    processes = processes or os.cpu_count() or 1
+    capacity = math.ceil(window_size)
+    if chunk_size is None:
+        chunk_size = max(
+            math.ceil(len(data) / (4 * processes)), MIN_WINDOWS_PER_CHUNK * capacity
+        )
+
+    # In a serial run, a NaN or infinity makes the running sums NaN for good,
+    # as does a zero for the reciprocal sum. The workers need to know if that
+    # happened before their warm-up.
+    first_non_finite, first_zero = _first_non_finite_and_zero(data)
+
+    jobs = []
+    for start in range(0, len(data), chunk_size):
+        warmup_start = max(start - capacity + 1, 0)
+        jobs.append(
+            (
+                data[warmup_start : start + chunk_size],
+                start - warmup_start,
+                window_size,
+                tuple(names),
+                first_non_finite < warmup_start,
+                first_zero < warmup_start,
+            )
+        )
+
+    if processes == 1 or len(jobs) == 1:
+        results = [_backfill_chunk(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_backfill_chunk, *zip(*jobs)))
+
+    histories = {name: array.array("d") for name in names}
+    for result in results:
+        for name in names:
+            histories[name].extend(result[name])
+    return histories
+
+
+def _subscribe_method(name: str) -> str:
+    return SUBSCRIBE_METHODS.get(name, "subscribe_" + name)
+
+
+def _first_non_finite_and_zero(data: Sequence[float]) -> tuple:
+    """Index of the first NaN or infinity and of the first zero in data (len(data) if none)"""
+    if np is not None:
+        values = np.asarray(data, dtype=float)
+        non_finite = np.flatnonzero(~np.isfinite(values))
+        zeros = np.flatnonzero(values == 0)
+        return (
+            non_finite[0] if len(non_finite) else len(values),
+            zeros[0] if len(zeros) else len(values),
+        )
+
+    first_non_finite = first_zero = len(data)
+    for i, value in enumerate(data):
+        if first_non_finite == len(data) and not math.isfinite(value):
+            first_non_finite = i
+        if first_zero == len(data) and value == 0:
+            first_zero = i
+    return first_non_finite, first_zero
+
+
+def _backfill_chunk(
+    data: Sequence[float],
+    warmup: int,
+    window_size: int,
+    names: Sequence[str],
+    non_finite_before: bool,
+    zero_before: bool,
+) -> Dict[str, array.array]:
+    """Push data into a fresh Container and return the histories after the first warmup samples"""
+    container = Container(window_size=window_size, record=())
+    for name in names:
+        if name not in BASE_QUANTITIES:
+            getattr(container, _subscribe_method(name))()
+
+    container.push_batch(data[:warmup])
+    if non_finite_before:
+        container.sum.assign(nan)
+
+    # With a window of one sample, the window is emptied on every push, which resets the rest
+    if math.ceil(window_size) > 1:
+        if non_finite_before:
+            container.M.assign(nan)
+            container.S.assign(nan)
+        if non_finite_before or zero_before:
+            container.reciprocal_sum.assign(nan)
+
+    for name in names:
+        getattr(container, name).record = True
+    container.push_batch(data[warmup:])
+    return {name: getattr(container, name).history for name in names}
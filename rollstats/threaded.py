@@ -0,0 +1,116 @@
+"""Feeding a container from several threads.
+
+Container.push is not thread-safe, and wrapping it in a lock makes producer threads
+contend on every sample. A SharedContainer instead gives every producer thread its own
+buffer, which only that thread appends to, and a single consumer drains the buffers
+into the container in batches. Readers get the Summary published after the last drain,
+which is an immutable snapshot, so they never wait for producers or the consumer.
+"""
+
+import threading
+
+from collections import deque
+from typing import Any
+
+from rollstats import Summary
+
+
+class SharedContainer(object):
+    """Collect samples pushed from any thread and push them into container in batches.
+
+    Producers call push() without taking any lock shared with other producers.
+    The samples of each thread keep their order, but there is no order between threads.
+    drain() pushes everything buffered so far; call it from one consumer thread,
+    or call start() to drain every interval seconds in a background thread.
+    Only the consumer may use the container directly.
+    """
+
+    def __init__(self, container: Any):
+        self.container = container
+
+        # The buffer of the current thread
+        self.local = threading.local()
+
+        # The buffers of all threads that have pushed, as (thread, buffer) tuples.
+        # The lock is only taken when a thread pushes for the first time, and on drain.
+        self.buffers = []  # List[Tuple[threading.Thread, deque]]
+        self.buffers_lock = threading.Lock()
+
+        # Makes sure there is only one consumer at a time
+        self.drain_lock = threading.Lock()
+
+        # The state after the last drain
+        self.snapshot = container.summary()
+
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def push(self, *datapoints: float) -> None:
+        """Buffer datapoints to be pushed on the next drain. Safe to call from any thread."""
+        try:
+            buffer = self.local.buffer
+        except AttributeError:
+            buffer = self.local.buffer = deque()
+            with self.buffers_lock:
+                self.buffers.append((threading.current_thread(), buffer))
+        buffer.extend(datapoints)
+
+    def drain(self) -> int:
+        """Push everything buffered so far into the container, publish a new snapshot,
+        and return the number of datapoints pushed"""
+        with self.drain_lock:
+            with self.buffers_lock:
+                buffers = list(self.buffers)
+            batch = []
+            for thread, buffer in buffers:
+                # deque.popleft is atomic, so producers can keep appending meanwhile
+                for _ in range(len(buffer)):
+                    batch.append(buffer.popleft())
+            if batch:
+                self.container.push_batch(batch)
+                self.snapshot = self.container.summary()
+            self.forget_finished_threads()
+            return len(batch)
+
+    def forget_finished_threads(self) -> None:
+        with self.buffers_lock:
+            self.buffers = [
+                (thread, buffer)
+                for thread, buffer in self.buffers
+                if thread.is_alive() or buffer
+            ]
+
+    def summary(self) -> Summary:
+        """The state of the container after the last drain. Safe to call from any thread,
+        and consistent: n, M, S and the rest always belong to the same set of samples.
+        The Summary is never changed after it is published, so don't change it either.
+        """
+        return self.snapshot
+
+    def start(self, interval: float = 0.01) -> None:
+        """Drain every interval seconds in a background thread"""
+        if self.thread is not None:
+            return
+        self.stopping.clear()
+
+        def run() -> None:
+            while not self.stopping.wait(interval):
+                self.drain()
+
+        self.thread = threading.Thread(target=run, name="rollstats-drain", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread and drain what is left"""
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+        self.drain()
+
+    def __enter__(self) -> "SharedContainer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
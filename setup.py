@@ -1,3 +1,3 @@
 from setuptools import setup, find_packages
 
-setup(name="rollstats", packages=find_packages())
+setup(name="rollstats", packages=find_packages(), python_requires=">=3.7")
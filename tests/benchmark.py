@@ -0,0 +1,342 @@
+"""Benchmark suite for rollstats.
+
+Measures push throughput, the overhead of each subscription, quantile throughput for
+windows up to 100k, indexing and slicing, history memory per sample and
+MemoryFloat.transform. Every timing is the best of several repeats, which is the most
+reproducible number on a noisy machine.
+
+Run it from the repository root, with rollstats installed or on the PYTHONPATH:
+
+    python tests/benchmark.py --output results.json
+    python tests/benchmark.py --baseline results.json --threshold 0.25
+
+With --baseline, every result that is more than threshold (relative) worse than in the
+baseline is reported as a regression and the exit code is 1. Timings are compared
+relative to a calibration loop, so the baseline can come from another machine.
+
+The reference results are kept in tests/benchmark_baseline.json (the default baseline),
+so checking a change for regressions is
+
+    python tests/benchmark.py
+
+and a change that makes things faster on purpose, or adds a benchmark, updates it with
+
+    python tests/benchmark.py --output tests/benchmark_baseline.json
+
+in the same commit. Pass --baseline "" to skip the comparison. Workloads of another
+size than the baseline's (e.g. with --quick) aren't comparable, so they skip it too.
+"""
+
+import argparse
+import cProfile
+import json
+import os
+import platform
+import pstats
+import sys
+import time
+import tracemalloc
+
+import rollstats
+
+BASELINE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json"
+)
+
+SUBSCRIPTIONS = [
+    "mean",
+    "var",
+    "std",
+    "pop_std",
+    "z_score",
+    "harmonic_mean",
+    "min",
+    "max",
+    "range",
+    "median",
+]
+
+
+def best_time(func, repeats):
+    """Best wall clock time of repeats calls of func"""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def data(pushes):
+    return [float((i * 7919) % 10007) for i in range(pushes)]
+
+
+def bench_push(scale, repeats):
+    """Microseconds per push, without subscriptions, for a range of window sizes"""
+    values = data(int(20000 * scale))
+    results = {}
+    for window in (1, 100, 10000, float("inf")):
+
+        def run():
+            container = rollstats.Container(window_size=window)
+            for value in values:
+                container.push(value)
+
+        results[f"push/window={window:g}"] = 1e6 * best_time(run, repeats) / len(values)
+    return results
+
+
+def bench_push_batch(scale, repeats):
+    """Microseconds per sample pushed with push_batch"""
+    values = data(int(200000 * scale))
+    results = {}
+    for window in (100, 10000):
+
+        def run():
+            rollstats.Container(window_size=window).push_batch(values)
+
+        time_per = best_time(run, repeats) / len(values)
+        results[f"push_batch/window={window:g}"] = 1e6 * time_per
+    return results
+
+
+def bench_subscriptions(scale, repeats):
+    """Microseconds per push with each subscription, with a window of 100.
+    The overhead of a subscription is the difference to push/window=100; the totals are
+    reported rather than the differences, since they are less noisy."""
+    values = data(int(20000 * scale))
+
+    def run(subscription):
+        container = rollstats.Container(window_size=100)
+        getattr(container, "subscribe_" + subscription)()
+        for value in values:
+            container.push(value)
+
+    results = {}
+    for subscription in SUBSCRIPTIONS:
+        time_per = best_time(lambda: run(subscription), repeats) / len(values)
+        results[f"subscription/{subscription}"] = 1e6 * time_per
+    return results
+
+
+def bench_quantiles(scale, repeats):
+    """Microseconds per push with the median, p95 and p99 subscribed, for a range of window sizes"""
+    values = data(int(200000 * scale))
+
+    def run(window):
+        container = rollstats.Container(window_size=window)
+        container.subscribe_median()
+        container.subscribe_quantile(0.95)
+        container.subscribe_quantile(0.99)
+        for value in values:
+            container.push(value)
+
+    results = {}
+    for window in (100, 1000, 10000, 100000):
+        time_per = best_time(lambda: run(window), repeats) / len(values)
+        results[f"quantiles/window={window:g}"] = 1e6 * time_per
+    return results
+
+
+def bench_indexing(scale, repeats):
+    """Microseconds per index and per slice of the last 100 values"""
+    operations = int(10000 * scale)
+    results = {}
+    for window in (10000, float("inf")):
+        container = rollstats.Container(window_size=window)
+        for value in data(10000):
+            container.push(value)
+
+        def index():
+            for i in range(operations):
+                container[-1]
+
+        def slice_():
+            for i in range(operations):
+                container[-100:]
+
+        name = f"window={window:g}"
+        results[f"index/{name}"] = 1e6 * best_time(index, repeats) / operations
+        results[f"slice/{name}"] = 1e6 * best_time(slice_, repeats) / operations
+    return results
+
+
+def bench_memory(scale, repeats):
+    """Bytes of history per push, for all quantities together and per quantity"""
+    pushes = int(50000 * scale)
+    values = data(pushes)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    container = rollstats.Container(window_size=100)
+    container.subscribe_std()
+    for value in values:
+        container.push(value)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    quantities = len(container.mem_floats) + len(container.subscriptions)
+    return {
+        "memory/bytes_per_push": allocated / pushes,
+        "memory/bytes_per_push_per_quantity": allocated / pushes / quantities,
+    }
+
+
+def bench_transform(scale, repeats):
+    """Microseconds per history element for MemoryFloat.transform of two floats"""
+    length = int(100000 * scale)
+    a = rollstats.MemoryFloat(0)
+    b = rollstats.MemoryFloat(0)
+    a.history.extend(data(length))
+    b.history.extend(data(length))
+
+    def run(**kwargs):
+        rollstats.MemoryFloat.transform(a, b, func=lambda x, y: x * y + 1, **kwargs)
+
+    results = {"transform/two_floats": 1e6 * best_time(run, repeats) / length}
+    if rollstats.np is not None:
+        vectorized = best_time(lambda: run(vectorized=True), repeats)
+        results["transform/two_floats_vectorized"] = 1e6 * vectorized / length
+    return results
+
+
+def bench_calibration(scale, repeats):
+    """Microseconds per iteration of a plain Python loop, to measure the speed of the machine"""
+    iterations = int(200000 * scale)
+
+    def run():
+        total = 0.0
+        for i in range(iterations):
+            total += i * 0.5
+
+    return {"calibration/loop": 1e6 * best_time(run, repeats) / iterations}
+
+
+BENCHMARKS = {
+    "calibration": bench_calibration,
+    "push": bench_push,
+    "push_batch": bench_push_batch,
+    "subscriptions": bench_subscriptions,
+    "quantiles": bench_quantiles,
+    "indexing": bench_indexing,
+    "memory": bench_memory,
+    "transform": bench_transform,
+}
+
+
+def run_benchmarks(names, scale, repeats):
+    results = {}
+    for name in names:
+        print(f"Running {name} ...", file=sys.stderr)
+        results.update(BENCHMARKS[name](scale, repeats))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print every result next to the baseline, and return the names of the regressions.
+    Every result is a cost, so lower is better. If both runs have a calibration result,
+    the timings of the baseline are scaled by how much faster or slower the machine is now,
+    which keeps a busy or throttled machine from looking like a regression."""
+    speed = 1.0
+    if results.get("calibration/loop") and baseline.get("calibration/loop"):
+        speed = results["calibration/loop"] / baseline["calibration/loop"]
+        print(f"Machine speed relative to the baseline: {1 / speed:.2f}x")
+
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if old is None or old <= 0:
+            print(f"{name:45} {value:12.4f}")
+            continue
+        if not name.startswith(("memory/", "calibration/")):
+            old *= speed
+        change = value / old - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:45} {value:12.4f} {old:12.4f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def profile():
+    """Print the functions that take the most time in a push with a z-score subscription"""
+    container = rollstats.Container(window_size=100)
+    container.subscribe_z_score()
+    values = data(100000)
+    profiler = cProfile.Profile()
+    profiler.runcall(lambda: [container.push(value) for value in values])
+    pstats.Stats(profiler).strip_dirs().sort_stats("tottime").print_stats(10)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument(
+        "--baseline",
+        default=BASELINE,
+        help="compare with the results in this JSON file (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="relative slowdown that counts as a regression (default 0.25)",
+    )
+    parser.add_argument(
+        "--only", nargs="+", choices=sorted(BENCHMARKS), default=list(BENCHMARKS)
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument(
+        "--quick", action="store_true", help="smaller workloads, for smoke testing"
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="print a profile of push instead"
+    )
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        profile()
+        return 0
+
+    scale = 1
+    repeats = args.repeats
+    if args.quick:
+        scale = 0.1
+        repeats = 1
+    results = run_benchmarks(args.only, scale, repeats)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        if saved.get("scale", 1) == scale:
+            baseline = saved["results"]
+        else:
+            print(
+                f"Not comparing with {args.baseline}, "
+                f"which was run at scale {saved.get('scale', 1)} instead of {scale}"
+            )
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "numpy": rollstats.np is not None,
+                    "repeats": repeats,
+                    "scale": scale,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""Helpers shared by the tests"""
+
+import math
+
+from pytest import approx
+
+# The state that ContainerGroup and VectorContainer keep per series, like Container
+STATE = ("value", "n", "M", "S", "sum", "reciprocal_sum")
+
+
+def check_lists_approx_equal(history, accepted):
+    """Helper function to check that two lists with NaNs are approximately equal"""
+    assert len(history) == len(accepted)
+    for hist, acc in zip(history, accepted):
+        if math.isnan(acc):
+            assert math.isnan(hist)
+        else:
+            assert hist == approx(acc)
+
+
+def check_state(get, container, abs=None):
+    """Helper function to check that the state returned by get(name) for every name in STATE
+    is the same as the state of a Container"""
+    for name in STATE:
+        mine = get(name)
+        theirs = getattr(container, name).value
+        if math.isnan(theirs):
+            assert math.isnan(mine)
+        else:
+            assert mine == approx(theirs, abs=abs)
+
+
+def random_values(rng, length):
+    """Random values with repeats and zeros, which exercise the corner cases"""
+    return [rng.choice([0, 1, 2.5, -3, rng.gauss(0, 10)]) for _ in range(length)]
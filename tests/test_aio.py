@@ -0,0 +1,144 @@
+import asyncio
+
+from pytest import approx, raises
+
+import rollstats
+from rollstats.aio import Feeder
+
+
+async def numbers(count):
+    for i in range(count):
+        yield float(i)
+
+
+def test_consume():
+    """All samples of an async iterable should end up in the container, in order"""
+
+    async def main():
+        container = rollstats.Container(window_size=10)
+        async with Feeder(container, max_batch=64) as feeder:
+            await feeder.consume(numbers(1000))
+        return container, feeder
+
+    container, feeder = asyncio.run(main())
+    assert list(container.value.history) == list(range(1000))
+    assert container.M.value == approx(994.5)
+    assert 1 <= feeder.batches < 1000
+
+
+def test_backpressure():
+    """put() should wait while the queue is full"""
+
+    async def main():
+        feeder = Feeder(rollstats.Container(), max_queue=2)
+        await feeder.put(1.0)
+        await feeder.put(2.0)
+        put = asyncio.ensure_future(feeder.put(3.0))
+        await asyncio.sleep(0)
+        blocked = not put.done()
+        feeder.start()
+        await put
+        await feeder.close()
+        return blocked, feeder.container
+
+    blocked, container = asyncio.run(main())
+    assert blocked
+    assert list(container.value.history) == [1, 2, 3]
+
+
+def test_stream():
+    """A stream should yield the latest values after every batch, and end on close"""
+
+    async def main():
+        container = rollstats.Container(window_size=3)
+        container.subscribe_std()
+        feeder = Feeder(container, max_batch=4)
+        updates = []
+
+        async def listen():
+            async for update in feeder.stream("std", "n"):
+                updates.append(update)
+
+        listener = asyncio.ensure_future(listen())
+        await asyncio.sleep(0)
+        feeder.start()
+        for value in (1, 2, 3, 4, 5, 6):
+            await feeder.put(value)
+            await asyncio.sleep(0)
+        await feeder.close()
+        await listener
+        return updates
+
+    updates = asyncio.run(main())
+    assert updates
+    assert updates[-1] == {"std": approx(1.0), "n": 3}
+
+
+def test_columns():
+    """With columns, each sample should be a tuple of push arguments"""
+
+    async def main():
+        container = rollstats.TimeContainer(horizon=2)
+        async with Feeder(container, columns=True) as feeder:
+            update = asyncio.ensure_future(feeder.next_update("M"))
+            await asyncio.sleep(0)
+            for timestamp in range(5):
+                await feeder.put((timestamp * 10.0, timestamp))
+        return container, update.result()
+
+    container, update = asyncio.run(main())
+    assert list(container.value.history) == [0, 10, 20, 30, 40]
+    assert container.M.value == approx(35)
+    assert update == {"M": approx(35)}
+
+
+class FailingContainer(object):
+    """A container whose push and push_batch fail on negative samples"""
+
+    def __init__(self):
+        self.values = []
+
+    def push(self, *datapoints):
+        self.push_batch(datapoints)
+
+    def push_batch(self, datapoints):
+        if any(datapoint < 0 for datapoint in datapoints):
+            raise ValueError("negative sample")
+        self.values.extend(datapoints)
+
+
+def test_failure():
+    """A failing push_batch should stop the feeder and be raised to its users"""
+
+    async def main():
+        feeder = Feeder(FailingContainer(), max_batch=1, max_queue=4)
+        feeder.start()
+        await feeder.put(1.0)
+        await asyncio.sleep(0)
+        update = asyncio.ensure_future(feeder.next_update())
+        await feeder.put(-1.0)
+        # Producers must not get stuck on the full queue
+        with raises(ValueError):
+            for value in range(100):
+                await feeder.put(float(value))
+        with raises(ValueError):
+            await feeder.next_update()
+        with raises(ValueError):
+            await feeder.close()
+        return feeder, update
+
+    feeder, update = asyncio.run(main())
+    assert feeder.container.values == [1.0]
+    assert feeder.closed
+    assert isinstance(update.exception(), ValueError)
+
+
+def test_failure_context_manager():
+    """The context manager should raise the failure of a batch on exit"""
+
+    async def main():
+        async with Feeder(FailingContainer()) as feeder:
+            await feeder.put(-1.0)
+
+    with raises(ValueError):
+        asyncio.run(main())
@@ -0,0 +1,54 @@
+import math
+
+from pytest import approx, raises
+
+from helpers import check_lists_approx_equal
+import rollstats
+from rollstats.backfill import backfill
+
+nan = rollstats.nan
+
+
+def check_backfill(data, window_size, names, **kwargs):
+    """Helper function to check that backfill gives the same histories as a serial run"""
+    serial = rollstats.Container(window_size=window_size)
+    for name in names:
+        if name == "zscore":
+            serial.subscribe_z_score()
+        elif name not in ("value", "n", "M", "S", "sum", "reciprocal_sum"):
+            getattr(serial, "subscribe_" + name)()
+    serial.push(*data)
+
+    histories = backfill(data, window_size, names, **kwargs)
+    for name in names:
+        check_lists_approx_equal(histories[name], getattr(serial, name).history)
+
+
+def test_backfill():
+    """Backfilling in chunks gives the same result as a serial run"""
+    data = [math.sin(i * 0.1) * 10 + i / 50 for i in range(1000)]
+    names = ("n", "M", "mean", "std", "zscore", "harmonic_mean", "min", "median")
+    for window_size in (1, 3, 20):
+        check_backfill(data, window_size, names, processes=1, chunk_size=37)
+
+
+def test_backfill_processes():
+    """Backfilling works with a process pool"""
+    data = [math.cos(i * 0.3) * 5 for i in range(500)]
+    check_backfill(data, 10, ("mean", "std", "max"), processes=2, chunk_size=100)
+
+
+def test_backfill_sticky_nans():
+    """NaNs and zeros affect the running sums for the rest of the run like in a serial run"""
+    data = [1, 2, 0, 3, 4, nan, 5, 6, 7, 8, 9, 10, 11, 12]
+    names = ("sum", "M", "reciprocal_sum")
+    for window_size in (1, 2, 3):
+        check_backfill(data, window_size, names, processes=1, chunk_size=3)
+
+
+def test_backfill_errors():
+    """The window must be finite and the names must be known"""
+    with raises(ValueError):
+        backfill([1, 2, 3], float("inf"))
+    with raises(ValueError):
+        backfill([1, 2, 3], 2, ("nonsense",))
@@ -0,0 +1,109 @@
+import math
+import random
+
+from pytest import approx, raises
+
+from helpers import check_state, random_values
+import rollstats
+
+nan = rollstats.nan
+
+
+def make_data(length, n_keys, seed=0):
+    rng = random.Random(seed)
+    keys = [rng.randrange(n_keys) for _ in range(length)]
+    return keys, random_values(rng, length)
+
+
+def test_create():
+    """It should be possible to create a ContainerGroup"""
+    group = rollstats.ContainerGroup(window_size=10)
+    assert len(group) == 0
+
+
+def test_push_matches_containers():
+    """Every series should behave like its own Container"""
+    keys, values = make_data(2000, 20)
+    for window_size in (1, 3, 10, float("inf")):
+        group = rollstats.ContainerGroup(window_size=window_size)
+        containers = {}
+        for key, value in zip(keys, values):
+            group.push(key, value)
+            containers.setdefault(key, rollstats.Container(window_size=window_size))
+            containers[key].push(value)
+        assert set(group) == set(containers)
+        for key, container in containers.items():
+            check_state(lambda name: getattr(group[key], name), container)
+            if window_size < float("inf"):
+                assert group[key].tolist() == list(container.data)
+
+
+def test_push_batch_matches_push():
+    """Pushing a batch of (key, value) pairs is the same as pushing them one by one"""
+    keys, values = make_data(3000, 50, seed=1)
+    for window_size in (1, 4, float("inf")):
+        one_by_one = rollstats.ContainerGroup(window_size=window_size)
+        batch = rollstats.ContainerGroup(window_size=window_size)
+        for key, value in zip(keys, values):
+            one_by_one.push(key, value)
+        for start in range(0, len(keys), 700):
+            batch.push_batch(keys[start : start + 700], values[start : start + 700])
+        for name in ("value", "n", "M", "S", "sum", "reciprocal_sum"):
+            check = [
+                (math.isnan(a) and math.isnan(b)) or a == approx(b)
+                for a, b in zip(getattr(batch, name), getattr(one_by_one, name))
+            ]
+            assert all(check)
+
+
+def test_push_batch_hot_key():
+    """A key that dominates the batch gives the same results as pushing one by one"""
+    random.seed(7)
+    keys = [random.choice("abcdefghij") if i % 4 == 0 else "hot" for i in range(2000)]
+    values = [random.uniform(-5, 5) for key in keys]
+    one_by_one = rollstats.ContainerGroup(window_size=20)
+    batch = rollstats.ContainerGroup(window_size=20)
+    for key, value in zip(keys, values):
+        one_by_one.push(key, value)
+    batch.push_batch(keys, values)
+    for name in ("n", "M", "S", "sum"):
+        assert getattr(batch, name).tolist() == approx(
+            getattr(one_by_one, name).tolist()
+        )
+
+
+def test_view():
+    """A view gives the derived statistics of one series"""
+    group = rollstats.ContainerGroup(window_size=3)
+    group.push_batch(["a", "b", "a", "a", "a"], [1, 10, 2, 4, 7])
+    a = group["a"]
+    assert "a" in group
+    assert "c" not in group
+    assert len(a) == 3
+    assert a[:] == [2, 4, 7]
+    assert a[-1] == 7
+    assert a.mean == approx(13 / 3)
+    assert a.var == approx(
+        ((2 - 13 / 3) ** 2 + (4 - 13 / 3) ** 2 + (7 - 13 / 3) ** 2) / 2
+    )
+    assert a.std == approx(math.sqrt(a.var))
+    assert a.summary().n == 3
+    assert group["b"].mean == 10
+    assert math.isnan(group["b"].std)
+    with raises(KeyError):
+        group["c"]
+    with raises(ValueError):
+        group.push_batch(["a"], [1, 2])
+
+
+def test_large_value_leaves_window():
+    """M and S are right again once a large value has left the window"""
+    for push_batch in (False, True):
+        group = rollstats.ContainerGroup(window_size=3)
+        for value in [1e9, 1, 2, 3, 4]:
+            if push_batch:
+                group.push_batch(["a", "b"], [value, value])
+            else:
+                group.push("a", value)
+        assert group["a"].mean == approx(3)
+        assert group["a"].std == approx(1)
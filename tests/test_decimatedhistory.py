@@ -0,0 +1,116 @@
+import math
+
+import numpy as np
+from pytest import approx, raises
+
+import rollstats
+
+
+def test_every_kth():
+    """With the default aggregate, every k-th value should be kept"""
+    history = rollstats.DecimatedHistory(3)
+    history.extend(range(10))
+    assert list(history) == [2, 5, 8]
+    assert history[-1] == 8
+    assert len(history) == 3
+
+
+def test_aggregates():
+    """Each bucket should be aggregated into its min, max or mean"""
+    values = [3, 1, 4, 1, 5, 9, 2, 6]
+    expected = {"min": [1, 1, 5, 2], "max": [3, 4, 9, 6], "mean": [2, 2.5, 7, 4]}
+    for aggregate, buckets in expected.items():
+        history = rollstats.DecimatedHistory(2, aggregate)
+        history.extend(values)
+        assert list(history) == approx(buckets)
+
+
+def test_nan():
+    """A NaN in a bucket should make the aggregate NaN"""
+    for aggregate in ("min", "max", "mean"):
+        history = rollstats.DecimatedHistory(2, aggregate)
+        history.extend([rollstats.nan, 1, 1, rollstats.nan])
+        assert all(math.isnan(value) for value in history)
+
+
+def test_tiers():
+    """Buckets falling out of a tier should be compacted into the next one"""
+    history = rollstats.DecimatedHistory.tiers(
+        (1, 4), (2, 3), (2, None), aggregate="max"
+    )
+    history.extend(range(24))
+    # 4 raw values, 3 pairs, and the older values in pairs of pairs
+    assert list(history) == [3, 7, 11, 15, 17, 19, 20, 21, 22, 23]
+    assert history[0] == 3
+    assert history[5] == 19
+    assert history[2:4].tolist() == [11, 15]
+
+
+def test_bounded():
+    """Without a coarser tier, old buckets should be dropped"""
+    history = rollstats.DecimatedHistory(2, "mean", max_history=2)
+    history.extend(range(10))
+    assert list(history) == [6.5, 8.5]
+    with raises(ValueError):
+        rollstats.DecimatedHistory(2, coarser=rollstats.DecimatedHistory(2))
+    with raises(ValueError):
+        rollstats.DecimatedHistory(2, "median")
+
+
+def test_memory_float():
+    """A MemoryFloat should be able to keep a decimated history"""
+    f = rollstats.MemoryFloat(history=rollstats.DecimatedHistory(2, "max"))
+    for value in (rollstats.nan, 2, 4, 8, 16):
+        f.value = value
+        f.save()
+    # The NaN makes its bucket NaN
+    assert math.isnan(f.history[0])
+    assert list(f.history)[1:] == [8]
+
+
+def test_container(tmp_path):
+    """A container with a decimation should decimate all histories the same way"""
+    container = rollstats.TimeContainer(
+        horizon=4, record_timestamps=True, decimation=((2, 2), (2, None))
+    )
+    container.subscribe_std()
+    for timestamp in range(12):
+        container.push(float(timestamp % 5), timestamp)
+    histories = container.histories()
+    assert histories["timestamp"].tolist() == [3, 7, 9, 11]
+    assert histories["value"].tolist() == [3, 2, 4, 1]
+    assert histories["n"].tolist() == [4, 4, 4, 4]
+    assert histories["std"][-1] == approx(np.std([3, 4, 0, 1], ddof=1))
+
+    with raises(ValueError):
+        container.save_snapshot(tmp_path / "container.snap")
+    with raises(ValueError):
+        rollstats.Container(max_history=10, decimation=((2, None),))
+
+
+def test_alignment():
+    """Histories that are decimated differently shouldn't be aligned with each other"""
+    container = rollstats.Container(window_size=3)
+    container.push(1, 2, 3, 4)
+    container.value.history = rollstats.DecimatedHistory(2)
+    with raises(ValueError):
+        container.histories()
+    with raises(ValueError):
+        rollstats.MemoryFloat.transform(
+            container.value, container.n, func=lambda x, y: x * y
+        )
+
+
+def test_lazy():
+    """Lazy subscriptions should follow the last values of the buckets"""
+    container = rollstats.Container(lazy=True, decimation=((3, None),))
+    container.subscribe_std()
+    container.push(*range(10))
+    assert list(container.std.history) == approx(
+        [1, np.std(range(6), ddof=1), np.std(range(9), ddof=1)]
+    )
+    container = rollstats.Container(
+        lazy=True, decimation=((3, None),), decimation_aggregate="mean"
+    )
+    with raises(ValueError):
+        container.subscribe_std()
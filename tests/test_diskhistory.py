@@ -0,0 +1,116 @@
+import numpy as np
+from pytest import raises
+
+import rollstats
+
+
+def test_append_and_index(tmp_path):
+    """A DiskHistory should behave like a list of floats, growing as needed"""
+    history = rollstats.DiskHistory(str(tmp_path / "x.hist"), initial_capacity=2)
+    for i in range(10):
+        history.append(i)
+    history.extend([10, 11])
+    assert len(history) == 12
+    assert history[0] == 0
+    assert history[-1] == 11
+    assert history[2:5].tolist() == [2, 3, 4]
+    assert history == list(range(12))
+    with raises(IndexError):
+        history[12]
+
+
+def test_reopen(tmp_path):
+    """Opening an existing file should continue its history"""
+    path = str(tmp_path / "x.hist")
+    history = rollstats.DiskHistory(path)
+    history.extend([1, 2, 3])
+    history.close()
+
+    with raises(FileExistsError):
+        rollstats.DiskHistory(path)
+    history = rollstats.DiskHistory(path, resume=True)
+    history.append(4)
+    assert list(history) == [1, 2, 3, 4]
+
+
+def test_locked(tmp_path):
+    """A file can only be open in one DiskHistory at a time"""
+    path = str(tmp_path / "x.hist")
+    history = rollstats.DiskHistory(path)
+    with raises(ValueError):
+        rollstats.DiskHistory(path, resume=True)
+    history.close()
+    rollstats.DiskHistory(path, resume=True).close()
+
+
+def test_resume_with_view(tmp_path):
+    """Closing releases the lock even while a view of the file is still in use"""
+    path = str(tmp_path / "x.hist")
+    history = rollstats.DiskHistory(path)
+    history.extend([1, 2])
+    values = history.to_numpy()
+    history.close()
+    history = rollstats.DiskHistory(path, resume=True)
+    history.append(3)
+    assert list(history) == [1, 2, 3]
+    assert values.tolist() == [1, 2]
+    history.close()
+
+
+def test_not_a_history(tmp_path):
+    """Opening a file that isn't a history should raise an error"""
+    path = tmp_path / "x.hist"
+    path.write_bytes(b"not a history file")
+    with raises(ValueError):
+        rollstats.DiskHistory(str(path), resume=True)
+
+
+def test_to_numpy(tmp_path):
+    """The history should be exported as a view of the file"""
+    history = rollstats.DiskHistory(str(tmp_path / "x.hist"), initial_capacity=2)
+    history.extend([1, 2])
+    values = history.to_numpy()
+    assert values.tolist() == [1, 2]
+    history.append(3)
+    history.extend([4, 5, 6])
+    assert values.tolist() == [1, 2]
+    assert history.to_numpy().tolist() == [1, 2, 3, 4, 5, 6]
+
+
+def test_container(tmp_path):
+    """A container with a history_dir should keep its histories on disk"""
+    container = rollstats.Container(window_size=3, history_dir=str(tmp_path))
+    container.subscribe_mean()
+    container.push(1, 2, 3, 4)
+    container.push_batch(np.array([5.0, 6.0]))
+    assert isinstance(container.mean.history, rollstats.DiskHistory)
+    assert list(container.mean.history) == [1, 1.5, 2, 3, 4, 5]
+    assert (tmp_path / "mean.hist").exists()
+
+    with raises(ValueError):
+        rollstats.Container(max_history=3, history_dir=str(tmp_path))
+
+
+def test_container_resume(tmp_path):
+    """A container only continues the histories in its history_dir if asked to"""
+    with rollstats.Container(history_dir=str(tmp_path)) as container:
+        container.push(1, 2, 3)
+    with raises(FileExistsError):
+        rollstats.Container(history_dir=str(tmp_path))
+    with rollstats.Container(history_dir=str(tmp_path), resume=True) as container:
+        with raises(ValueError):
+            rollstats.Container(history_dir=str(tmp_path), resume=True)
+        container.push(10)
+        assert list(container.value.history) == [1, 2, 3, 10]
+        assert list(container.n.history) == [1, 2, 3, 1]
+
+
+def test_container_close(tmp_path):
+    """Closing a container should close the files of its histories"""
+    container = rollstats.TimeContainer(
+        horizon=10, record_timestamps=True, history_dir=str(tmp_path)
+    )
+    container.push(1, 0)
+    container.close()
+    assert container.value.history.file.closed
+    assert container.timestamp.history.file.closed
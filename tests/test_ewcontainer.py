@@ -0,0 +1,84 @@
+import math
+
+from pytest import approx, raises
+
+import rollstats
+
+nan = rollstats.nan
+
+
+def weighted_stats(values, weights):
+    """Reference weighted mean, sample variance and population variance"""
+    W = sum(weights)
+    W2 = sum(w * w for w in weights)
+    mean = sum(w * v for w, v in zip(weights, values)) / W
+    S = sum(w * (v - mean) ** 2 for w, v in zip(weights, values))
+    var = S / (W - W2 / W) if W * W > W2 else nan
+    return mean, var, S / W
+
+
+def test_create():
+    """The decay is given by exactly one of alpha, span and halflife"""
+    assert rollstats.EWContainer(alpha=0.5).decay == approx(0.5)
+    assert rollstats.EWContainer(span=3).decay == approx(0.5)
+    assert rollstats.EWContainer(halflife=1).decay == approx(0.5)
+    with raises(ValueError):
+        rollstats.EWContainer()
+    with raises(ValueError):
+        rollstats.EWContainer(alpha=0.5, span=3)
+    with raises(ValueError):
+        rollstats.EWContainer(alpha=0)
+
+
+def test_mean_var_std_zscore():
+    """Check the statistics against weights computed from scratch"""
+    container = rollstats.EWContainer(alpha=0.3)
+    container.subscribe_mean()
+    container.subscribe_var()
+    container.subscribe_std()
+    container.subscribe_pop_var()
+    container.subscribe_z_score()
+    values = [3, 1, 4, 1, 5, 9, 2, 6]
+    for i, value in enumerate(values):
+        container.push(value)
+        weights = [0.7 ** (i - j) for j in range(i + 1)]
+        mean, var, pop_var = weighted_stats(values[: i + 1], weights)
+        assert container.mean == approx(mean)
+        assert container.pop_var == approx(pop_var)
+        if i == 0:
+            assert math.isnan(container.var)
+            assert math.isnan(container.zscore)
+        else:
+            assert container.var == approx(var)
+            assert container.std == approx(math.sqrt(var))
+            assert container.zscore == approx((value - mean) / math.sqrt(var))
+    assert len(container.mean.history) == len(values)
+
+
+def test_timestamps():
+    """With timestamps, the weights decay with the time since each sample"""
+    container = rollstats.EWContainer(halflife=2)
+    container.subscribe_mean()
+    container.subscribe_var()
+    times = [0, 0, 1, 4, 4.5, 10]
+    values = [1, 2, 5, 3, 8, 4]
+    for i, (value, timestamp) in enumerate(zip(values, times)):
+        container.push(value, timestamp)
+        weights = [0.5 ** ((timestamp - t) / 2) for t in times[: i + 1]]
+        mean, var, pop_var = weighted_stats(values[: i + 1], weights)
+        assert container.mean == approx(mean)
+        if i > 0:
+            assert container.var == approx(var)
+
+    with raises(ValueError):
+        container.push(1, 9)
+
+
+def test_no_per_sample_storage():
+    """Without histories, the container holds the same state after any number of pushes"""
+    container = rollstats.EWContainer(span=10, record=())
+    container.subscribe_std()
+    for i in range(1000):
+        container.push(i % 7)
+    assert all(len(mem_float) == 0 for mem_float in container.mem_floats)
+    assert container.std > 0
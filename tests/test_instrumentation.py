@@ -0,0 +1,86 @@
+from pytest import approx, raises
+
+import rollstats
+
+
+def test_counters():
+    """Pushes, evictions and subscription calls should be counted on both push paths"""
+    container = rollstats.Container(window_size=10)
+    container.subscribe_std()
+    container.instrument()
+    container.push(*range(15))
+    container.push_batch([1.0, 2.0, 3.0, 4.0, 5.0])
+    stats = container.stats()
+    assert stats["pushes"] == 20
+    assert stats["evictions"] == 10
+    assert stats["subscriptions"]["std"]["calls"] == 20
+    assert stats["history_bytes"] == 8 * 20 * 7
+    assert stats["push_time"] >= stats["history_time"] >= 0
+
+
+def test_hooks():
+    """Hooks should be counted and timed, and restored afterwards"""
+    container = rollstats.Container()
+    calls = []
+    hook = calls.append
+    container.M.add_hook(hook)
+    container.instrument()
+    container.push(1, 2, 3)
+    assert container.stats()["hook_calls"] == 3
+    assert len(calls) == 3
+    container.uninstrument()
+    assert container.M.hooks == [hook]
+
+
+def test_uninstrument():
+    """Uninstrumenting should restore the original methods and plan"""
+    container = rollstats.Container(window_size=0)
+    container.subscribe_mean()
+    push = container.push
+    container.instrument()
+    assert container.push is not push
+    container.uninstrument()
+    assert container.push is push
+    assert container.plan == tuple(container.subscriptions)
+    with raises(RuntimeError):
+        container.stats()
+
+
+def test_sink():
+    """The sink should be called with the stats after pushes"""
+    container = rollstats.Container()
+    received = []
+    container.instrument(sink=received.append, interval=0)
+    container.push(1)
+    container.push(2)
+    assert [stats["pushes"] for stats in received] == [1, 2]
+
+
+def test_subscribe_after_instrument():
+    """Subscriptions made after instrumenting should be timed too"""
+    container = rollstats.Container()
+    container.instrument()
+    container.subscribe_mean()
+    container.push(1, 2)
+    assert container.stats()["subscriptions"]["mean"]["calls"] == 2
+
+
+def test_trackers():
+    """Trackers should be timed under the names of their outputs, and restored afterwards"""
+    container = rollstats.Container(window_size=10)
+    container.subscribe_min()
+    container.instrument()
+    container.subscribe_median()
+    container.subscribe_quantile(0.95)
+    container.push(*range(15))
+    container.push_batch([1.0, 2.0, 3.0, 4.0, 5.0])
+    subscriptions = container.stats()["subscriptions"]
+    # 20 pushes and 10 evictions
+    assert subscriptions["min"]["calls"] == 30
+    assert subscriptions["median,p95"]["calls"] == 30
+    assert container.min.value == 1
+    assert container.p95.value == approx(13.55)
+    container.uninstrument()
+    assert all(
+        type(tracker) is not rollstats.TimedTracker for tracker in container.trackers
+    )
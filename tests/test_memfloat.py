@@ -1,4 +1,7 @@
-from pytest import approx
+import array
+
+import numpy as np
+from pytest import approx, raises
 
 import rollstats
 
@@ -31,6 +34,8 @@ def test_operations():
     assert 1 - f == approx(-1)
     assert f + 1 == approx(3)
     assert 1 + f == approx(3)
+    assert f * 3 == approx(6)
+    assert 3 * f == approx(6)
     f -= 1
     assert f == approx(1)
 
@@ -144,3 +149,154 @@ def test_connect():
         i3.save()
 
     check_history(o, [111, 222, 333])
+
+
+def test_max_history():
+    """With max_history, only the last values are kept"""
+    f = rollstats.MemoryFloat(0.0, max_history=3)
+    for i in range(10):
+        f.assign(i)
+        f.save()
+    assert len(f) == 3
+    check_history(f, [7, 8, 9])
+    assert f.history[0] == 7
+    assert f.history[-1] == 9
+    assert list(f.history[1:]) == [8, 9]
+
+    f.extend([10, 11])
+    check_history(f, [9, 10, 11])
+    f.extend(list(range(20, 30)))
+    check_history(f, [27, 28, 29])
+    assert f == 29
+
+
+def test_max_history_copy():
+    """Copying keeps the bound on the history"""
+    f1 = rollstats.MemoryFloat(0.0, max_history=2)
+    for i in range(3):
+        f1.save()
+    f2 = f1.copy()
+    f2.save()
+    assert len(f2) == 2
+    assert f2.max_history == 2
+
+
+def test_max_history_transform():
+    """Transforming bounded histories works on the retained tail"""
+    f1 = rollstats.MemoryFloat(0.0, max_history=4)
+    f2 = rollstats.MemoryFloat(1.0)
+    for i in range(1, 10):
+        f1 += 1
+        f1.save()
+        f2.save()
+
+    f_sum = rollstats.MemoryFloat.transform(f1, f2, func=lambda x, y: x + y)
+    check_history(f_sum, [7, 8, 9, 10])
+    assert f_sum.max_history == 4
+
+
+def test_no_record():
+    """Without record, saving only calls the hooks"""
+    values = []
+    f = rollstats.MemoryFloat(0.0, record=False)
+    f.add_hook(lambda f: values.append(f.value))
+    for i in range(3):
+        f.assign(i)
+        f.save()
+    check_history(f, [])
+    assert values == [0, 1, 2]
+
+
+def test_to_numpy():
+    """The history should be exported as a view, which doesn't block growing the history"""
+    f = rollstats.MemoryFloat(0.0)
+    for i in range(5):
+        f.value = i
+        f.save()
+    values = f.to_numpy()
+    assert values.tolist() == [0, 1, 2, 3, 4]
+    assert np.shares_memory(values, np.frombuffer(f.history))
+    f.save()
+    f.extend([5, 6])
+    assert values.tolist() == [0, 1, 2, 3, 4]
+    assert f.to_numpy().tolist() == [0, 1, 2, 3, 4, 4, 5, 6]
+
+
+def test_to_numpy_repeatedly():
+    """Exporting a view after every push copies the history only once"""
+    f = rollstats.MemoryFloat(0.0)
+    views = []
+    for i in range(100):
+        f.value = i
+        f.save()
+        views.append(f.to_numpy())
+    assert isinstance(f.history, rollstats.GrowableHistory)
+    assert len(f.history.buffer) == 128
+    assert [view.tolist() for view in views] == [list(range(i + 1)) for i in range(100)]
+    assert f.history == list(range(100))
+
+
+def test_to_numpy_max_history():
+    """A bounded history should be a view until it wraps around"""
+    f = rollstats.MemoryFloat(0.0, max_history=4)
+    for i in range(3):
+        f.value = i
+        f.save()
+    assert f.to_numpy().tolist() == [0, 1, 2]
+    assert np.shares_memory(f.to_numpy(), np.frombuffer(f.history.buffer))
+    for i in range(3, 6):
+        f.value = i
+        f.save()
+    assert f.to_numpy().tolist() == [2, 3, 4, 5]
+
+
+def make_transform_inputs():
+    f1 = rollstats.MemoryFloat(0.0)
+    f2 = rollstats.MemoryFloat(1.0, max_history=6)
+    for i in range(1, 10):
+        f1 += 1
+        f1.save()
+        f2.save()
+    return f1, f2
+
+
+def test_vectorized_transform():
+    """A vectorized transform calls func once with the whole histories"""
+    f1, f2 = make_transform_inputs()
+    calls = []
+
+    def func(x, y):
+        calls.append(x)
+        return x * 2 + y
+
+    f_result = rollstats.MemoryFloat.transform(f1, f2, func=func, vectorized=True)
+    assert f_result.value == 19
+    check_history(f_result, [9, 11, 13, 15, 17, 19])
+    assert len(calls) == 2
+
+    f_const = rollstats.MemoryFloat.transform(
+        f1, f2, func=lambda x, y: 5.0, vectorized=True
+    )
+    assert list(f_const.history) == [5.0] * 6
+
+
+def test_lazy_transform():
+    """A lazy transform computes values on access and follows its inputs"""
+    f1, f2 = make_transform_inputs()
+    for vectorized in (False, True):
+        f_sum = rollstats.MemoryFloat.transform(
+            f1, f2, func=lambda x, y: x + y, lazy=True, vectorized=vectorized
+        )
+        assert isinstance(f_sum.history, rollstats.TransformedHistory)
+        assert list(f_sum.history) == [5, 6, 7, 8, 9, 10]
+        assert f_sum.history[-1] == 10
+        assert f_sum.history[1:5:2].tolist() == [6, 8]
+        assert f_sum.history[::-2].tolist() == [10, 8, 6]
+        assert f_sum.copy().history == array.array("d", [5, 6, 7, 8, 9, 10])
+        with raises(TypeError):
+            f_sum.history.append(1)
+
+    f1 += 1
+    f1.save()
+    f2.save()
+    assert f_sum.history[-1] == 11
@@ -0,0 +1,85 @@
+import math
+import random
+
+from pytest import approx
+
+import rollstats
+
+
+def reference(xs, ys):
+    """Helper function to compute the statistics of a window from scratch"""
+    n = len(xs)
+    mx = sum(xs) / n
+    my = sum(ys) / n
+    sxx = sum((x - mx) ** 2 for x in xs)
+    syy = sum((y - my) ** 2 for y in ys)
+    sxy = sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+    result = {"cov": sxy / (n - 1), "pop_cov": sxy / n}
+    if sxx > 0 and syy > 0:
+        result["corr"] = sxy / math.sqrt(sxx * syy)
+        result["r_squared"] = result["corr"] ** 2
+    if sxx > 0:
+        result["slope"] = sxy / sxx
+        result["intercept"] = my - result["slope"] * mx
+    return result
+
+
+def make_container(window_size):
+    container = rollstats.PairedContainer(window_size=window_size)
+    for name in ("cov", "pop_cov", "corr", "slope", "intercept", "r_squared"):
+        getattr(container, "subscribe_" + name)()
+    return container
+
+
+def test_create():
+    """It should be possible to create a PairedContainer"""
+    container = rollstats.PairedContainer(window_size=10)
+    assert len(container) == 0
+
+
+def test_rolling_statistics():
+    """The statistics should match a computation from scratch over the window"""
+    rng = random.Random(0)
+    xs = [rng.gauss(0, 10) for _ in range(300)]
+    ys = [2 * x + rng.gauss(5, 3) for x in xs]
+    for window_size in (2, 5, 50, float("inf")):
+        container = make_container(window_size)
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            container.push(x, y)
+            start = 0 if math.isinf(window_size) else max(0, i + 1 - window_size)
+            if i - start < 1:
+                continue
+            for name, value in reference(xs[start : i + 1], ys[start : i + 1]).items():
+                assert getattr(container, name).value == approx(
+                    value, rel=1e-6, abs=1e-9
+                )
+
+
+def test_perfect_line():
+    """Points on a line should be fitted exactly"""
+    container = make_container(4)
+    container.push_batch([1, 2, 3, 4, 5, 6], [7, 5, 3, 1, -1, -3])
+    assert container.slope.value == approx(-2)
+    assert container.intercept.value == approx(9)
+    assert container.corr.value == -1
+    assert container.r_squared.value == approx(1)
+    assert list(container.slope.history)[1:] == approx([-2] * 5)
+
+
+def test_large_value_leaves_window():
+    """The sums are right again once a large value has left the window"""
+    container = make_container(3)
+    container.push_batch([1e9, 1, 2, 3, 4], [5, 2, 4, 6, 8])
+    assert container.Mx.value == approx(3)
+    assert container.Sx.value == approx(2)
+    assert container.slope.value == approx(2)
+    assert container.corr.value == approx(1)
+
+
+def test_constant_stream():
+    """Correlation and slope are undefined when x doesn't vary"""
+    container = make_container(3)
+    container.push_batch([1, 1, 1], [1, 2, 3])
+    assert container.cov.value == 0
+    assert math.isnan(container.corr.value)
+    assert math.isnan(container.slope.value)
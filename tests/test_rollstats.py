@@ -1,22 +1,22 @@
 import array
 from collections import deque
-import itertools
 import math
+import statistics
 
+import numpy as np
+import pytest
 from pytest import approx
 
+from helpers import check_lists_approx_equal
 import rollstats
 
 nan = rollstats.nan
 
 
-def check_lists_approx_equal(history, accepted):
-    """Helper function to check that two lists with NaNs are approximately equal"""
-    for hist, acc in itertools.zip_longest(history, accepted):
-        if math.isnan(acc):
-            assert math.isnan(hist)
-        else:
-            assert hist == approx(acc)
+@pytest.fixture(autouse=True)
+def vectorize_short_batches(monkeypatch):
+    """Exercise the vectorized path of push_batch() with the short chunks used below"""
+    monkeypatch.setattr(rollstats, "BATCH_MIN_SIZE", 1)
 
 
 def test_create():
@@ -238,3 +238,596 @@ def test_custom_subscription():
     container.subscribe("mean_plus_1", container.M, func=lambda m: m + 1)
     container.push(2, 1, 3)
     assert container.mean_plus_1 == 3
+
+
+def test_var_after_eviction():
+    """The variance should be that of the samples in the window after older samples are evicted"""
+    container = rollstats.Container(window_size=2)
+    container.subscribe_var()
+    container.push(0, 1, 2, 3, 5)
+    check_lists_approx_equal(container.var.history, [nan, 1 / 2, 1 / 2, 1 / 2, 2])
+
+
+def check_push_batch(window_size, data, chunk_size):
+    """Helper function to check that push_batch gives the same results as push"""
+    scalar = rollstats.Container(window_size=window_size)
+    batch = rollstats.Container(window_size=window_size)
+    for container in (scalar, batch):
+        container.subscribe_std()
+        container.subscribe_harmonic_mean()
+
+    for start in range(0, len(data), chunk_size):
+        scalar.push(*data[start : start + chunk_size])
+        batch.push_batch(data[start : start + chunk_size])
+
+    assert batch == scalar
+    for name in (
+        "value",
+        "n",
+        "S",
+        "M",
+        "sum",
+        "reciprocal_sum",
+        "std",
+        "harmonic_mean",
+    ):
+        check_lists_approx_equal(
+            getattr(batch, name).history, getattr(scalar, name).history
+        )
+
+
+def test_push_batch():
+    """push_batch() should give the same results as push(), whatever the window and chunk size"""
+    data = [math.sin(i) * 10 + i / 100 for i in range(500)]
+    for window_size in (1, 2, 2.5, 3, 10, 1000, float("inf")):
+        for chunk_size in (1, 7, 64, 500):
+            check_push_batch(window_size, data, chunk_size)
+
+
+def test_push_batch_zeros():
+    """A zero in the window makes the reciprocal sum NaN, also when pushing in batches"""
+    data = [1, 2, 0, 3, 4, 5, 6]
+    for window_size in (1, 2, 3, float("inf")):
+        check_push_batch(window_size, data, 3)
+
+
+def test_push_batch_non_finite():
+    """NaNs and infinities are handled like push() would"""
+    data = [1, 2, nan, 3, float("inf"), 4]
+    scalar = rollstats.Container(window_size=3)
+    batch = rollstats.Container(window_size=3)
+    scalar.push(*data)
+    batch.push_batch(data)
+    check_lists_approx_equal(batch.M.history, scalar.M.history)
+
+
+def test_push_batch_constant_window():
+    """A window that turns constant after large values has no spread in either path"""
+    data = [1000.3, 999.1, 1001.7, 0, 0, 0]
+    for push_batch in (False, True):
+        container = rollstats.Container(window_size=3)
+        container.subscribe_std()
+        container.subscribe_z_score()
+        if push_batch:
+            container.push_batch(data)
+        else:
+            container.push(*data)
+        assert container.S.value == 0
+        assert container.M.value == 0
+        assert container.std.value == 0
+        assert math.isnan(container.zscore.value)
+
+
+def test_large_value_leaves_window():
+    """M and S are right again once a large value has left the window, in either path"""
+    data = [1e9, 1, 2, 3, 4, 5, 6]
+    for push_batch in (False, True):
+        container = rollstats.Container(window_size=3)
+        container.subscribe_std()
+        if push_batch:
+            container.push_batch(data)
+        else:
+            container.push(*data)
+        assert list(container.M.history)[3:] == approx([2, 3, 4, 5])
+        assert list(container.std.history)[3:] == approx([1, 1, 1, 1])
+
+
+def test_push_batch_buffer():
+    """push_batch() accepts anything supporting the buffer protocol"""
+    container = rollstats.Container(window_size=3)
+    container.push_batch(array.array("d", [1, 2, 3, 4]))
+    assert container.data == deque([2, 3, 4])
+    assert container.M == approx(3)
+
+
+def test_push_batch_short(monkeypatch):
+    """Chunks shorter than BATCH_MIN_SIZE are pushed one by one"""
+    monkeypatch.setattr(rollstats, "BATCH_MIN_SIZE", 4)
+    container = rollstats.Container(window_size=3)
+    monkeypatch.setattr(container, "_can_push_batch", None)
+    container.push_batch([1, 2, 3])
+    assert container.data == deque([1, 2, 3])
+    assert container.M == approx(2)
+
+
+def test_push_batch_without_numpy(monkeypatch):
+    """Without numpy, push_batch() is the same as push()"""
+    monkeypatch.setattr(rollstats, "np", None)
+    container = rollstats.Container(window_size=2)
+    container.subscribe_mean()
+    container.push_batch([1, 2, 3])
+    check_lists_approx_equal(container.mean.history, [1, 3 / 2, 5 / 2])
+
+
+def test_max_history():
+    """With max_history, every history in the container is bounded"""
+    container = rollstats.Container(window_size=3, max_history=2)
+    container.subscribe_mean()
+    container.push(1, 2, 3, 4)
+    check_lists_approx_equal(container.value.history, [3, 4])
+    check_lists_approx_equal(container.mean.history, [2, 3])
+
+    container.push_batch([5, 6, 7])
+    check_lists_approx_equal(container.n.history, [3, 3])
+    check_lists_approx_equal(container.mean.history, [5, 6])
+
+
+def test_record():
+    """Only the quantities named in record keep a history"""
+    container = rollstats.Container(window_size=2, record=["M", "std"])
+    container.subscribe_std()
+    container.subscribe_var()
+    container.push(1, 2, 4)
+    container.push_batch([5, 7])
+
+    check_lists_approx_equal(container.M.history, [1, 3 / 2, 3, 9 / 2, 6])
+    check_lists_approx_equal(
+        container.std.history,
+        [nan, math.sqrt(1 / 2), math.sqrt(2), math.sqrt(1 / 2), math.sqrt(2)],
+    )
+    for name in ("value", "n", "S", "sum", "reciprocal_sum", "var"):
+        assert len(getattr(container, name)) == 0
+
+    # The current values are still up to date
+    assert container.value == 7
+    assert container.n == 2
+    assert container.var == approx(2)
+
+
+def test_record_nothing():
+    """With an empty record, no history is kept at all"""
+    container = rollstats.Container(window_size=2, record=())
+    container.subscribe_z_score()
+    container.push(1, 2, 4)
+    assert container.zscore == approx(math.sqrt(1 / 2))
+    for mem_float in container.mem_floats + (container.zscore,):
+        assert len(mem_float) == 0
+
+
+def test_slice_finite_window():
+    """With a finite window, slices are zero-copy views of the window,
+    except for those that cross the wraparound of the buffer"""
+    container = rollstats.Container(window_size=4)
+    container.push(1, 2, 3, 4)
+    view = container[:]
+    assert isinstance(view, memoryview)
+    assert view.tolist() == [1, 2, 3, 4]
+
+    # The view follows the window
+    container.push(5, 6)
+    assert view.tolist() == [5, 6, 3, 4]
+    assert container[:].tolist() == [3, 4, 5, 6]
+    assert isinstance(container[:2], memoryview)
+    assert container[1:3].tolist() == [4, 5]
+    assert container[::-1].tolist() == [6, 5, 4, 3]
+    assert container[::2].tolist() == [3, 5]
+    assert container[-1] == 6
+    assert container[0] == 3
+    assert container.data == deque([3, 4, 5, 6])
+
+
+def test_window_buffer_slices():
+    """Slices of the window buffer should match slices of a list, wherever the wraparound is"""
+    for pushed in range(8):
+        buffer = rollstats.WindowBuffer(5, range(pushed))
+        reference = list(range(pushed))[-5:]
+        for start in (None, -7, -3, 0, 1, 4):
+            for stop in (None, -1, 2, 5):
+                for step in (None, 1, 2, -1, -2):
+                    item = slice(start, stop, step)
+                    assert buffer[item].tolist() == reference[item]
+        assert buffer.to_numpy().tolist() == reference
+
+
+def test_window_buffer():
+    """The window buffer behaves like a deque with a maximum length"""
+    buffer = rollstats.WindowBuffer(3)
+    reference = deque(maxlen=3)
+    for i in range(10):
+        buffer.append(i)
+        reference.append(i)
+        assert buffer == reference
+        assert list(buffer) == list(reference)
+    buffer.extend([10, 11])
+    reference.extend([10, 11])
+    assert buffer == reference
+    assert buffer.popleft() == reference.popleft()
+    assert buffer.tolist() == list(reference)
+    buffer.clear()
+    assert len(buffer) == 0
+
+
+def test_min_max_range():
+    """Check that the rolling min, max and range are right and have the right history"""
+    container = rollstats.Container(window_size=3)
+    container.subscribe_min()
+    container.subscribe_max()
+    container.subscribe_range()
+
+    container.push(3, 1, 2, 2, 5, 4, 4, 0)
+    check_lists_approx_equal(container.min.history, [3, 1, 1, 1, 2, 2, 4, 0])
+    check_lists_approx_equal(container.max.history, [3, 3, 3, 2, 5, 5, 5, 4])
+    check_lists_approx_equal(container.range.history, [0, 2, 2, 1, 3, 3, 1, 4])
+
+
+def test_min_max_brute_force():
+    """The rolling min and max should match min() and max() of the window,
+    also when subscribing after pushing and when pushing in batches"""
+    data = [math.floor(math.sin(i * 1.3) * 5) for i in range(300)]
+    for window_size in (1, 2, 5, 50, float("inf")):
+        container = rollstats.Container(data=data[:10], window_size=window_size)
+        container.subscribe_range()
+        for i in range(10, len(data), 7):
+            container.push(*data[i : i + 3])
+            container.push_batch(data[i + 3 : i + 7])
+            assert container.min == min(container.data)
+            assert container.max == max(container.data)
+            assert container.range == max(container.data) - min(container.data)
+
+
+def test_min_max_nan():
+    """The rolling min and max are NaN while there is a NaN anywhere in the window"""
+    for position in range(3):
+        data = [5, 3, 7]
+        data[position] = nan
+        container = rollstats.Container(window_size=3)
+        container.subscribe_min()
+        container.subscribe_max()
+        container.push(*data)
+        assert math.isnan(container.min.value)
+        assert math.isnan(container.max.value)
+        container.push(*range(position + 1))
+        assert container.min.value == 0
+        assert container.max.value == max(container.data)
+
+
+def reference_quantile(values, q):
+    """Linearly interpolated quantile of a list"""
+    values = sorted(values)
+    position = q * (len(values) - 1)
+    low = math.floor(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def test_order_statistics():
+    """OrderStatistics should behave like a sorted list, also when blocks are split and merged"""
+    order_statistics = rollstats.OrderStatistics(load=4)
+    reference = []
+    values = [math.floor(math.sin(i * 0.7) * 20) for i in range(400)]
+    for i, value in enumerate(values):
+        order_statistics.add(value)
+        reference.append(value)
+        if i % 3 == 1:
+            order_statistics.remove(values[i // 2])
+            reference.remove(values[i // 2])
+        reference.sort()
+        assert list(order_statistics) == reference
+        assert len(order_statistics) == len(reference)
+        assert order_statistics[0] == reference[0]
+        assert order_statistics[-1] == reference[-1]
+        assert order_statistics[len(reference) // 3] == reference[len(reference) // 3]
+    for value in reference:
+        order_statistics.remove(value)
+    assert len(order_statistics) == 0
+
+
+def test_median_and_quantiles():
+    """Rolling quantiles should match the quantiles of the window"""
+    data = [math.floor(math.sin(i * 1.3) * 50) for i in range(300)]
+    for window_size in (1, 2, 5, 50, float("inf")):
+        container = rollstats.Container(data=data[:10], window_size=window_size)
+        container.subscribe_median()
+        container.subscribe_quantile(0.95)
+        container.subscribe_quantile(0.99)
+        container.subscribe_quantile(0.25, "lower_quartile")
+        for i in range(10, len(data), 7):
+            container.push(*data[i : i + 3])
+            container.push_batch(data[i + 3 : i + 7])
+            window = list(container.data)
+            assert container.median == approx(statistics.median(window))
+            assert container.p95 == approx(reference_quantile(window, 0.95))
+            assert container.p99 == approx(reference_quantile(window, 0.99))
+            assert container.lower_quartile == approx(reference_quantile(window, 0.25))
+
+
+def test_median_history():
+    """The median should have the right history, and be NaN while there is a NaN in the window"""
+    container = rollstats.Container(window_size=3)
+    container.subscribe_median()
+    container.push(1, 5, 2, nan, 3, 4, 0)
+    check_lists_approx_equal(container.median.history, [1, 3, 2, nan, nan, nan, 3])
+
+
+def test_derived_of_derived():
+    """Subscriptions can depend on other subscriptions, and are evaluated once per push"""
+    calls = []
+
+    def double(std):
+        calls.append(std)
+        return 2 * std
+
+    container = rollstats.Container(window_size=3)
+    container.subscribe_std()
+    container.subscribe("double_std", container.std, func=double)
+    container.subscribe(
+        "double_std_plus_mean",
+        container.double_std,
+        container.M,
+        func=lambda d, m: d + m,
+    )
+    container.push(1, 2, 4)
+    container.push_batch([7, 11])
+
+    assert len(calls) == 5
+    for std, double_std, total, mean in zip(
+        container.std.history,
+        container.double_std.history,
+        container.double_std_plus_mean.history,
+        container.M.history,
+    ):
+        if not math.isnan(std):
+            assert double_std == approx(2 * std)
+            assert total == approx(2 * std + mean)
+
+
+def test_plan_order():
+    """The plan evaluates every subscription after the subscriptions it depends on"""
+    container = rollstats.Container()
+    container.subscribe_mean()
+    first = container.mean
+    container.subscribe("mean_plus_1", container.mean, func=lambda m: m + 1)
+    assert [sub[0] for sub in container.plan] == [first, container.mean_plus_1]
+
+    container.subscriptions.reverse()
+    plan = container.compile_plan()
+    assert [sub[0] for sub in plan] == [first, container.mean_plus_1]
+
+
+def test_to_numpy():
+    """The window should be exported as a view with a finite window, unless it crosses
+    the wraparound of the buffer, and copied otherwise"""
+    container = rollstats.Container(window_size=3)
+    container.push(1, 2, 3)
+    window = container.to_numpy()
+    assert window.tolist() == [1, 2, 3]
+    assert np.shares_memory(window, np.frombuffer(container.data.buffer))
+    container.push(4)
+    assert container.to_numpy().tolist() == [2, 3, 4]
+
+    container = rollstats.Container()
+    container.push(1, 2, 3, 4)
+    assert container.to_numpy().tolist() == [1, 2, 3, 4]
+
+
+def test_histories():
+    """The recorded histories should be aligned at the most recent value"""
+    container = rollstats.Container(window_size=3, record=("value", "mean", "std"))
+    container.push(1, 2)
+    container.subscribe_mean()
+    container.subscribe_std()
+    container.push(3, 4, 5)
+    histories = container.histories()
+    assert set(histories) == {"value", "mean", "std"}
+    assert histories["value"].tolist() == [3, 4, 5]
+    assert histories["mean"].tolist() == [2, 3, 4]
+    assert histories["std"].tolist() == [1, 1, 1]
+
+
+def test_push_while_exported():
+    """Pushing while an export of the histories is alive should keep them aligned"""
+    container = rollstats.Container(window_size=3)
+    container.subscribe_std()
+    container.push(1, 2, 3)
+    std = container.std.to_numpy()
+    histories = container.histories()
+    container.push(4)
+    container.push_batch([5, 6])
+    assert std.tolist()[1:] == list(container.std.history)[1:3]
+    assert len(histories["std"]) == 3
+    lengths = {len(history) for history in container.histories().values()}
+    assert lengths == {6}
+    assert container.std.history[-1] == approx(1)
+
+
+def test_to_arrow():
+    """The histories should be exported as a pyarrow Table"""
+    pyarrow = pytest.importorskip("pyarrow")
+    container = rollstats.Container(window_size=3)
+    container.subscribe_mean()
+    container.push(1, 2, 3, 4)
+    table = container.to_arrow()
+    assert isinstance(table, pyarrow.Table)
+    assert table.column("value").to_pylist() == [1, 2, 3, 4]
+    assert table.column("mean").to_pylist() == [1, 1.5, 2, 3]
+
+
+def test_to_pandas():
+    """The histories should be exported as a pandas DataFrame"""
+    pytest.importorskip("pandas")
+    container = rollstats.Container(window_size=3)
+    container.subscribe_mean()
+    container.push(1, 2, 3, 4)
+    frame = container.to_pandas()
+    assert frame["value"].tolist() == [1, 2, 3, 4]
+    assert frame["mean"].tolist() == [1, 1.5, 2, 3]
+    container.push(5)
+    assert len(container.to_pandas()) == 5
+    assert len(frame) == 4
+
+
+def test_lazy_subscriptions():
+    """Lazy subscriptions should match eager ones, without being evaluated on push"""
+    containers = []
+    for lazy in (False, True):
+        container = rollstats.Container(window_size=4, lazy=lazy)
+        container.subscribe_std()
+        container.subscribe_z_score()
+        container.subscribe_range()
+        container.push(3, 1, 4, 1, 5, 9, 2, 6)
+        container.push_batch([5.0, 3.0, 5.0])
+        containers.append(container)
+    eager, lazy = containers
+
+    assert lazy.plan == ()
+    assert isinstance(lazy.std, rollstats.LazyFloat)
+    for name in ("std", "zscore", "range"):
+        check_lists_approx_equal(
+            getattr(lazy, name).history, list(getattr(eager, name).history)
+        )
+        assert getattr(lazy, name).value == approx(getattr(eager, name).value)
+    with pytest.raises(AttributeError):
+        lazy.std.value = 1
+
+
+def test_lazy_unrecorded_inputs():
+    """A recorded lazy subscription needs the histories of its inputs"""
+    container = rollstats.Container(lazy=True, record=("std",))
+    with pytest.raises(ValueError):
+        container.subscribe_std()
+
+    container = rollstats.Container(lazy=True, record=("std", "S", "n"))
+    container.subscribe_std()
+    container.push(1, 2, 3)
+    assert list(container.std.history)[1:] == approx([math.sqrt(0.5), 1])
+
+    container = rollstats.Container(lazy=True, record=())
+    container.subscribe_std()
+    container.push(1, 2, 3)
+    assert container.std.value == approx(1)
+
+
+def test_lazy_snapshot(tmp_path):
+    """Lazy subscriptions should be recomputed after restoring a snapshot"""
+    container = rollstats.Container(window_size=4, lazy=True)
+    container.subscribe_std()
+    container.push(3, 1, 4, 1, 5)
+    container.save_snapshot(tmp_path / "container.snap")
+    restored = rollstats.Container.load_snapshot(tmp_path / "container.snap")
+    assert isinstance(restored.std, rollstats.LazyFloat)
+    assert list(restored.std.history)[1:] == list(container.std.history)[1:]
+
+
+def test_skewness_and_kurtosis():
+    """Skewness and kurtosis should match a computation from scratch over the window"""
+    data = [3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 5, 8, 9, 7, 9, 3, 2, 3, 8, 4]
+    window_size = 6
+    for batch in (False, True):
+        container = rollstats.Container(window_size=window_size)
+        container.subscribe_skewness()
+        container.subscribe_pop_skewness()
+        container.subscribe_kurtosis()
+        container.subscribe_pop_kurtosis()
+        if batch:
+            container.push_batch(data)
+        else:
+            container.push(*data)
+
+        window = data[-window_size:]
+        n = len(window)
+        mean = statistics.mean(window)
+        m2, m3, m4 = (sum((x - mean) ** p for x in window) for p in (2, 3, 4))
+        g1 = math.sqrt(n) * m3 / m2**1.5
+        g2 = n * m4 / m2**2 - 3
+        assert container.pop_skewness.value == approx(g1)
+        assert container.skewness.value == approx(g1 * math.sqrt(n * (n - 1)) / (n - 2))
+        assert container.pop_kurtosis.value == approx(g2)
+        assert container.kurtosis.value == approx(
+            ((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3))
+        )
+
+
+def test_skewness_small_windows():
+    """Skewness and kurtosis are undefined for too few or constant values"""
+    container = rollstats.Container(window_size=3)
+    container.subscribe_skewness()
+    container.subscribe_kurtosis()
+    container.push(1, 2)
+    assert math.isnan(container.skewness.value)
+    container.push(4)
+    assert container.skewness.value == approx(0.9352195295828237)
+    assert math.isnan(container.kurtosis.value)
+    container.push(1, 1, 1)
+    assert math.isnan(container.skewness.value)
+
+
+def test_skewness_snapshot(tmp_path):
+    """The central moments should be rebuilt when a snapshot is loaded"""
+    container = rollstats.Container(window_size=5)
+    container.subscribe_skewness()
+    container.push(1, 5, 2, 8, 3, 9, 4, 1.5, 7)
+    container.save_snapshot(tmp_path / "snapshot")
+    loaded = rollstats.Container.load_snapshot(tmp_path / "snapshot")
+    container.push(2.5)
+    loaded.push(2.5)
+    assert loaded.skewness.value == approx(container.skewness.value)
+
+
+def reference_skewness_kurtosis(window):
+    """Sample skewness and excess kurtosis of a window, computed directly"""
+    n = len(window)
+    mean = statistics.fmean(window)
+    m2, m3, m4 = (math.fsum((x - mean) ** p for x in window) for p in (2, 3, 4))
+    g1 = math.sqrt(n) * m3 / m2**1.5
+    g2 = n * m4 / m2**2 - 3
+    return (
+        g1 * math.sqrt(n * (n - 1)) / (n - 2),
+        ((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3)),
+    )
+
+
+def test_skewness_regime_shift():
+    """The moments recover when large values leave the window"""
+    rng = np.random.default_rng(0)
+    data = np.concatenate((rng.normal(0, 1e4, 1000), rng.normal(5, 1, 300))).tolist()
+    window_size = 100
+    for push_batch in (False, True):
+        container = rollstats.Container(window_size=window_size)
+        container.subscribe_skewness()
+        container.subscribe_kurtosis()
+        if push_batch:
+            container.push_batch(data)
+        else:
+            container.push(*data)
+        for i in range(window_size, len(data), 37):
+            skew, kurt = reference_skewness_kurtosis(data[i + 1 - window_size : i + 1])
+            assert container.skewness.history[i] == approx(skew, abs=1e-8)
+            assert container.kurtosis.history[i] == approx(kurt, abs=1e-8)
+
+
+def test_skewness_constant_after_large_values():
+    """A window that turns constant after large values has no skewness"""
+    for push_batch in (False, True):
+        container = rollstats.Container(window_size=3)
+        container.subscribe_skewness()
+        container.subscribe_kurtosis()
+        data = [1000.3, 999.1, 1001.7, 0, 0, 0]
+        if push_batch:
+            container.push_batch(data)
+        else:
+            container.push(*data)
+        assert container.M2.value == 0
+        assert math.isnan(container.skewness.value)
+        container.push(1000.3, 1000.3, 1000.3)
+        assert container.M2.value == 0
+        assert math.isnan(container.skewness.value)
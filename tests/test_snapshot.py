@@ -0,0 +1,116 @@
+import math
+
+from pytest import raises
+
+import rollstats
+
+
+def check_same(container, restored, names):
+    """Helper function to check that two containers have the same values and histories"""
+    assert restored == container
+    for name in names:
+        mine = getattr(restored, name)
+        theirs = getattr(container, name)
+        assert mine.value == theirs.value or (
+            math.isnan(mine.value) and math.isnan(theirs.value)
+        )
+        assert list(map(repr, mine.history)) == list(map(repr, theirs.history))
+
+
+def test_roundtrip(tmp_path):
+    """A restored container should continue exactly like the original"""
+    path = tmp_path / "container.snap"
+    container = rollstats.Container(window_size=5)
+    container.subscribe_std()
+    container.subscribe_z_score()
+    container.subscribe_range()
+    container.subscribe_quantile(0.9)
+    container.subscribe_median()
+    container.push(3, 1, 4, 1, 5, 9, 2, 6)
+    container.save_snapshot(path)
+
+    restored = rollstats.Container.load_snapshot(path)
+    assert isinstance(restored.std.history, rollstats.MappedHistory)
+    names = ["value", "n", "M", "S", "sum", "reciprocal_sum", "std", "zscore"]
+    names += ["min", "max", "range", "p90", "median"]
+    check_same(container, restored, names)
+
+    container.push(5, 3, 5)
+    restored.push(5, 3, 5)
+    check_same(container, restored, names)
+
+
+def test_roundtrip_settings(tmp_path):
+    """Infinite windows, max_history and record should survive a snapshot"""
+    path = tmp_path / "container.snap"
+    container = rollstats.Container(max_history=3, record=("value", "mean"))
+    container.subscribe_mean()
+    container.push(1, 2, 3, 4, 5)
+    container.save_snapshot(path)
+
+    restored = rollstats.Container.load_snapshot(path)
+    assert restored.window_size == float("inf")
+    assert restored.record == frozenset(("value", "mean"))
+    assert list(restored.mean.history) == [2, 2.5, 3]
+    assert len(restored.S.history) == 0
+    restored.push(6)
+    assert list(restored.mean.history) == [2.5, 3, 3.5]
+
+
+def test_custom_subscription(tmp_path):
+    """Subscriptions with custom functions can't be restored, so they shouldn't be saved"""
+    container = rollstats.Container(window_size=5)
+    container.subscribe("double", container.M, func=lambda x: 2 * x)
+    with raises(ValueError):
+        container.save_snapshot(tmp_path / "container.snap")
+
+
+def test_not_a_snapshot(tmp_path):
+    """Loading a file that isn't a snapshot should raise an error"""
+    path = tmp_path / "container.snap"
+    path.write_bytes(b"not a snapshot at all")
+    with raises(ValueError):
+        rollstats.Container.load_snapshot(path)
+
+
+def test_time_container(tmp_path):
+    """A restored TimeContainer should continue with the same timestamps"""
+    path = tmp_path / "container.snap"
+    container = rollstats.TimeContainer(horizon=10, record_timestamps=True)
+    container.subscribe_mean()
+    for timestamp, value in enumerate((3, 1, 4, 1, 5, 9, 2, 6)):
+        container.push(value, timestamp * 3)
+    container.save_snapshot(path)
+
+    restored = rollstats.TimeContainer.load_snapshot(path)
+    names = ["value", "n", "M", "S", "mean", "timestamp"]
+    check_same(container, restored, names)
+    container.push(5, 25)
+    restored.push(5, 25)
+    check_same(container, restored, names)
+    with raises(ValueError):
+        restored.push(1, 20)
+
+    with raises(ValueError):
+        rollstats.Container.load_snapshot(path)
+    rollstats.Container().save_snapshot(path)
+    with raises(ValueError):
+        rollstats.TimeContainer.load_snapshot(path)
+
+
+def test_save_to_loaded_path(tmp_path):
+    """Saving a restored container over its own snapshot should keep its histories"""
+    path = tmp_path / "container.snap"
+    container = rollstats.Container(window_size=3)
+    container.push(0, 1, 2, 3, 4)
+    container.save_snapshot(path)
+
+    restored = rollstats.Container.load_snapshot(path)
+    assert isinstance(restored.n.value, int)
+    restored.push(5)
+    restored.save_snapshot(path)
+    assert list(restored.M.history)[:5] == [0, 0.5, 1, 2, 3]
+    again = rollstats.Container.load_snapshot(path)
+    assert list(again.M.history) == [0, 0.5, 1, 2, 3, 4]
+    assert again.n.value == 3
+    assert [p.name for p in tmp_path.iterdir()] == ["container.snap"]
@@ -0,0 +1,74 @@
+import functools
+import math
+import pickle
+
+from pytest import approx
+
+import rollstats
+
+nan = rollstats.nan
+
+
+def test_summary():
+    """A summary holds the current state of a container"""
+    container = rollstats.Container(data=[1, 2, 4], window_size=2)
+    summary = container.summary()
+    assert summary.n == 2
+    assert summary.mean == approx(3)
+    assert summary.var == approx(2)
+    assert summary.sum == approx(6)
+    assert summary.harmonic_mean == approx(8 / 3)
+    assert summary.min is None
+    assert summary.max is None
+
+
+def test_merge():
+    """Merging summaries of chunks in any order gives the summary of all the data"""
+    data = [math.sin(i) * 10 + 3 for i in range(100)]
+    whole = rollstats.Container(data=data)
+    whole.subscribe_min()
+    whole.subscribe_max()
+    expected = whole.summary()
+
+    chunks = [data[i : i + 13] for i in range(0, len(data), 13)]
+    summaries = []
+    for chunk in chunks:
+        container = rollstats.Container(data=chunk)
+        container.subscribe_min()
+        container.subscribe_max()
+        summaries.append(container.summary())
+
+    left_to_right = functools.reduce(rollstats.Summary.merge, summaries)
+    right_to_left = functools.reduce(
+        lambda a, b: b.merge(a), reversed(summaries), rollstats.Summary()
+    )
+    pairs = summaries
+    while len(pairs) > 1:
+        pairs = [
+            pairs[i].merge(pairs[i + 1]) if i + 1 < len(pairs) else pairs[i]
+            for i in range(0, len(pairs), 2)
+        ]
+    for merged in (left_to_right, right_to_left, pairs[0]):
+        assert merged.n == expected.n
+        assert merged.M == approx(expected.M)
+        assert merged.S == approx(expected.S)
+        assert merged.sum == approx(expected.sum)
+        assert merged.reciprocal_sum == approx(expected.reciprocal_sum)
+        assert merged.min == expected.min
+        assert merged.max == expected.max
+
+
+def test_merge_empty():
+    """Merging with an empty summary changes nothing"""
+    summary = rollstats.Container(data=[1, 2, 3]).summary()
+    assert summary.merge(rollstats.Summary()) == summary
+    assert rollstats.Summary().merge(summary) == summary
+    assert rollstats.Summary().merge(rollstats.Summary()).n == 0
+
+
+def test_pickle():
+    """Summaries can be sent between processes"""
+    container = rollstats.Container(data=[1, 2, 3])
+    container.subscribe_max()
+    summary = container.summary()
+    assert pickle.loads(pickle.dumps(summary)) == summary
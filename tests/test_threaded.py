@@ -0,0 +1,62 @@
+import threading
+
+from pytest import approx
+
+import rollstats
+from rollstats.threaded import SharedContainer
+
+
+def test_drain():
+    """Datapoints pushed from several threads should all end up in the container"""
+    shared = SharedContainer(rollstats.Container())
+
+    def produce(offset):
+        for i in range(1000):
+            shared.push(offset + i)
+
+    threads = [threading.Thread(target=produce, args=(i * 1000,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert shared.summary().n == 0
+    assert shared.drain() == 4000
+    assert sorted(shared.container.value.history) == list(range(4000))
+    assert shared.summary().n == 4000
+    assert shared.summary().mean == approx(1999.5)
+    assert shared.drain() == 0
+    # The buffers of finished threads should be forgotten once they are empty
+    assert shared.buffers == []
+
+
+def test_order_per_thread():
+    """The datapoints of one thread should keep their order"""
+    shared = SharedContainer(rollstats.Container())
+    shared.push(1, 2)
+    shared.push(3)
+    shared.drain()
+    assert list(shared.container.value.history) == [1, 2, 3]
+
+
+def test_background():
+    """With a background consumer, the snapshot should be consistent after stopping"""
+    container = rollstats.Container(window_size=10)
+    container.subscribe_max()
+    with SharedContainer(container) as shared:
+
+        def produce():
+            for i in range(500):
+                shared.push(float(i % 7))
+                summary = shared.summary()
+                assert summary.n <= 10
+
+        threads = [threading.Thread(target=produce) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    summary = shared.summary()
+    assert summary.n == 10
+    assert summary.mean == approx(container.M.value)
+    assert summary.max == container.max.value
+    assert len(container.value.history) == 1500
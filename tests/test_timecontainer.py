@@ -0,0 +1,87 @@
+from pytest import approx, raises
+
+import rollstats
+
+nan = rollstats.nan
+
+
+def test_create():
+    """It should be possible to create a TimeContainer"""
+    container = rollstats.TimeContainer(horizon=60)
+
+
+def test_eviction():
+    """Samples that are horizon or more older than the newest one are evicted"""
+    container = rollstats.TimeContainer(horizon=10)
+    container.push(1, 0)
+    container.push(2, 5)
+    container.push(3, 9)
+    assert list(container.data) == [1, 2, 3]
+    assert container.n == 3
+
+    container.push(4, 10)
+    assert list(container.data) == [2, 3, 4]
+    assert list(container.timestamps) == [5, 9, 10]
+
+    # A gap evicts everything but the newest sample
+    container.push(5, 100)
+    assert list(container.data) == [5]
+    assert container.n == 1
+    assert container.M == 5
+
+
+def test_stats_match_window():
+    """The statistics should be those of the samples in the time window"""
+    container = rollstats.TimeContainer(horizon=3.5)
+    container.subscribe_mean()
+    container.subscribe_var()
+    container.subscribe_max()
+    times = [0, 0.5, 1, 1.2, 4, 4.1, 4.2, 9, 9.5, 13]
+    values = [3, 1, 4, 1, 5, 9, 2, 6, 5, 3]
+    for i, (value, timestamp) in enumerate(zip(values, times)):
+        container.push(value, timestamp)
+        window = [
+            v for v, t in zip(values[: i + 1], times[: i + 1]) if t > timestamp - 3.5
+        ]
+        assert list(container.data) == window
+        assert container.mean == approx(sum(window) / len(window))
+        assert container.max == max(window)
+        if len(window) > 1:
+            mean = sum(window) / len(window)
+            var = sum((v - mean) ** 2 for v in window) / (len(window) - 1)
+            assert container.var == approx(var)
+
+
+def test_push_batch():
+    """Pushing in a batch is the same as pushing one by one"""
+    times = [0, 1, 1, 2, 10, 11]
+    values = [1, 2, 3, 4, 5, 6]
+    one_by_one = rollstats.TimeContainer(horizon=2)
+    for value, timestamp in zip(values, times):
+        one_by_one.push(value, timestamp)
+    batch = rollstats.TimeContainer(horizon=2)
+    batch.push_batch(values, times)
+    assert batch == one_by_one
+    assert batch != rollstats.TimeContainer(horizon=3)
+    assert list(batch.M.history) == list(one_by_one.M.history)
+
+
+def test_record_timestamps():
+    """Timestamps are only kept in the history if asked for"""
+    container = rollstats.TimeContainer(horizon=2)
+    container.push(1, 10)
+    assert container.timestamp == 10
+    assert len(container.timestamp) == 0
+
+    container = rollstats.TimeContainer(horizon=2, record_timestamps=True)
+    container.push(1, 10)
+    container.push(2, 11)
+    assert list(container.timestamp.history) == [10, 11]
+
+
+def test_decreasing_timestamp():
+    """Timestamps must not go backwards"""
+    container = rollstats.TimeContainer(horizon=2)
+    container.push(1, 10)
+    with raises(ValueError):
+        container.push(1, 9)
@@ -0,0 +1,109 @@
+import math
+import random
+
+import numpy as np
+from pytest import approx, raises
+
+from helpers import check_state, random_values
+import rollstats
+
+nan = rollstats.nan
+
+
+def check_column(container, column, reference):
+    """Helper function to check that a column has the same state as a Container"""
+    check_state(
+        lambda name: (
+            container.n.value if name == "n" else getattr(container, name)[column]
+        ),
+        reference,
+        abs=1e-9,
+    )
+
+
+def make_rows(length, width, seed=0):
+    rng = random.Random(seed)
+    return [random_values(rng, width) for _ in range(length)]
+
+
+def test_create():
+    """It should be possible to create a VectorContainer"""
+    container = rollstats.VectorContainer(3, window_size=10)
+    assert len(container) == 0
+    assert np.isnan(container.M.value).all()
+
+
+def test_push_matches_containers():
+    """Every column should behave like its own Container"""
+    width = 5
+    rows = make_rows(300, width)
+    for window_size in (1, 3, 10, float("inf")):
+        container = rollstats.VectorContainer(width, window_size=window_size)
+        references = [
+            rollstats.Container(window_size=window_size) for _ in range(width)
+        ]
+        for row in rows:
+            container.push(row)
+            for column, reference in enumerate(references):
+                reference.push(row[column])
+                check_column(container, column, reference)
+
+
+def test_histories():
+    """The histories should be 2-D arrays with one row per push"""
+    rows = make_rows(50, 4)
+    container = rollstats.VectorContainer(4, window_size=5)
+    container.subscribe_mean()
+    container.subscribe_std()
+    container.subscribe_z_score()
+    container.push_batch(rows)
+    reference = rollstats.Container(window_size=5)
+    reference.subscribe_mean()
+    reference.subscribe_std()
+    reference.subscribe_z_score()
+    for row in rows:
+        reference.push(row[2])
+
+    assert container.value.history.array.shape == (50, 4)
+    assert container.value.history.array.tolist() == rows
+    assert list(container.n.history) == list(reference.n.history)
+    for name in ("mean", "std", "zscore"):
+        mine = getattr(container, name).history.array[:, 2]
+        theirs = list(getattr(reference, name).history)
+        assert len(mine) == len(theirs)
+        for a, b in zip(mine, theirs):
+            assert (math.isnan(a) and math.isnan(b)) or a == approx(b)
+
+
+def test_max_history():
+    """With max_history, only the latest rows should be kept"""
+    container = rollstats.VectorContainer(2, max_history=3)
+    for i in range(10):
+        container.push([i, -i])
+    assert container.value.history.array.tolist() == [[7, -7], [8, -8], [9, -9]]
+    assert container.M.history[-1].tolist() == [4.5, -4.5]
+
+
+def test_window():
+    """The window should contain the latest rows, oldest first"""
+    container = rollstats.VectorContainer(2, window_size=3)
+    for i in range(7):
+        container.push([i, 2 * i])
+    assert container.window().tolist() == [[4, 8], [5, 10], [6, 12]]
+    assert len(container) == 3
+
+
+def test_large_value_leaves_window():
+    """M and S are right again once a large value has left the window"""
+    container = rollstats.VectorContainer(2, window_size=3)
+    for row in ([1e9, 1], [1, 2], [2, 3], [3, 4], [4, 5]):
+        container.push(row)
+    assert container.M.value.tolist() == approx([3, 4])
+    assert container.S.value.tolist() == approx([2, 2])
+
+
+def test_wrong_width():
+    """Pushing a row of the wrong width should raise an error"""
+    container = rollstats.VectorContainer(3)
+    with raises(ValueError):
+        container.push([1, 2])